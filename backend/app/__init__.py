@@ -3,17 +3,42 @@ from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
 from app.api import api_route
-from utils.db import create_db_and_tables  # Assuming this is your DB initialization function
+from app.api.routes import metrics
+from utils.db import create_db_and_tables, dispose_engine, engine  # Assuming this is your DB initialization function
 from utils.logger import log  # Assuming this is your logger
+from utils.ssh import ssh_pool
+from app.api.services.job import deploy_queue
+from app.api.services.execution import ExecutionService
+from utils.agent_client import agent_client
+from app.api.services.performance import performance_store
+from app.api.services.health import HEALTH_CHECK_ENABLED, health_monitor
+from utils.metrics import MetricsMiddleware, instrument_engine, loop_lag_monitor
+from utils.compression import CompressionMiddleware
+from utils.profiling import PROFILE_ENABLED, PROFILE_SAMPLE_RATE, ProfilingMiddleware
 
 # Define lifespan event handler
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup event
     log.info("应用启动，初始化数据库...")
-    create_db_and_tables()
+    await create_db_and_tables()
+    ssh_pool.start()
+    await deploy_queue.start()
+    await ExecutionService.recover()
+    performance_store.start()
+    loop_lag_monitor.start()
+    if HEALTH_CHECK_ENABLED:
+        health_monitor.start()
     yield
     # Shutdown event (optional)
+    await health_monitor.stop()
+    await loop_lag_monitor.stop()
+    await deploy_queue.stop()
+    await ExecutionService.stop()
+    await performance_store.stop()
+    await ssh_pool.close()
+    await agent_client.close()
+    await dispose_engine()
     log.info("应用关闭")
 
 # Factory function to create FastAPI app
@@ -29,7 +54,20 @@ def create_app():
         allow_headers=["*"],  # List of allowed headers
     )
 
+    # Compress JSON/text responses (brotli when installed, otherwise gzip)
+    app.add_middleware(CompressionMiddleware)
+
+    # On-demand request profiling, only installed when it can be triggered
+    if PROFILE_ENABLED or PROFILE_SAMPLE_RATE > 0:
+        app.add_middleware(ProfilingMiddleware)
+
+    # Request metrics, outermost so that it covers the whole request
+    app.add_middleware(MetricsMiddleware)
+    instrument_engine(engine.sync_engine)
+
     # Include API router
     app.include_router(api_route, prefix='/api/v1')
+    # Prometheus metrics endpoint
+    app.include_router(metrics.router)
 
     return app
\ No newline at end of file
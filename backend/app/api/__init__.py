@@ -1,7 +1,13 @@
 from fastapi import APIRouter
-from app.api.routes import machine, agent_version, test_case
+from app.api.routes import machine, agent_version, test_case, rollout, job, execution, performance, stats, profiling
 
 api_route = APIRouter()
 api_route.include_router(machine.router, prefix="/machines", tags=["机器管理"])
 api_route.include_router(agent_version.router, prefix="/agent-versions", tags=["代理版本管理"])
 api_route.include_router(test_case.router, prefix="/test-cases", tags=["测试用例管理"])
+api_route.include_router(rollout.router, prefix="/rollouts", tags=["批量部署"])
+api_route.include_router(job.router, prefix="/jobs", tags=["部署任务"])
+api_route.include_router(execution.router, prefix="/executions", tags=["测试执行"])
+api_route.include_router(performance.router, prefix="/performance", tags=["性能数据"])
+api_route.include_router(stats.router, prefix="/stats", tags=["测试统计"])
+api_route.include_router(profiling.router, prefix="/admin/profiles", tags=["请求剖析"])
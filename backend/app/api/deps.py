@@ -1,17 +1,9 @@
-from typing import Annotated, Generator
+from typing import Annotated
 
 from fastapi import Depends
-from sqlalchemy import create_engine
-from sqlmodel import Session, SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-engine = create_engine(r"sqlite:///machines.db")
+from utils.db import get_db
 
-SQLModel.metadata.create_all(engine)
 
-
-def get_db() -> Generator[Session, None, None]:
-    with Session(engine) as session:
-        yield session
-
-
-SessionDep = Annotated[Session, Depends(get_db)]
+SessionDep = Annotated[AsyncSession, Depends(get_db)]
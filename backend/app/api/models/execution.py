@@ -0,0 +1,15 @@
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel, Field
+
+
+# 测试执行 API 模型
+class ExecutionCreate(BaseModel):
+    """
+    测试执行请求模型
+
+    在所选机器上并发运行其关联的测试用例；提供 test_case_ids 时只运行其中与机器关联的用例
+    """
+    machine_ids: List[int] = Field(..., min_length=1, description="机器ID列表")
+    test_case_ids: Optional[List[int]] = Field(None, description="测试用例ID列表（可选）")
+    params: Optional[Dict[str, Any]] = Field(None, description="传递给每个测试用例的参数")
+    timeout: float = Field(600, gt=0, le=86400, description="单个测试用例的超时时间（秒）")
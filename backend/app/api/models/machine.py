@@ -1,6 +1,7 @@
 from datetime import datetime
-from typing import List, Optional
+from typing import List, Literal, Optional
 from pydantic import BaseModel, Field
+from typing_extensions import TypedDict
 
 
 # 基础连接检查模型
@@ -103,6 +104,13 @@ class MachineUpdate(BaseModel):
     test_case_ids: Optional[List[int]] = Field(None, description="测试用例ID列表")
 
 
+class MachineTestCaseAssign(BaseModel):
+    """批量分配测试用例请求模型"""
+    machine_ids: List[int] = Field(..., min_length=1, description="机器ID列表")
+    test_case_ids: List[int] = Field(..., description="测试用例ID列表")
+    mode: Literal["replace", "add", "remove"] = Field("replace", description="replace-替换, add-追加, remove-移除")
+
+
 class MachineResponse(MachineBase):
     """机器响应模型"""
     id: int
@@ -110,3 +118,61 @@ class MachineResponse(MachineBase):
     updated_at: datetime
     agent_version: AgentVersionResponse
     test_cases: List[TestCaseResponse] = []
+
+
+# 列表响应中的条目使用TypedDict：校验时只生成字典，不为每一行创建模型实例
+class AgentVersionBrief(TypedDict):
+    """机器所属代理版本的摘要，机器未关联版本时各字段为空"""
+    id: Optional[int]
+    name: Optional[str]
+    description: Optional[str]
+
+
+class TestCaseBrief(TypedDict):
+    """机器关联的测试用例摘要"""
+    id: int
+    name: str
+    description: Optional[str]
+    type: Optional[str]
+
+
+class AgentHealthBrief(TypedDict):
+    """代理健康检查的缓存结果"""
+    status: Literal["online", "offline", "unknown"]
+    latency_ms: Optional[float]
+
+
+class MachineListItem(TypedDict):
+    """机器列表项，校验时忽略多余的键"""
+    id: int
+    name: str
+    description: Optional[str]
+    test_type: str
+    ip: str
+    created_at: datetime
+    updated_at: datetime
+    agent_version: AgentVersionBrief
+    health: AgentHealthBrief
+
+
+class MachineDetail(MachineListItem):
+    """机器详细信息"""
+    username: str
+    password: str
+    test_cases: List[TestCaseBrief]
+
+
+class MachineListResponse(BaseModel):
+    """机器列表响应模型"""
+    status: bool = True
+    message: str
+    data: List[MachineListItem]
+    total: int
+    next_cursor: Optional[str] = Field(None, description="下一页游标，没有下一页时为空")
+
+
+class MachineDetailResponse(BaseModel):
+    """机器详细信息响应模型"""
+    status: bool = True
+    message: str
+    data: MachineDetail
@@ -0,0 +1,16 @@
+from typing import List, Optional
+from pydantic import BaseModel, Field
+
+
+# 性能数据 API 模型
+class PerformanceSamples(BaseModel):
+    """
+    性能样本批量上报模型（按列）
+
+    timestamps 为Unix时间戳（秒）；各指标列与 timestamps 等长，缺省的指标列或列中的null视为缺失
+    """
+    timestamps: List[float] = Field(..., min_length=1, max_length=100000, description="样本时间戳（秒）")
+    cpu: Optional[List[Optional[float]]] = Field(None, description="CPU使用率（%）")
+    memory: Optional[List[Optional[float]]] = Field(None, description="内存使用率（%）")
+    disk_io: Optional[List[Optional[float]]] = Field(None, description="磁盘IO（字节/秒）")
+    network_io: Optional[List[Optional[float]]] = Field(None, description="网络IO（字节/秒）")
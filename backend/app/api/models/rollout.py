@@ -0,0 +1,42 @@
+from datetime import datetime
+from typing import Dict, List, Optional
+from pydantic import BaseModel, Field
+
+
+# 批量部署 API 模型
+class RolloutCreate(BaseModel):
+    """
+    批量部署请求模型
+
+    machine_ids 与 test_type / agent_version_id 过滤条件至少提供一项，同时提供时取交集
+    """
+    machine_ids: Optional[List[int]] = Field(None, description="机器ID列表")
+    test_type: Optional[str] = Field(None, description="按测试类型筛选")
+    agent_version_id: Optional[int] = Field(None, description="按代理版本ID筛选")
+    parallelism: int = Field(10, ge=1, le=200, description="最大并发部署数")
+    host_timeout: float = Field(120, gt=0, le=3600, description="单台机器部署超时时间（秒）")
+    force: bool = Field(True, description="是否强制重新部署（停止已有代理并覆盖安装）")
+
+
+class RolloutMachineStatus(BaseModel):
+    """单台机器部署进度"""
+    machine_id: int
+    name: Optional[str] = None
+    ip: Optional[str] = None
+    status: str = Field("pending", description="pending/running/succeeded/failed")
+    message: str = ""
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+class RolloutResponse(BaseModel):
+    """批量部署进度响应模型"""
+    id: str
+    status: str = Field(..., description="running/completed")
+    parallelism: int
+    host_timeout: float
+    force: bool
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    summary: Dict[str, int]
+    machines: List[RolloutMachineStatus]
@@ -1,12 +1,12 @@
-from sqlmodel import select
-
-from fastapi import APIRouter, HTTPException
-from typing import List
+from fastapi import APIRouter, Header, HTTPException, Path, Query, Request, Response
+from typing import List, Optional
 
 from app.api.deps import SessionDep
-from models import AgentVersion
+from utils.cache import not_modified, validator_headers
 from utils.logger import log
+from utils.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 from app.api.models.machine import  AgentVersionResponse
+from app.api.services.agent_version import AgentVersionService
 
 
 router = APIRouter()
@@ -14,22 +14,72 @@ router = APIRouter()
 
 @router.get("/", response_model=List[AgentVersionResponse], summary="获取代理版本列表")
 async def get_agent_versions(
-db: SessionDep,
+        db: SessionDep,
+        response: Response,
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="返回的最大记录数"),
+        cursor: Optional[str] = Query(None, description="分页游标，取自上一页响应头X-Next-Cursor"),
+        sort: str = Query("id", description="排序字段，前缀-表示倒序: id/name/created_at/updated_at"),
+        name_prefix: Optional[str] = Query(None, description="按名称前缀筛选"),
+        if_none_match: Optional[str] = Header(None, description="上次响应的ETag，未变化时返回304"),
+        if_modified_since: Optional[str] = Header(None, description="上次响应的Last-Modified，未变化时返回304"),
 ):
     """
     获取代理版本列表
     
-    - **skip**: 跳过的记录数
     - **limit**: 返回的最大记录数
+    - **cursor**: 分页游标，存在下一页时通过响应头X-Next-Cursor返回
+    - **sort**: 排序字段
+    - **name_prefix**: 按名称前缀筛选
+    - **If-None-Match**: 上次响应头中的ETag，目录未变化时返回304
+    - **If-Modified-Since**: 上次响应头中的Last-Modified，没有If-None-Match时使用
     
     返回:
     - 代理版本列表
     """
     try:
-        log.info(f"获取代理版本列表")
-        agent_versions= db.exec(select(AgentVersion)).all()
-        return agent_versions
+        log.info("获取代理版本列表")
+        page = await AgentVersionService.get_agent_versions(
+            db, limit=limit, cursor=cursor, sort=sort, name_prefix=name_prefix
+        )
+        headers = validator_headers(page.etag, page.last_modified)
+        if page.next_cursor:
+            headers["X-Next-Cursor"] = page.next_cursor
+        # 目录未变化时直接返回304，不再传输响应体
+        if not_modified(if_none_match, if_modified_since, page.etag, page.last_modified):
+            return Response(status_code=304, headers=headers)
+        response.headers.update(headers)
+        return page.items
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        log.exception(f"获取代理版本列表时发生异常: {str(e)}")
+        log.exception("获取代理版本列表时发生异常: {}", e)
         raise HTTPException(status_code=500, detail=f"获取代理版本列表失败: {str(e)}")
 
+
+@router.put("/{agent_version_id}/package", response_model=dict, summary="上传代理版本安装包")
+async def upload_agent_package(
+        db: SessionDep,
+        request: Request,
+        agent_version_id: int = Path(..., ge=1, description="代理版本ID"),
+):
+    """
+    上传代理版本安装包（请求体为install.tar.gz原始内容，Content-Type: application/octet-stream）
+
+    安装包按sha256内容寻址存储，部署时若目标机器已安装相同哈希的安装包则跳过上传
+
+    - **agent_version_id**: 代理版本ID
+
+    返回:
+    - 安装包sha256和大小
+    """
+    log.info("接收到上传代理安装包请求: id={}", agent_version_id)
+    try:
+        package = await AgentVersionService.set_package(db, agent_version_id, request.stream())
+        if not package:
+            raise HTTPException(status_code=404, detail=f"未找到ID为{agent_version_id}的代理版本")
+        return {"status": True, "message": "上传代理安装包成功", "data": package}
+    except HTTPException:
+        raise
+    except Exception as e:
+        log.exception("上传代理安装包时发生异常: {}", e)
+        raise HTTPException(status_code=500, detail=f"上传代理安装包失败: {str(e)}")
@@ -0,0 +1,193 @@
+import zlib
+from datetime import datetime
+from fastapi import APIRouter, HTTPException, Path, Query, Request
+from fastapi.responses import Response, StreamingResponse
+from typing import Optional
+
+from app.api.deps import SessionDep
+from app.api.models.execution import ExecutionCreate
+from utils.http_range import parse_range, range_headers, tail_range
+from utils.logger import log
+from app.api.services.execution import ExecutionService
+from utils.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+
+router = APIRouter()
+
+
+@router.post("/", response_model=dict, summary="创建测试执行")
+async def create_execution(
+        db: SessionDep,
+        data: ExecutionCreate,
+):
+    """
+    在所选机器上并发运行关联的测试用例，立即返回执行记录，结果在后台陆续写入
+
+    - **machine_ids**: 机器ID列表
+    - **test_case_ids**: 测试用例ID列表（可选，默认运行机器关联的全部用例）
+    - **params**: 测试参数（可选）
+    - **timeout**: 单个测试用例的超时时间（秒）
+
+    返回:
+    - 测试执行记录
+    """
+    try:
+        execution = await ExecutionService.start_execution(db, data)
+        return {"status": True, "message": "测试执行已创建", "data": execution}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        log.exception("创建测试执行时发生异常: {}", e)
+        raise HTTPException(status_code=500, detail=f"创建测试执行失败: {str(e)}")
+
+
+@router.get("/", response_model=dict, summary="获取测试执行列表")
+async def get_executions(
+        db: SessionDep,
+        machine_id: Optional[int] = Query(None, ge=1, description="按机器ID筛选"),
+        status: Optional[str] = Query(None, description="按状态筛选: running/completed/failed/interrupted"),
+        skip: int = Query(0, ge=0, description="跳过的记录数"),
+        limit: int = Query(100, ge=1, le=1000, description="返回的最大记录数"),
+):
+    """
+    获取测试执行列表，按创建时间倒序
+
+    返回:
+    - 测试执行列表
+    """
+    try:
+        executions = await ExecutionService.get_executions(db, machine_id=machine_id, status=status,
+                                                           skip=skip, limit=limit)
+        return {"status": True, "message": "获取测试执行列表成功", "data": executions, "total": len(executions)}
+    except Exception as e:
+        log.exception("获取测试执行列表时发生异常: {}", e)
+        raise HTTPException(status_code=500, detail=f"获取测试执行列表失败: {str(e)}")
+
+
+@router.get("/history", response_model=dict, summary="获取测试结果历史")
+async def get_result_history(
+        db: SessionDep,
+        machine_id: int = Query(..., ge=1, description="机器ID"),
+        test_case_id: Optional[int] = Query(None, ge=1, description="按测试用例ID筛选"),
+        since: Optional[datetime] = Query(None, description="结束时间下限（含）"),
+        until: Optional[datetime] = Query(None, description="结束时间上限（不含）"),
+        cursor: Optional[str] = Query(None, description="分页游标，取自上一页响应的next_cursor"),
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="每页数量"),
+):
+    """
+    获取机器上已结束的测试结果历史，按结束时间倒序
+
+    - **machine_id**: 机器ID
+    - **test_case_id**: 测试用例ID（可选）
+
+    返回:
+    - 结果列表，output为完整输出或其末尾部分，output_stored为true时完整输出通过
+      /executions/{execution_id}/results/{result_id}/output获取；存在下一页时next_cursor不为空
+    """
+    try:
+        results, next_cursor = await ExecutionService.get_history(db, machine_id, test_case_id=test_case_id,
+                                                                  since=since, until=until, cursor=cursor,
+                                                                  limit=limit)
+        return {"status": True, "message": "获取测试结果历史成功", "data": results, "next_cursor": next_cursor}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        log.exception("获取测试结果历史时发生异常: {}", e)
+        raise HTTPException(status_code=500, detail=f"获取测试结果历史失败: {str(e)}")
+
+
+@router.get("/{execution_id}", response_model=dict, summary="获取测试执行状态")
+async def get_execution(
+        db: SessionDep,
+        execution_id: int = Path(..., ge=1, description="执行ID"),
+):
+    """
+    获取测试执行状态
+
+    - **execution_id**: 执行ID
+
+    返回:
+    - 执行状态、成功/失败数，以及各状态的结果数
+    """
+    execution = await ExecutionService.get_execution(db, execution_id)
+    if not execution:
+        raise HTTPException(status_code=404, detail=f"未找到ID为{execution_id}的测试执行")
+    return {"status": True, "message": "获取测试执行状态成功", "data": execution}
+
+
+@router.get("/{execution_id}/results", response_model=dict, summary="获取测试执行结果")
+async def get_execution_results(
+        db: SessionDep,
+        execution_id: int = Path(..., ge=1, description="执行ID"),
+        machine_id: Optional[int] = Query(None, ge=1, description="按机器ID筛选"),
+        status: Optional[str] = Query(None, description="按状态筛选: pending/running/completed/failed/cancelled"),
+        skip: int = Query(0, ge=0, description="跳过的记录数"),
+        limit: int = Query(100, ge=1, le=1000, description="返回的最大记录数"),
+):
+    """
+    获取测试执行中各机器、各测试用例的结果
+
+    - **execution_id**: 执行ID
+
+    返回:
+    - 结果列表
+    """
+    try:
+        results = await ExecutionService.get_results(db, execution_id, machine_id=machine_id, status=status,
+                                                     skip=skip, limit=limit)
+        return {"status": True, "message": "获取测试执行结果成功", "data": results, "total": len(results)}
+    except Exception as e:
+        log.exception("获取测试执行结果时发生异常: {}", e)
+        raise HTTPException(status_code=500, detail=f"获取测试执行结果失败: {str(e)}")
+
+
+@router.get("/{execution_id}/results/{result_id}/output", summary="获取测试结果的完整输出")
+async def get_result_output(
+        request: Request,
+        db: SessionDep,
+        execution_id: int = Path(..., ge=1, description="执行ID"),
+        result_id: int = Path(..., ge=1, description="结果ID"),
+        tail: Optional[int] = Query(None, ge=1, description="只返回最后tail字节"),
+):
+    """
+    以纯文本流式返回测试结果的完整输出；大输出从段文件逐块读取，
+    客户端接受deflate编码时直接返回磁盘上的压缩数据
+
+    - **execution_id**: 执行ID
+    - **result_id**: 结果ID
+    - **tail**: 只返回最后tail字节
+    - 支持Range请求头（单个字节范围），与tail一样返回206和Content-Range，只解压覆盖该范围的部分，
+      可用于分页加载大输出
+    """
+    found = await ExecutionService.get_output(db, execution_id, result_id)
+    if found is None:
+        raise HTTPException(status_code=404, detail=f"未找到ID为{result_id}的测试结果")
+    output, stored = found
+    if stored is None:
+        data = (output or "").encode()
+        byte_range = parse_range(request.headers.get("range"), len(data)) or tail_range(tail, len(data))
+        start, end = byte_range or (0, len(data))
+        return Response(data[start:end], status_code=206 if byte_range else 200,
+                        media_type="text/plain; charset=utf-8", headers=range_headers(byte_range, len(data)))
+
+    byte_range = parse_range(request.headers.get("range"), stored.size) or tail_range(tail, stored.size)
+    # 只有完整输出可以直接返回压缩数据，范围请求按原始数据的字节偏移返回
+    compressed = byte_range is None and "deflate" in request.headers.get("accept-encoding", "").lower()
+    headers = {"Vary": "Accept-Encoding", **range_headers(byte_range, stored.size)}
+    if compressed:
+        headers["Content-Encoding"] = "deflate"
+        headers["Content-Length"] = str(stored.length)
+    # 先读出第一块，段文件缺失或损坏时返回错误状态码，而不是中断已开始的响应
+    chunks = ExecutionService.stream_output(stored, compressed=compressed, byte_range=byte_range)
+    try:
+        first = await anext(chunks, b"")
+    except (OSError, ValueError, zlib.error) as e:
+        log.error("读取测试输出失败: result_id={}, 错误: {}", result_id, e)
+        raise HTTPException(status_code=500, detail=f"读取测试输出失败: {str(e)}")
+
+    async def body():
+        yield first
+        async for chunk in chunks:
+            yield chunk
+
+    return StreamingResponse(body(), status_code=206 if byte_range else 200, media_type="text/plain; charset=utf-8",
+                             headers=headers)
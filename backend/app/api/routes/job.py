@@ -0,0 +1,49 @@
+from fastapi import APIRouter, HTTPException, Path, Query
+from typing import Optional
+
+from app.api.deps import SessionDep
+from utils.logger import log
+from app.api.services.job import JobService
+
+router = APIRouter()
+
+
+@router.get("/", response_model=dict, summary="获取部署任务列表")
+async def get_jobs(
+        db: SessionDep,
+        machine_id: Optional[int] = Query(None, ge=1, description="按机器ID筛选"),
+        status: Optional[str] = Query(None, description="按状态筛选: pending/running/succeeded/failed"),
+        skip: int = Query(0, ge=0, description="跳过的记录数"),
+        limit: int = Query(100, ge=1, le=1000, description="返回的最大记录数"),
+):
+    """
+    获取部署任务列表，按创建时间倒序
+
+    返回:
+    - 部署任务列表
+    """
+    try:
+        jobs = await JobService.get_jobs(db, machine_id=machine_id, status=status, skip=skip, limit=limit)
+        return {"status": True, "message": "获取部署任务列表成功", "data": jobs, "total": len(jobs)}
+    except Exception as e:
+        log.exception("获取部署任务列表时发生异常: {}", e)
+        raise HTTPException(status_code=500, detail=f"获取部署任务列表失败: {str(e)}")
+
+
+@router.get("/{job_id}", response_model=dict, summary="获取部署任务状态")
+async def get_job(
+        db: SessionDep,
+        job_id: int = Path(..., ge=1, description="任务ID"),
+):
+    """
+    获取部署任务状态
+
+    - **job_id**: 任务ID
+
+    返回:
+    - 任务状态、尝试次数、最近一次执行结果
+    """
+    job = await JobService.get_job(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"未找到ID为{job_id}的部署任务")
+    return {"status": True, "message": "获取部署任务状态成功", "data": job}
@@ -1,18 +1,33 @@
-from fastapi import APIRouter, HTTPException, Depends, Query, Path
-from typing import List
-from sqlmodel import select
+import json
+
+from fastapi import APIRouter, Header, HTTPException, Depends, Query, Path, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import inspect
+from typing import List, Optional
 
 from app.api.deps import SessionDep
 from models import Machine, AgentVersion
+from utils.cache import compute_etag, not_modified, validator_headers
+from utils.http_range import parse_range, range_headers, tail_range
 from utils.logger import log
+from utils.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from utils.responses import ModelResponse
 from app.api.models.machine import (
     MachineConnection, MachineConnectionResponse,
-    MachineCreate, MachineUpdate, MachineResponse
+    MachineCreate, MachineUpdate, MachineResponse, MachineTestCaseAssign,
+    MachineListResponse, MachineDetailResponse
 )
+from app.api.services.agent_version import AgentVersionService
+from app.api.services.deploy_progress import deploy_events, deploy_logs
+from app.api.services.health import health_monitor
 from app.api.services.machine import MachineService
+from app.api.services.job import JobService
 
 router = APIRouter()
 
+# 部署进度SSE心跳间隔（秒）
+SSE_HEARTBEAT_INTERVAL = 15
+
 
 @router.post("/validate-machine", response_model=MachineConnectionResponse, summary="检查机器连接")
 async def check_machine_connection(data: MachineConnection):
@@ -27,12 +42,12 @@ async def check_machine_connection(data: MachineConnection):
     - **status**: 连接状态
     - **message**: 连接信息
     """
-    log.info(f"接收到机器连接检查请求: {data.ip}")
+    log.info("接收到机器连接检查请求: {}", data.ip)
     try:
         result = await MachineService.check_connection(data)
         return result
     except Exception as e:
-        log.exception(f"处理机器连接检查请求时发生异常: {str(e)}")
+        log.exception("处理机器连接检查请求时发生异常: {}", e)
         raise HTTPException(status_code=500, detail=f"服务器内部错误: {str(e)}")
 
 
@@ -42,7 +57,7 @@ async def create_machine(
         db: SessionDep
 ):
     """
-    创建新的机器信息并自动部署代理
+    创建新的机器信息，并提交后台代理部署任务
     
     - **name**: 机器名称
     - **description**: 机器描述（可选）
@@ -54,18 +69,21 @@ async def create_machine(
     - **test_case_ids**: 测试用例ID列表（可选）
     
     返回:
-    - 机器信息和部署结果
+    - 机器信息和部署任务ID，可通过 GET /jobs/{job_id} 查询部署状态
     """
-    log.info(f"接收到创建机器信息请求: {machine.name}")
+    log.info("接收到创建机器信息请求: {}", machine.name)
     try:
-        result = await MachineService.create_machine(db, machine)
-        db_machine = result["machine"]
+        db_machine = await MachineService.create_machine(db, machine)
+        
+        # 自动部署代理：提交到部署任务队列，不在请求内等待
+        log.info("提交自动部署任务: machine_id={}", db_machine.id)
+        job = await JobService.enqueue_deploy(db, db_machine.id)
         
         # 查询代理版本信息
-        agent_version_query = select(AgentVersion).where(AgentVersion.id == db_machine.agent_version_id)
-        agent_version = db.exec(agent_version_query).first()
+        agent_versions = await AgentVersionService.get_agent_version_map(db)
+        agent_version = agent_versions.get(db_machine.agent_version_id)
         
-        # 返回创建成功的信息，即使代理部署失败
+        # 返回创建成功的信息，部署结果通过任务状态查询
         response = {
             "status": True,
             "message": "机器信息创建成功",
@@ -79,77 +97,136 @@ async def create_machine(
                     "name": agent_version.name if agent_version else None,
                     "description": agent_version.description if agent_version else None
                 }
-            }
+            },
+            "deploy_status": job.status,
+            "deploy_job_id": job.id,
+            "deploy_message": "nc_agent部署任务已提交"
         }
         
-        # 如果部署失败，添加失败信息，但仍返回200状态码
-        if result["deploy_result"] and not result["deploy_result"]["success"]:
-            deploy_message = result["deploy_result"]["message"]
-            log.warning(f"机器创建成功但代理部署失败: {deploy_message}")
-            response["deploy_status"] = False
-            response["deploy_message"] = f"nc_agent部署失败，请人工检查: {deploy_message}"
-        else:
-            response["deploy_status"] = True
-            response["deploy_message"] = "nc_agent部署成功"
-        
         return response
     except Exception as e:
-        log.exception(f"创建机器信息时发生异常: {str(e)}")
+        log.exception("创建机器信息时发生异常: {}", e)
         raise HTTPException(status_code=500, detail=f"创建机器信息失败: {str(e)}")
 
 
-@router.get("/", response_model=dict, summary="获取机器列表")
-async def get_machines(
+@router.post("/bulk/test-cases", response_model=dict, summary="批量分配测试用例")
+async def assign_test_cases(
+        data: MachineTestCaseAssign,
         db: SessionDep
+):
+    """
+    在一个事务中为多台机器批量分配测试用例
+    
+    - **machine_ids**: 机器ID列表
+    - **test_case_ids**: 测试用例ID列表
+    - **mode**: replace-替换为给定集合, add-追加, remove-移除
+    
+    返回:
+    - 处理的机器数、删除和新增的关联数
+    """
+    log.info("接收到批量分配测试用例请求: 机器数={}", len(data.machine_ids))
+    try:
+        result = await MachineService.assign_test_cases(db, data)
+        return {"status": True, "message": "批量分配测试用例成功", "data": result}
+    except Exception as e:
+        log.exception("批量分配测试用例时发生异常: {}", e)
+        raise HTTPException(status_code=500, detail=f"批量分配测试用例失败: {str(e)}")
+
+
+@router.get("/", response_model=MachineListResponse, response_class=ModelResponse, summary="获取机器列表")
+async def get_machines(
+        db: SessionDep,
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="返回的最大记录数"),
+        cursor: Optional[str] = Query(None, description="分页游标，取自上一页响应的next_cursor"),
+        sort: str = Query("id", description="排序字段，前缀-表示倒序: id/name/ip/test_type/created_at/updated_at"),
+        test_type: Optional[str] = Query(None, description="按测试类型筛选"),
+        agent_version_id: Optional[int] = Query(None, ge=1, description="按代理版本ID筛选"),
+        ip: Optional[str] = Query(None, description="按IP地址筛选"),
+        name_prefix: Optional[str] = Query(None, description="按名称前缀筛选"),
+        if_none_match: Optional[str] = Header(None, description="上次响应的ETag，未变化时返回304"),
+        if_modified_since: Optional[str] = Header(None, description="上次响应的Last-Modified，未变化时返回304"),
 ):
     """
     获取机器信息列表
     
+    - **limit**: 返回的最大记录数
+    - **cursor**: 分页游标
+    - **sort**: 排序字段
+    - **test_type** / **agent_version_id** / **ip** / **name_prefix**: 筛选条件
+    - **If-None-Match** / **If-Modified-Since**: 上次响应头中的ETag / Last-Modified，列表未变化时返回304
+    
     返回:
-    - 机器信息列表
+    - 机器信息列表，存在下一页时next_cursor不为空
     """
     try:
-        query = select(Machine)
-        machines = db.exec(query).all()
+        # 先用一条聚合查询判断列表是否变化，未变化时不加载机器记录
+        count, last_modified = await MachineService.get_machines_fingerprint(
+            db, test_type=test_type, agent_version_id=agent_version_id, ip=ip, name_prefix=name_prefix
+        )
+        # 代理版本目录很小且很少变化，直接使用缓存的全量映射
+        versions = await AgentVersionService.get_agent_version_map(db)
+        agent_versions = {
+            version_id: {"id": version.id, "name": version.name, "description": version.description}
+            for version_id, version in versions.items()
+        }
+        # 代理在线状态来自健康检查的缓存，状态变化时generation递增
+        etag = compute_etag([count, last_modified, agent_versions, health_monitor.generation, limit, cursor, sort,
+                             test_type, agent_version_id, ip, name_prefix])
+        last_modified = max(filter(None, [last_modified, *(version.updated_at for version in versions.values())]),
+                            default=None)
+        headers = validator_headers(etag, last_modified)
+        if not_modified(if_none_match, if_modified_since, etag, last_modified):
+            return Response(status_code=304, headers=headers)
         
-        # 获取所有机器关联的代理版本ID
-        agent_version_ids = [machine.agent_version_id for machine in machines]
-        # 查询所有相关的代理版本
-        agent_versions_query = select(AgentVersion).where(AgentVersion.id.in_(agent_version_ids))
-        agent_versions = {av.id: av for av in db.exec(agent_versions_query).all()}
-        # 构建响应
-        machines_data = []
-        for machine in machines:
-            agent_version = agent_versions.get(machine.agent_version_id)
-            machines_data.append({
-                "id": machine.id,
-                "name": machine.name,
-                "description": machine.description,
-                "test_type": machine.test_type,
-                "ip": machine.ip,
-                "created_at": machine.created_at,
-                "updated_at": machine.updated_at,
-                "agent_version": {
-                    "id": agent_version.id if agent_version else None,
-                    "name": agent_version.name if agent_version else None,
-                    "description": agent_version.description if agent_version else None
-                }
-            })
+        machines, next_cursor = await MachineService.get_machines(
+            db, limit=limit, cursor=cursor, sort=sort, test_type=test_type,
+            agent_version_id=agent_version_id, ip=ip, name_prefix=name_prefix
+        )
         
-        response = {
-            "status": True,
-            "message": "获取机器列表成功",
-            "data": machines_data,
-            "total": len(machines_data)
-        }
+        missing_version = {"id": None, "name": None, "description": None}
+        # 直接使用机器已加载的列值，响应整体校验一次（只保留列表项声明的字段）后序列化为JSON字节
+        response = MachineListResponse(
+            message="获取机器列表成功",
+            data=[
+                {**inspect(machine).dict, "agent_version": agent_versions.get(machine.agent_version_id, missing_version),
+                 "health": health_monitor.get(machine.id)}
+                for machine in machines
+            ],
+            total=len(machines),
+            next_cursor=next_cursor
+        )
         
-        return response
+        return ModelResponse(response, headers=headers)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        log.exception(f"获取机器列表时发生异常: {str(e)}")
+        log.exception("获取机器列表时发生异常: {}", e)
         raise HTTPException(status_code=500, detail=f"获取机器列表失败: {str(e)}")
 
 
-@router.get("/{machine_id}", response_model=dict, summary="获取单个机器信息")
+@router.get("/health", response_model=dict, summary="获取代理健康状态")
+async def get_machines_health(
+        status: Optional[str] = Query(None, description="按状态筛选: online/offline/unknown"),
+):
+    """
+    获取各机器上代理的健康状态（后台定时检查的缓存结果，不会触发检查）
+    
+    - **status**: 按状态筛选
+    
+    返回:
+    - 各状态的机器数及每台机器的状态、延迟、最近检查时间、连续失败次数和错误信息
+    """
+    try:
+        data = [state.detail(machine_id) for machine_id, state in sorted(health_monitor.states().items())
+                if status is None or state.status == status]
+        return {"status": True, "message": "获取代理健康状态成功", "data": data, "summary": health_monitor.summary()}
+    except Exception as e:
+        log.exception("获取代理健康状态时发生异常: {}", e)
+        raise HTTPException(status_code=500, detail=f"获取代理健康状态失败: {str(e)}")
+
+
+@router.get("/{machine_id}", response_model=MachineDetailResponse, response_class=ModelResponse,
+            summary="获取单个机器信息")
 async def get_machine(
         db: SessionDep,
         machine_id: int = Path(..., ge=1, description="机器ID"),
@@ -162,21 +239,19 @@ async def get_machine(
     返回:
     - 机器详细信息
     """
-    log.info(f"接收到获取机器信息请求: id={machine_id}")
+    log.info("接收到获取机器信息请求: id={}", machine_id)
     try:
-        machine = await MachineService.get_machine(db, machine_id)
+        machine = await MachineService.get_machine_detail(db, machine_id)
         if not machine:
             raise HTTPException(status_code=404, detail=f"未找到ID为{machine_id}的机器")
         
-        # 查询代理版本信息
-        agent_version_query = select(AgentVersion).where(AgentVersion.id == machine.agent_version_id)
-        agent_version = db.exec(agent_version_query).first()
+        # 代理版本和测试用例已随机器一起预加载
+        agent_version = machine.agent_version
         
-        # 构建响应
-        response = {
-            "status": True,
-            "message": "获取机器信息成功",
-            "data": {
+        # 构建响应，整体校验一次后直接序列化为JSON字节
+        response = MachineDetailResponse(
+            message="获取机器信息成功",
+            data={
                 "id": machine.id,
                 "name": machine.name,
                 "description": machine.description,
@@ -191,6 +266,7 @@ async def get_machine(
                     "name": agent_version.name if agent_version else None,
                     "description": agent_version.description if agent_version else None
                 },
+                "health": health_monitor.get(machine.id),
                 "test_cases": [
                     {
                         "id": test_case.id,
@@ -200,13 +276,13 @@ async def get_machine(
                     } for test_case in machine.test_cases
                 ] if machine.test_cases else []
             }
-        }
+        )
         
-        return response
+        return ModelResponse(response)
     except HTTPException:
         raise
     except Exception as e:
-        log.exception(f"获取机器信息时发生异常: {str(e)}")
+        log.exception("获取机器信息时发生异常: {}", e)
         raise HTTPException(status_code=500, detail=f"获取机器信息失败: {str(e)}")
 
 
@@ -225,7 +301,7 @@ async def update_machine(
     返回:
     - 更新后的机器信息
     """
-    log.info(f"接收到更新机器信息请求: id={machine_id}")
+    log.info("接收到更新机器信息请求: id={}", machine_id)
     try:
         updated_machine = await MachineService.update_machine(db, machine_id, machine_data)
         if not updated_machine:
@@ -234,7 +310,7 @@ async def update_machine(
     except HTTPException:
         raise
     except Exception as e:
-        log.exception(f"更新机器信息时发生异常: {str(e)}")
+        log.exception("更新机器信息时发生异常: {}", e)
         raise HTTPException(status_code=500, detail=f"更新机器信息失败: {str(e)}")
 
 
@@ -251,7 +327,7 @@ async def delete_machine(
     返回:
     - 删除操作结果
     """
-    log.info(f"接收到删除机器信息请求: id={machine_id}")
+    log.info("接收到删除机器信息请求: id={}", machine_id)
     try:
         success = await MachineService.delete_machine(db, machine_id)
         if not success:
@@ -260,7 +336,7 @@ async def delete_machine(
     except HTTPException:
         raise
     except Exception as e:
-        log.exception(f"删除机器信息时发生异常: {str(e)}")
+        log.exception("删除机器信息时发生异常: {}", e)
         raise HTTPException(status_code=500, detail=f"删除机器信息失败: {str(e)}")
 
 
@@ -283,7 +359,7 @@ async def deploy_agent(
     返回:
     - 部署操作结果
     """
-    log.info(f"接收到远程部署代理请求: machine_id={machine_id}")
+    log.info("接收到远程部署代理请求: machine_id={}", machine_id)
     try:
         result = await MachineService.deploy_agent(db, machine_id)
         return {
@@ -292,5 +368,81 @@ async def deploy_agent(
             "machine_id": machine_id
         }
     except Exception as e:
-        log.exception(f"远程部署代理时发生异常: {str(e)}")
+        log.exception("远程部署代理时发生异常: {}", e)
         raise HTTPException(status_code=500, detail=f"远程部署代理失败: {str(e)}")
+
+
+@router.get("/{machine_id}/deploy/events", summary="订阅部署进度（SSE）")
+async def deploy_events_stream(
+        machine_id: int = Path(..., ge=1, description="机器ID"),
+        replay: bool = Query(True, description="是否回放当前或最近一次部署的历史事件；为false时等待下一次部署"),
+):
+    """
+    以Server-Sent Events推送指定机器的部署进度，部署结束（result事件）后连接关闭
+    
+    - **machine_id**: 机器ID
+    - **replay**: 是否回放历史事件
+    
+    事件类型:
+    - **start**: 部署开始
+    - **stage**: 进入新阶段（connect/check/stop/mkdir/upload/verify/extract/start/process_check/port_check），包含上一阶段耗时
+    - **upload**: 上传进度，包含已传输字节数、百分比和速率（bytes_per_sec）
+    - **output**: 远程命令的一行stdout/stderr输出
+    - **result**: 部署结果
+    """
+    log.info("接收到订阅部署进度请求: machine_id={}", machine_id)
+
+    async def event_stream():
+        async for event in deploy_events.subscribe(str(machine_id), replay=replay, heartbeat=SSE_HEARTBEAT_INTERVAL):
+            if event is None:
+                # 心跳注释行，防止代理服务器断开空闲连接
+                yield ": ping\n\n"
+                continue
+            data = json.dumps(event, ensure_ascii=False)
+            yield f"id: {event['seq']}\nevent: {event['type']}\ndata: {data}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+
+@router.get("/{machine_id}/deploy/log", summary="获取部署日志")
+async def get_deploy_log(
+        request: Request,
+        machine_id: int = Path(..., ge=1, description="机器ID"),
+        tail: Optional[int] = Query(None, ge=1, description="只返回最后tail字节"),
+        follow: bool = Query(False, description="读到末尾后继续推送新输出，直到部署结束"),
+):
+    """
+    以纯文本流式返回指定机器最近一次部署的完整日志（阶段及远程命令输出），日志从磁盘分块读取
+
+    - **machine_id**: 机器ID
+    - **tail**: 只返回最后tail字节
+    - **follow**: 跟随模式，部署进行中时持续推送新输出
+    - 支持Range请求头（单个字节范围），与tail一样返回206和Content-Range，可用于分页加载大日志；
+      X-Log-Size为请求时的日志长度，X-Log-Open表示部署是否仍在进行
+    """
+    key = str(machine_id)
+    size = await deploy_logs.size(key)
+    if size is None:
+        raise HTTPException(status_code=404, detail=f"未找到机器{machine_id}的部署日志")
+    byte_range = parse_range(request.headers.get("range"), size) or tail_range(tail, size)
+    headers = {"X-Log-Size": str(size), "X-Log-Open": str(deploy_logs.is_open(key)).lower()}
+
+    if follow:
+        async def follow_stream():
+            async for chunk in deploy_logs.follow(key, byte_range[0] if byte_range else 0):
+                if await request.is_disconnected():
+                    break
+                yield chunk
+
+        headers.update({"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+        return StreamingResponse(follow_stream(), media_type="text/plain; charset=utf-8", headers=headers)
+
+    start, end = byte_range or (0, size)
+    headers.update(range_headers(byte_range, size))
+    return StreamingResponse(deploy_logs.stream(key, start, end), status_code=206 if byte_range else 200,
+                             media_type="text/plain; charset=utf-8", headers=headers)
@@ -0,0 +1,14 @@
+from fastapi import APIRouter
+from fastapi.responses import Response
+
+from utils.metrics import CONTENT_TYPE, registry
+
+router = APIRouter()
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    """
+    Prometheus指标（文本格式）
+    """
+    return Response(registry.render(), media_type=CONTENT_TYPE)
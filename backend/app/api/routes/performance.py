@@ -0,0 +1,66 @@
+from fastapi import APIRouter, HTTPException, Path, Query
+from typing import Literal, Optional
+
+from app.api.deps import SessionDep
+from app.api.models.performance import PerformanceSamples
+from utils.logger import log
+from app.api.services.machine import MachineService
+from app.api.services.performance import PerformanceService
+
+router = APIRouter()
+
+
+@router.post("/{machine_id}/samples", response_model=dict, summary="上报性能样本")
+async def ingest_samples(
+        db: SessionDep,
+        samples: PerformanceSamples,
+        machine_id: int = Path(..., ge=1, description="机器ID"),
+):
+    """
+    代理批量上报性能样本（按列），样本同时汇总到1秒、1分钟、1小时分辨率
+
+    - **machine_id**: 机器ID
+    - **samples**: 时间戳及cpu/memory/disk_io/network_io各列
+
+    返回:
+    - 写入的样本数
+    """
+    if not await MachineService.get_machine(db, machine_id):
+        raise HTTPException(status_code=404, detail=f"未找到ID为{machine_id}的机器")
+    try:
+        written = await PerformanceService.ingest(machine_id, samples)
+        return {"status": True, "message": "上报性能样本成功", "data": {"received": len(samples.timestamps),
+                                                                      "written": written}}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        log.exception("上报性能样本时发生异常: {}", e)
+        raise HTTPException(status_code=500, detail=f"上报性能样本失败: {str(e)}")
+
+
+@router.get("/{machine_id}", response_model=dict, summary="查询性能数据")
+async def get_performance(
+        machine_id: int = Path(..., ge=1, description="机器ID"),
+        start: Optional[float] = Query(None, description="起始时间戳（秒），默认为结束时间前一小时"),
+        end: Optional[float] = Query(None, description="结束时间戳（秒），默认为当前时间"),
+        points: int = Query(500, ge=1, le=10000, description="最大点数"),
+        resolution: Optional[int] = Query(None, description="指定分辨率（秒）: 1/60/3600，默认按点数自动选择"),
+        aggregate: Literal["avg", "min", "max"] = Query("avg", description="每个点的取值方式"),
+):
+    """
+    查询机器在时间范围内的性能数据，自动选择点数不超过points的最细分辨率
+
+    - **machine_id**: 机器ID
+
+    返回:
+    - 实际分辨率及数据点（timestamp/cpu/memory/diskIO/networkIO）
+    """
+    try:
+        data = await PerformanceService.query(machine_id, start=start, end=end, points=points,
+                                              resolution=resolution, aggregate=aggregate)
+        return {"status": True, "message": "查询性能数据成功", "data": data}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        log.exception("查询性能数据时发生异常: {}", e)
+        raise HTTPException(status_code=500, detail=f"查询性能数据失败: {str(e)}")
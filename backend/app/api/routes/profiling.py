@@ -0,0 +1,42 @@
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from typing import Literal
+
+from utils.logger import log
+from utils.profiling import profiler
+
+router = APIRouter()
+
+
+@router.get("/", response_model=dict, summary="获取最近的请求剖析记录")
+async def get_profiles():
+    """
+    获取最近的请求剖析记录（新的在前）
+
+    设置环境变量PROFILE_ENABLED=1后，请求头 X-Profile: 1 或查询参数 __profile=1 可剖析单个请求，响应头 X-Profile-Id 为剖析ID
+    """
+    try:
+        data = [profile.summary() for profile in reversed(profiler.profiles)]
+        return {"status": True, "message": "获取剖析记录成功", "data": data, "total": len(data)}
+    except Exception as e:
+        log.exception("获取剖析记录时发生异常: {}", e)
+        raise HTTPException(status_code=500, detail=f"获取剖析记录失败: {str(e)}")
+
+
+@router.get("/{profile_id}", summary="获取请求剖析结果")
+async def get_profile(
+        profile_id: str,
+        format: Literal["folded", "json"] = Query("folded", description="folded为折叠调用栈文本，json为摘要加调用栈"),
+):
+    """
+    获取请求剖析结果
+
+    folded格式每行为"栈帧;栈帧;... 样本数"，可直接交给flamegraph.pl或导入speedscope生成火焰图
+    """
+    profile = profiler.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="剖析记录不存在")
+    if format == "folded":
+        return PlainTextResponse(profile.folded())
+    stacks = [{"stack": stack.split(";"), "samples": count} for stack, count in profile.stacks.most_common()]
+    return {"status": True, "message": "获取剖析结果成功", "data": {**profile.summary(), "stacks": stacks}}
@@ -0,0 +1,55 @@
+from fastapi import APIRouter, HTTPException, Path
+
+from app.api.deps import SessionDep
+from utils.logger import log
+from app.api.models.rollout import RolloutCreate
+from app.api.services.rollout import RolloutService
+
+router = APIRouter()
+
+
+@router.post("/", response_model=dict, summary="创建批量部署")
+async def create_rollout(
+        data: RolloutCreate,
+        db: SessionDep
+):
+    """
+    批量部署代理到多台机器
+
+    - **machine_ids**: 机器ID列表（可选）
+    - **test_type**: 按测试类型筛选（可选）
+    - **agent_version_id**: 按代理版本ID筛选（可选）
+    - **parallelism**: 最大并发部署数
+    - **host_timeout**: 单台机器部署超时时间（秒）
+    - **force**: 是否强制重新部署
+
+    返回:
+    - 批量部署ID及初始进度，可通过 GET /rollouts/{rollout_id} 轮询
+    """
+    log.info("接收到批量部署请求: {}", data)
+    try:
+        rollout = await RolloutService.start_rollout(db, data)
+        return {"status": True, "message": "批量部署已创建", "data": rollout}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        log.exception("创建批量部署时发生异常: {}", e)
+        raise HTTPException(status_code=500, detail=f"创建批量部署失败: {str(e)}")
+
+
+@router.get("/{rollout_id}", response_model=dict, summary="获取批量部署进度")
+async def get_rollout(
+        rollout_id: str = Path(..., description="批量部署ID"),
+):
+    """
+    获取批量部署进度
+
+    - **rollout_id**: 批量部署ID
+
+    返回:
+    - 整体状态、汇总计数及每台机器的部署进度
+    """
+    rollout = RolloutService.get_rollout(rollout_id)
+    if not rollout:
+        raise HTTPException(status_code=404, detail=f"未找到ID为{rollout_id}的批量部署")
+    return {"status": True, "message": "获取批量部署进度成功", "data": rollout}
@@ -0,0 +1,104 @@
+from fastapi import APIRouter, HTTPException, Query
+from typing import Literal, Optional
+
+from app.api.deps import SessionDep
+from utils.logger import log
+from app.api.services.stats import DEFAULT_REGRESSION_THRESHOLD, StatsService
+
+router = APIRouter()
+
+
+@router.get("/summary", response_model=dict, summary="获取测试结果汇总统计")
+async def get_summary(
+        agent_version_id: Optional[int] = Query(None, ge=1, description="按代理版本ID筛选"),
+        test_case_id: Optional[int] = Query(None, ge=1, description="按测试用例ID筛选"),
+        test_type: Optional[str] = Query(None, description="按测试类型筛选"),
+):
+    """
+    获取测试结果汇总统计
+
+    返回:
+    - 结果数、通过率，以及耗时(duration_ms)、读写吞吐(read_mbps/write_mbps)、IOPS的均值和p50/p95/p99
+    """
+    try:
+        data = await StatsService.get_summary(agent_version_id=agent_version_id, test_case_id=test_case_id,
+                                              test_type=test_type)
+        return {"status": True, "message": "获取汇总统计成功", "data": data}
+    except Exception as e:
+        log.exception("获取汇总统计时发生异常: {}", e)
+        raise HTTPException(status_code=500, detail=f"获取汇总统计失败: {str(e)}")
+
+
+@router.get("/groups", response_model=dict, summary="分组统计测试结果")
+async def get_grouped(
+        db: SessionDep,
+        group_by: Literal["agent_version", "test_case", "test_type"] = Query(..., description="分组方式"),
+        agent_version_id: Optional[int] = Query(None, ge=1, description="按代理版本ID筛选"),
+        test_case_id: Optional[int] = Query(None, ge=1, description="按测试用例ID筛选"),
+        test_type: Optional[str] = Query(None, description="按测试类型筛选"),
+):
+    """
+    按代理版本、测试用例或测试类型分组统计通过率与指标分位数
+
+    返回:
+    - 每组的统计
+    """
+    try:
+        data = await StatsService.get_grouped(db, group_by, agent_version_id=agent_version_id,
+                                              test_case_id=test_case_id, test_type=test_type)
+        return {"status": True, "message": "获取分组统计成功", "data": data, "total": len(data)}
+    except Exception as e:
+        log.exception("获取分组统计时发生异常: {}", e)
+        raise HTTPException(status_code=500, detail=f"获取分组统计失败: {str(e)}")
+
+
+@router.get("/histogram", response_model=dict, summary="获取指标分布直方图")
+async def get_histogram(
+        metric: str = Query(..., description="指标: duration_ms/read_mbps/write_mbps/iops"),
+        bins: int = Query(20, ge=1, le=200, description="区间数"),
+        agent_version_id: Optional[int] = Query(None, ge=1, description="按代理版本ID筛选"),
+        test_case_id: Optional[int] = Query(None, ge=1, description="按测试用例ID筛选"),
+        test_type: Optional[str] = Query(None, description="按测试类型筛选"),
+):
+    """
+    获取指标的分布直方图（等宽区间）
+
+    返回:
+    - 各区间的起止值与结果数
+    """
+    try:
+        data = await StatsService.get_histogram(metric, bins=bins, agent_version_id=agent_version_id,
+                                                test_case_id=test_case_id, test_type=test_type)
+        return {"status": True, "message": "获取指标分布成功", "data": data}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        log.exception("获取指标分布时发生异常: {}", e)
+        raise HTTPException(status_code=500, detail=f"获取指标分布失败: {str(e)}")
+
+
+@router.get("/regression", response_model=dict, summary="对比代理版本")
+async def get_regression(
+        db: SessionDep,
+        base_version_id: int = Query(..., ge=1, description="基准代理版本ID"),
+        target_version_id: int = Query(..., ge=1, description="目标代理版本ID"),
+        test_type: Optional[str] = Query(None, description="按测试类型筛选"),
+        threshold: float = Query(DEFAULT_REGRESSION_THRESHOLD, gt=0, le=1, description="判定回归的阈值"),
+):
+    """
+    对比两个代理版本在各测试用例上的通过率、耗时与吞吐
+
+    - 耗时p50上升、吞吐/IOPS的p50下降超过阈值，或通过率下降超过阈值时记为回归
+
+    返回:
+    - 每个测试用例的基准/目标统计、变化率以及回归项
+    """
+    try:
+        data = await StatsService.get_regression(db, base_version_id, target_version_id, test_type=test_type,
+                                                 threshold=threshold)
+        regressed = sum(1 for item in data if item["regressions"])
+        return {"status": True, "message": "对比代理版本成功", "data": data, "total": len(data),
+                "regressed": regressed}
+    except Exception as e:
+        log.exception("对比代理版本时发生异常: {}", e)
+        raise HTTPException(status_code=500, detail=f"对比代理版本失败: {str(e)}")
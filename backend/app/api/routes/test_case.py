@@ -1,30 +1,56 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import List
-from sqlmodel import select
+from fastapi import APIRouter, Header, HTTPException, Query, Response
+from typing import List, Optional
 
 from app.api.deps import SessionDep
-from models import TestCase
+from utils.cache import not_modified, validator_headers
 from utils.logger import log
-from utils.db import get_db
+from utils.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 from app.api.models.machine import  TestCaseResponse
+from app.api.services.test_case import TestCaseService
 
 router = APIRouter()
 
 
 @router.get("/", response_model=List[TestCaseResponse], summary="获取测试用例列表")
-async def get_test_cases(db: SessionDep):
+async def get_test_cases(
+        db: SessionDep,
+        response: Response,
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="返回的最大记录数"),
+        cursor: Optional[str] = Query(None, description="分页游标，取自上一页响应头X-Next-Cursor"),
+        sort: str = Query("id", description="排序字段，前缀-表示倒序: id/name/type/created_at/updated_at"),
+        type: Optional[str] = Query(None, description="按测试用例类型筛选"),
+        name_prefix: Optional[str] = Query(None, description="按名称前缀筛选"),
+        if_none_match: Optional[str] = Header(None, description="上次响应的ETag，未变化时返回304"),
+        if_modified_since: Optional[str] = Header(None, description="上次响应的Last-Modified，未变化时返回304"),
+):
     """
     获取测试用例列表
     
-    - **skip**: 跳过的记录数
     - **limit**: 返回的最大记录数
+    - **cursor**: 分页游标，存在下一页时通过响应头X-Next-Cursor返回
+    - **sort**: 排序字段
+    - **type**: 按测试用例类型筛选
+    - **name_prefix**: 按名称前缀筛选
+    - **If-None-Match**: 上次响应头中的ETag，目录未变化时返回304
+    - **If-Modified-Since**: 上次响应头中的Last-Modified，没有If-None-Match时使用
     
     返回:
     - 测试用例列表
     """
     try:
-        test_cases = db.exec(select(TestCase)).all()
-        return test_cases
+        page = await TestCaseService.get_test_cases(
+            db, limit=limit, cursor=cursor, sort=sort, type=type, name_prefix=name_prefix
+        )
+        headers = validator_headers(page.etag, page.last_modified)
+        if page.next_cursor:
+            headers["X-Next-Cursor"] = page.next_cursor
+        # 目录未变化时直接返回304，不再传输响应体
+        if not_modified(if_none_match, if_modified_since, page.etag, page.last_modified):
+            return Response(status_code=304, headers=headers)
+        response.headers.update(headers)
+        return page.items
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        log.exception(f"获取测试用例列表时发生异常: {str(e)}")
+        log.exception("获取测试用例列表时发生异常: {}", e)
         raise HTTPException(status_code=500, detail=f"获取测试用例列表失败: {str(e)}")
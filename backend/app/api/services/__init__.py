@@ -1,3 +1,8 @@
 from app.api.services.machine import MachineService
 from app.api.services.agent_version import AgentVersionService
-from app.api.services.test_case import TestCaseService 
\ No newline at end of file
+from app.api.services.test_case import TestCaseService
+from app.api.services.rollout import RolloutService
+from app.api.services.job import JobService
+from app.api.services.execution import ExecutionService
+from app.api.services.performance import PerformanceService
+from app.api.services.stats import StatsService
@@ -1,23 +1,99 @@
-from typing import List
+import os
+from typing import AsyncIterator, Dict, Optional, Tuple
 from sqlmodel import  select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app.api.deps import SessionDep
+from constants import DEFAULT_AGENT_PACKAGE
+from utils.cache import CacheRegion, CachedPage, compute_etag, invalidate_on_write
 from utils.logger import log
-from models.machine import AgentVersion
+from utils.package_store import package_store
+from utils.pagination import DEFAULT_PAGE_SIZE, paginate, prefix_range
+from models.machine import AgentVersion, AgentPackage
+
+# 代理版本列表允许的排序字段
+AGENT_VERSION_SORT_FIELDS = ("id", "name", "created_at", "updated_at")
+
+# 代理版本目录缓存，代理版本写入提交后自动失效
+agent_version_cache = CacheRegion("agent_versions")
+invalidate_on_write(agent_version_cache, AgentVersion)
 
 
 class AgentVersionService:
     """代理版本服务"""
     
     @staticmethod
-    async def get_agent_versions(db: SessionDep, skip: int = 0, limit: int = 100) -> List[AgentVersion]:
+    async def get_agent_versions(db: AsyncSession, limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None,
+                                 sort: str = "id",
+                                 name_prefix: Optional[str] = None) -> CachedPage:
         """
-        获取代理版本列表
+        获取代理版本列表（游标分页，结果按查询参数缓存）
         :param db: 数据库会话
-        :param skip: 跳过数量
         :param limit: 限制数量
-        :return: 代理版本列表
+        :param cursor: 上一页返回的游标
+        :param sort: 排序字段，前缀"-"表示倒序
+        :param name_prefix: 按名称前缀筛选
+        :return: 代理版本列表、下一页游标及ETag
+        """
+        log.info("获取代理版本列表: cursor={}, limit={}", cursor, limit)
+
+        async def load() -> CachedPage:
+            query = select(AgentVersion)
+            if name_prefix:
+                query = query.where(prefix_range(AgentVersion.name, name_prefix))
+            items, next_cursor = await paginate(db, query, AgentVersion, sort, AGENT_VERSION_SORT_FIELDS, cursor, limit)
+            last_modified = max((item.updated_at for item in items), default=None)
+            return CachedPage(items, next_cursor, compute_etag([items, next_cursor]), last_modified)
+
+        return await agent_version_cache.get_or_load(("list", limit, cursor, sort, name_prefix), load)
+
+    @staticmethod
+    async def get_agent_version_map(db: AsyncSession) -> Dict[int, AgentVersion]:
+        """
+        获取全部代理版本，按ID索引（缓存）
+        :param db: 数据库会话
+        :return: 代理版本ID -> 代理版本
+        """
+
+        async def load() -> Dict[int, AgentVersion]:
+            return {av.id: av for av in (await db.exec(select(AgentVersion))).all()}
+
+        return await agent_version_cache.get_or_load(("map",), load)
+
+    @staticmethod
+    async def set_package(db: AsyncSession, agent_version_id: int, chunks: AsyncIterator[bytes]) -> Optional[AgentPackage]:
+        """
+        上传代理版本的安装包，按内容哈希存储
+        :param db: 数据库会话
+        :param agent_version_id: 代理版本ID
+        :param chunks: 安装包数据块
+        :return: 安装包信息，代理版本不存在时返回None
+        """
+        if await db.get(AgentVersion, agent_version_id) is None:
+            return None
+        sha256, size = await package_store.save_stream(chunks)
+        package = await db.get(AgentPackage, agent_version_id)
+        if package is None:
+            package = AgentPackage(agent_version_id=agent_version_id, sha256=sha256, size=size)
+        else:
+            package.sha256 = sha256
+            package.size = size
+        db.add(package)
+        await db.commit()
+        await db.refresh(package)
+        log.info("代理版本安装包已更新: id={}, sha256={}", agent_version_id, sha256)
+        return package
+
+    @staticmethod
+    async def resolve_package(db: AsyncSession, agent_version_id: int) -> Optional[Tuple[str, str]]:
+        """
+        获取代理版本对应的本地安装包，未上传时使用默认安装包
+        :param db: 数据库会话
+        :param agent_version_id: 代理版本ID
+        :return: (本地路径, sha256)，安装包不存在时返回None
         """
-        log.info(f"获取代理版本列表: skip={skip}, limit={limit}")
-        query = select(AgentVersion).offset(skip).limit(limit)
-        return db.exec(query).all()
+        package = await db.get(AgentPackage, agent_version_id)
+        if package is not None and package_store.exists(package.sha256):
+            return package_store.path(package.sha256), package.sha256
+        if os.path.exists(DEFAULT_AGENT_PACKAGE):
+            return DEFAULT_AGENT_PACKAGE, await package_store.file_digest(DEFAULT_AGENT_PACKAGE)
+        return None
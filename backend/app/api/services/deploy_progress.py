@@ -0,0 +1,127 @@
+import time
+from typing import Dict, Optional
+
+from constants import DEPLOY_LOG_DIR
+from utils.events import EventHub
+from utils.log_store import ChunkedLogStore
+from utils.metrics import registry
+
+# 上传进度事件的最小推送间隔（秒）
+UPLOAD_PROGRESS_INTERVAL = 0.5
+
+# 全局部署进度事件，频道为机器ID
+deploy_events = EventHub("deploy")
+# 全局部署日志，名称为机器ID，保存每台机器最近一次部署的完整输出
+deploy_logs = ChunkedLogStore(DEPLOY_LOG_DIR)
+
+DEPLOYS = registry.counter("deploys", "代理部署次数", ("result",))
+DEPLOY_DURATION = registry.histogram("deploy_duration_seconds", "代理部署总耗时", ("result",))
+DEPLOY_STAGE_DURATION = registry.histogram("deploy_stage_duration_seconds", "代理部署各阶段耗时", ("stage",))
+
+
+class DeployProgress:
+    """
+    单次部署的进度上报
+
+    事件类型:
+    - start: 部署开始
+    - stage: 进入新阶段（connect/check/stop/mkdir/upload/verify/extract/start/process_check/port_check）
+    - upload: 上传进度，包含已传输字节数与速率
+    - output: 远程命令输出的一行
+    - result: 部署结束
+
+    除上传进度外的事件同时以文本行写入部署日志，事件历史只保留最近的部分，完整输出从日志读取
+    """
+
+    def __init__(self, machine_id: int, hub: EventHub = deploy_events, logs: ChunkedLogStore = deploy_logs):
+        self.channel = str(machine_id)
+        self.hub = hub
+        self.logs = logs
+        self.started_at = time.monotonic()
+        self.current_stage: Optional[str] = None
+        self._stage_started_at = self.started_at
+        self._upload_reported_at = 0.0
+        self._finished = False
+
+    def _elapsed_ms(self, since: float) -> int:
+        return int((time.monotonic() - since) * 1000)
+
+    def _log(self, line: str):
+        self.logs.append(self.channel, (line + "\n").encode("utf-8", "replace"))
+
+    def start(self, ip: str, force: bool):
+        """
+        部署开始
+        :param ip: 目标机器IP
+        :param force: 是否强制重新部署
+        """
+        self.hub.open(self.channel)
+        self.logs.open(self.channel)
+        self._log(f"部署开始: ip={ip}, force={force}")
+        self.hub.publish(self.channel, {"type": "start", "ip": ip, "force": force})
+
+    def stage(self, name: str, message: str):
+        """
+        进入新阶段，同时给出上一阶段耗时
+        :param name: 阶段名称
+        :param message: 阶段说明
+        """
+        event = {"type": "stage", "stage": name, "message": message, "elapsed_ms": self._elapsed_ms(self.started_at)}
+        if self.current_stage is not None:
+            event["previous_stage"] = self.current_stage
+            event["previous_stage_ms"] = self._elapsed_ms(self._stage_started_at)
+            DEPLOY_STAGE_DURATION.labels(self.current_stage).observe(time.monotonic() - self._stage_started_at)
+        self.current_stage = name
+        self._stage_started_at = time.monotonic()
+        self._log(f"[{name}] {message}")
+        self.hub.publish(self.channel, event)
+
+    def upload(self, sent: int, total: int):
+        """
+        上传进度回调，按固定间隔推送，速率按upload阶段开始时间计算
+        :param sent: 已传输字节数
+        :param total: 本次需传输字节数
+        """
+        now = time.monotonic()
+        if sent < total and now - self._upload_reported_at < UPLOAD_PROGRESS_INTERVAL:
+            return
+        self._upload_reported_at = now
+        duration = max(now - self._stage_started_at, 1e-6)
+        self.hub.publish(self.channel, {
+            "type": "upload",
+            "sent": sent,
+            "total": total,
+            "percent": round(sent * 100 / total, 1) if total else 100.0,
+            "bytes_per_sec": int(sent / duration),
+        })
+
+    def output(self, stream: str, line: str):
+        """
+        远程命令输出回调
+        :param stream: stdout或stderr
+        :param line: 输出行
+        """
+        self._log(line)
+        self.hub.publish(self.channel, {"type": "output", "stage": self.current_stage, "stream": stream, "line": line})
+
+    def finish(self, result: Dict[str, bool | str]):
+        """
+        部署结束，推送结果并关闭本次运行
+        :param result: 部署结果
+        """
+        if self._finished:
+            return
+        self._finished = True
+        event = {"type": "result", "success": result["success"], "message": result["message"],
+                 "elapsed_ms": self._elapsed_ms(self.started_at)}
+        if self.current_stage is not None:
+            event["previous_stage"] = self.current_stage
+            event["previous_stage_ms"] = self._elapsed_ms(self._stage_started_at)
+            DEPLOY_STAGE_DURATION.labels(self.current_stage).observe(time.monotonic() - self._stage_started_at)
+        outcome = "success" if result["success"] else "failure"
+        DEPLOYS.labels(outcome).inc()
+        DEPLOY_DURATION.labels(outcome).observe(time.monotonic() - self.started_at)
+        self._log(f"部署{'成功' if result['success'] else '失败'}: {result['message']}")
+        self.logs.close(self.channel)
+        self.hub.publish(self.channel, event)
+        self.hub.close(self.channel)
@@ -0,0 +1,479 @@
+import asyncio
+import json
+import os
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import func, insert, update
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.api.models.execution import ExecutionCreate
+from app.api.services.stats import parse_result_metrics, result_stats
+from constants import RESULT_OUTPUT_DIR
+from models.execution import Execution, ExecutionOutput, ExecutionResult
+from models.machine import Machine, MachineTestCase, TestCase
+from utils.agent_client import agent_client
+from utils.db import async_session
+from utils.logger import log
+from utils.metrics import registry
+from utils.pagination import DEFAULT_PAGE_SIZE, paginate
+from utils.segment_store import SegmentRef, SegmentStore
+
+# 单次执行中同时进行的最大测试请求数（各代理另有并发上限）
+EXECUTION_MAX_CONCURRENCY = int(os.environ.get("EXECUTION_MAX_CONCURRENCY", "256"))
+# 结果批量写入：最长间隔（秒）与单批最大条数
+RESULT_FLUSH_INTERVAL = 0.5
+RESULT_FLUSH_BATCH = 200
+# 批量写入失败（如SQLite短暂锁定）时的最大重试次数，以及重试退避的基数与上限（秒）；
+# 重试仍失败时改为逐条写入
+RESULT_FLUSH_RETRIES = int(os.environ.get("RESULT_FLUSH_RETRIES", "5"))
+RESULT_FLUSH_BACKOFF_BASE = 0.5
+RESULT_FLUSH_BACKOFF_MAX = 10.0
+# 输出不超过该长度（字符）时直接保存在结果行中，超过时完整输出写入段文件，结果行只保留末尾部分
+RESULT_INLINE_OUTPUT_LENGTH = int(os.environ.get("RESULT_INLINE_OUTPUT_LENGTH", str(8 * 1024)))
+# 输出写入段文件时结果行中保留的末尾长度（字符）
+RESULT_OUTPUT_PREVIEW_LENGTH = 4 * 1024
+
+# 测试结果大输出的段文件存储
+result_output_store = SegmentStore(RESULT_OUTPUT_DIR)
+
+RESULT_WRITE_FAILURES = registry.counter("execution_result_write_failures", "执行结果写入失败次数",
+                                         ("action",))
+
+
+class _ResultWriter:
+    """
+    执行结果批量写入器
+
+    测试结果完成后先放入内存，按时间间隔或条数合并为一次批量UPDATE，
+    避免数百台机器同时回报结果时产生大量小事务。批量写入失败时整批放回队列按退避重试，
+    超过重试次数后逐条写入，只丢弃仍然写不进去的结果
+    """
+
+    def __init__(self, execution_id: int, meta: Dict[int, Dict[str, Any]]):
+        self.execution_id = execution_id
+        # 结果ID -> 统计分组字段(test_case_id/agent_version_id/test_type)
+        self.meta = meta
+        self.succeeded = 0
+        self.failed = 0
+        self._pending: Dict[int, Dict[str, Any]] = {}
+        # 已写入段文件、等待随结果一起插入的输出位置
+        self._outputs: List[Dict[str, Any]] = []
+        # 连续写入失败的次数
+        self._failures = 0
+        self._wakeup = asyncio.Event()
+        self._closed = False
+
+    def put(self, result_id: int, values: Dict[str, Any]):
+        """
+        记录一条结果更新，同一结果的多次更新会合并
+        :param result_id: 结果ID
+        :param values: 更新的字段
+        """
+        if values.get("status") == "completed":
+            self.succeeded += 1
+        elif values.get("status") in ("failed", "cancelled"):
+            self.failed += 1
+        self._pending.setdefault(result_id, {"id": result_id}).update(values)
+        if len(self._pending) >= RESULT_FLUSH_BATCH:
+            self._wakeup.set()
+
+    @staticmethod
+    async def _store_outputs(batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # 大输出压缩后追加到段文件，结果行中只保留末尾部分
+        large = [row for row in batch if row.get("output") and len(row["output"]) > RESULT_INLINE_OUTPUT_LENGTH]
+        if not large:
+            return []
+        payloads = [row["output"].encode() for row in large]
+        try:
+            refs = await result_output_store.append(payloads)
+        except OSError as e:
+            log.error("写入测试输出段文件失败，只保留输出末尾: {}", e)
+            refs = [None] * len(large)
+        outputs = []
+        for row, payload, ref in zip(large, payloads, refs):
+            row["output"] = row["output"][-RESULT_OUTPUT_PREVIEW_LENGTH:]
+            if ref is not None:
+                outputs.append({"result_id": row["id"], "segment": ref.segment, "offset": ref.offset,
+                                "length": ref.length, "size": len(payload)})
+        return outputs
+
+    async def _write(self, batch: List[Dict[str, Any]], outputs: List[Dict[str, Any]]):
+        async with async_session() as db:
+            await db.exec(update(ExecutionResult), params=batch)
+            if outputs:
+                await db.exec(insert(ExecutionOutput), params=outputs)
+            await db.exec(
+                update(Execution)
+                .where(Execution.id == self.execution_id)
+                .values(succeeded=self.succeeded, failed=self.failed)
+            )
+            await db.commit()
+
+    async def _write_rows(self, batch: List[Dict[str, Any]], outputs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # 逐条写入，返回写入成功的结果
+        outputs_by_result = {output["result_id"]: output for output in outputs}
+        written = []
+        for row in batch:
+            try:
+                async with async_session() as db:
+                    await db.exec(update(ExecutionResult), params=[row])
+                    if row["id"] in outputs_by_result:
+                        await db.exec(insert(ExecutionOutput), params=[outputs_by_result[row["id"]]])
+                    await db.commit()
+                written.append(row)
+            except Exception as e:
+                RESULT_WRITE_FAILURES.labels("dropped").inc()
+                log.error("写入执行结果失败，已丢弃: execution_id={}, result_id={}, 错误: {}",
+                          self.execution_id, row["id"], e)
+        try:
+            async with async_session() as db:
+                await db.exec(
+                    update(Execution)
+                    .where(Execution.id == self.execution_id)
+                    .values(succeeded=self.succeeded, failed=self.failed)
+                )
+                await db.commit()
+        except Exception as e:
+            log.error("更新执行统计失败: execution_id={}, 错误: {}", self.execution_id, e)
+        return written
+
+    def _requeue(self, batch: List[Dict[str, Any]], outputs: List[Dict[str, Any]]):
+        # 写入失败的结果放回队列，期间收到的同一结果的新值覆盖旧值
+        for row in batch:
+            newer = self._pending.get(row["id"])
+            self._pending[row["id"]] = {**row, **newer} if newer else row
+        self._outputs = outputs + self._outputs
+
+    def _backoff(self) -> float:
+        return min(RESULT_FLUSH_BACKOFF_BASE * 2 ** (self._failures - 1), RESULT_FLUSH_BACKOFF_MAX)
+
+    async def _flush(self) -> bool:
+        """
+        写入待写入的结果
+        :return: 是否已写入，失败并放回队列等待重试时返回False
+        """
+        if not self._pending and not self._outputs:
+            return True
+        batch, self._pending = list(self._pending.values()), {}
+        self._outputs.extend(await self._store_outputs(batch))
+        outputs, self._outputs = self._outputs, []
+        try:
+            await self._write(batch, outputs)
+        except Exception as e:
+            self._failures += 1
+            if self._failures <= RESULT_FLUSH_RETRIES:
+                RESULT_WRITE_FAILURES.labels("retried").inc()
+                log.warning("写入执行结果失败，{}秒后重试（第{}次）: execution_id={}, 条数={}, 错误: {}",
+                            self._backoff(), self._failures, self.execution_id, len(batch), e)
+                self._requeue(batch, outputs)
+                return False
+            log.error("写入执行结果连续失败{}次，改为逐条写入: execution_id={}, 错误: {}",
+                      self._failures, self.execution_id, e)
+            batch = await self._write_rows(batch, outputs)
+        self._failures = 0
+        # 提交后再更新统计，保证统计首次加载时不会漏掉或重复计算
+        result_stats.observe([{**self.meta[row["id"]], **row} for row in batch if "status" in row])
+        return True
+
+    async def run(self):
+        """
+        定期写入，直到close后写完剩余结果
+        """
+        while not self._closed:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), RESULT_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                if not await self._flush():
+                    await asyncio.sleep(self._backoff())
+            except Exception as e:
+                log.exception("写入执行结果失败: execution_id={}, 错误: {}", self.execution_id, e)
+        # 写完剩余结果，失败时按退避重试，超过重试次数后逐条写入
+        while not await self._flush():
+            await asyncio.sleep(self._backoff())
+
+    def close(self):
+        """
+        通知写入器结束
+        """
+        self._closed = True
+        self._wakeup.set()
+
+
+class ExecutionService:
+    """测试执行服务"""
+
+    # 持有后台任务引用，防止任务被垃圾回收
+    _tasks: Set[asyncio.Task] = set()
+
+    @staticmethod
+    async def start_execution(db: AsyncSession, data: ExecutionCreate) -> Execution:
+        """
+        创建测试执行，在后台并发调用各机器代理运行关联的测试用例
+        :param db: 数据库会话
+        :param data: 测试执行参数
+        :return: 测试执行记录
+        """
+        query = (
+            select(Machine.id, Machine.ip, TestCase.id, TestCase.name, Machine.agent_version_id, Machine.test_type)
+            .join(MachineTestCase, MachineTestCase.machine_id == Machine.id)
+            .join(TestCase, TestCase.id == MachineTestCase.test_case_id)
+            .where(Machine.id.in_(data.machine_ids))
+        )
+        if data.test_case_ids is not None:
+            query = query.where(TestCase.id.in_(data.test_case_ids))
+        links = (await db.exec(query)).all()
+        if not links:
+            raise ValueError("所选机器没有关联的测试用例")
+
+        execution = Execution(total=len(links), params=json.dumps(data.params, ensure_ascii=False) if data.params else None)
+        db.add(execution)
+        await db.flush()
+        await db.exec(insert(ExecutionResult), params=[
+            {"execution_id": execution.id, "machine_id": machine_id, "test_case_id": test_case_id,
+             "test_name": test_name, "agent_version_id": agent_version_id, "test_type": test_type,
+             "status": "pending"}
+            for machine_id, _, test_case_id, test_name, agent_version_id, test_type in links
+        ])
+        result_ids = (await db.exec(
+            select(ExecutionResult.id, ExecutionResult.machine_id, ExecutionResult.test_case_id,
+                   ExecutionResult.agent_version_id, ExecutionResult.test_type)
+            .where(ExecutionResult.execution_id == execution.id)
+        )).all()
+        await db.commit()
+        await db.refresh(execution)
+
+        ips = {machine_id: ip for machine_id, ip, *_ in links}
+        names = {(machine_id, test_case_id): test_name for machine_id, _, test_case_id, test_name, *_ in links}
+        plan = [(result_id, ips[machine_id], names[(machine_id, test_case_id)])
+                for result_id, machine_id, test_case_id, *_ in result_ids]
+        meta = {result_id: {"test_case_id": test_case_id, "agent_version_id": agent_version_id, "test_type": test_type}
+                for result_id, _, test_case_id, agent_version_id, test_type in result_ids}
+        log.info("创建测试执行: id={}, 机器数={}, 测试数={}", execution.id, len(ips), len(plan))
+
+        task = asyncio.create_task(ExecutionService._run(execution.id, plan, meta, data.params, data.timeout))
+        ExecutionService._tasks.add(task)
+        task.add_done_callback(ExecutionService._tasks.discard)
+        return execution
+
+    @staticmethod
+    async def _run(execution_id: int, plan: List[Tuple[int, str, str]], meta: Dict[int, Dict[str, Any]],
+                   params: Optional[Dict[str, Any]], timeout: float):
+        writer = _ResultWriter(execution_id, meta)
+        writer_task = asyncio.create_task(writer.run())
+        limit = asyncio.Semaphore(EXECUTION_MAX_CONCURRENCY)
+
+        async def run_one(result_id: int, ip: str, test_name: str):
+            async with agent_client.slot(ip), limit:
+                started_at = datetime.now()
+                writer.put(result_id, {"status": "running", "started_at": started_at})
+                try:
+                    result = await agent_client.run_test(ip, test_name, params, timeout=timeout)
+                    values = {
+                        "status": "completed" if result.get("status") == "completed" else "failed",
+                        "duration_ms": result.get("duration_ms"),
+                        "output": result.get("output"),
+                        "error": result.get("error") or None,
+                        "data": json.dumps(result["data"], ensure_ascii=False) if result.get("data") is not None else None,
+                        **parse_result_metrics(result.get("output"), result.get("data")),
+                    }
+                except asyncio.CancelledError:
+                    writer.put(result_id, {"status": "cancelled", "error": "执行已取消", "finished_at": datetime.now()})
+                    raise
+                except Exception as e:
+                    log.warning("运行测试失败: {}, test={}, 错误: {}: {}", ip, test_name, type(e).__name__, e)
+                    values = {"status": "failed", "error": f"{type(e).__name__}: {str(e)}"}
+                finished_at = datetime.now()
+                values["finished_at"] = finished_at
+                if values.get("duration_ms") is None:
+                    values["duration_ms"] = int((finished_at - started_at).total_seconds() * 1000)
+                writer.put(result_id, values)
+
+        status = "interrupted"
+        try:
+            await asyncio.gather(*(run_one(*item) for item in plan))
+            status = "completed" if writer.failed == 0 else "failed"
+        finally:
+            writer.close()
+            await writer_task
+            async with async_session() as db:
+                if status == "interrupted":
+                    await db.exec(
+                        update(ExecutionResult)
+                        .where(ExecutionResult.execution_id == execution_id,
+                               ExecutionResult.status.in_(["pending", "running"]))
+                        .values(status="cancelled", error="执行已取消")
+                    )
+                await db.exec(
+                    update(Execution)
+                    .where(Execution.id == execution_id)
+                    .values(status=status, succeeded=writer.succeeded, failed=writer.failed,
+                            finished_at=datetime.now())
+                )
+                await db.commit()
+            log.info("测试执行结束: id={}, 状态={}, 成功={}, 失败={}", execution_id, status,
+                     writer.succeeded, writer.failed)
+
+    @staticmethod
+    async def recover():
+        """
+        服务启动时将上次未完成的执行标记为中断
+        """
+        async with async_session() as db:
+            result = await db.exec(
+                update(Execution)
+                .where(Execution.status == "running")
+                .values(status="interrupted", finished_at=datetime.now())
+            )
+            await db.exec(
+                update(ExecutionResult)
+                .where(ExecutionResult.status.in_(["pending", "running"]))
+                .values(status="cancelled", error="服务重启，执行中断")
+            )
+            await db.commit()
+            if result.rowcount:
+                log.warning("标记中断的测试执行: {}个", result.rowcount)
+
+    @staticmethod
+    async def stop():
+        """
+        服务关闭时取消进行中的执行，已完成的结果写入后关闭段文件
+        """
+        tasks = list(ExecutionService._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        result_output_store.close()
+
+    @staticmethod
+    async def get_execution(db: AsyncSession, execution_id: int) -> Optional[Dict[str, Any]]:
+        """
+        获取测试执行及各状态的结果数
+        :param db: 数据库会话
+        :param execution_id: 执行ID
+        :return: 测试执行信息
+        """
+        execution = await db.get(Execution, execution_id)
+        if execution is None:
+            return None
+        counts = (await db.exec(
+            select(ExecutionResult.status, func.count())
+            .where(ExecutionResult.execution_id == execution_id)
+            .group_by(ExecutionResult.status)
+        )).all()
+        return {**execution.model_dump(), "summary": dict(counts)}
+
+    @staticmethod
+    async def get_executions(db: AsyncSession, machine_id: Optional[int] = None, status: Optional[str] = None,
+                             skip: int = 0, limit: int = 100) -> List[Execution]:
+        """
+        获取测试执行列表
+        :param db: 数据库会话
+        :param machine_id: 按机器ID筛选
+        :param status: 按状态筛选
+        :param skip: 跳过数量
+        :param limit: 限制数量
+        :return: 测试执行列表
+        """
+        query = select(Execution)
+        if machine_id is not None:
+            query = query.where(Execution.id.in_(
+                select(ExecutionResult.execution_id).where(ExecutionResult.machine_id == machine_id)
+            ))
+        if status is not None:
+            query = query.where(Execution.status == status)
+        query = query.order_by(Execution.id.desc()).offset(skip).limit(limit)
+        return (await db.exec(query)).all()
+
+    @staticmethod
+    async def get_results(db: AsyncSession, execution_id: int, machine_id: Optional[int] = None,
+                          status: Optional[str] = None, skip: int = 0, limit: int = 100) -> List[ExecutionResult]:
+        """
+        获取测试执行的结果列表
+        :param db: 数据库会话
+        :param execution_id: 执行ID
+        :param machine_id: 按机器ID筛选
+        :param status: 按状态筛选
+        :param skip: 跳过数量
+        :param limit: 限制数量
+        :return: 结果列表
+        """
+        query = select(ExecutionResult).where(ExecutionResult.execution_id == execution_id)
+        if machine_id is not None:
+            query = query.where(ExecutionResult.machine_id == machine_id)
+        if status is not None:
+            query = query.where(ExecutionResult.status == status)
+        query = query.order_by(ExecutionResult.id).offset(skip).limit(limit)
+        return (await db.exec(query)).all()
+
+    @staticmethod
+    async def get_history(db: AsyncSession, machine_id: int, test_case_id: Optional[int] = None,
+                          since: Optional[datetime] = None, until: Optional[datetime] = None,
+                          cursor: Optional[str] = None,
+                          limit: int = DEFAULT_PAGE_SIZE) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        获取机器上已结束的测试结果历史，按结束时间倒序（游标分页）
+        :param db: 数据库会话
+        :param machine_id: 机器ID
+        :param test_case_id: 按测试用例筛选
+        :param since: 结束时间下限（含）
+        :param until: 结束时间上限（不含）
+        :param cursor: 上一页返回的游标
+        :param limit: 每页数量
+        :return: (结果列表, 下一页游标)；output_size为完整输出的字节数，output_stored表示完整输出在段文件中
+        """
+        query = select(ExecutionResult).where(ExecutionResult.machine_id == machine_id,
+                                              ExecutionResult.finished_at.is_not(None))
+        if test_case_id is not None:
+            query = query.where(ExecutionResult.test_case_id == test_case_id)
+        if since is not None:
+            query = query.where(ExecutionResult.finished_at >= since)
+        if until is not None:
+            query = query.where(ExecutionResult.finished_at < until)
+        rows, next_cursor = await paginate(db, query, ExecutionResult, "-finished_at", ("finished_at",),
+                                           cursor=cursor, limit=limit)
+        sizes = dict((await db.exec(
+            select(ExecutionOutput.result_id, ExecutionOutput.size)
+            .where(ExecutionOutput.result_id.in_([row.id for row in rows]))
+        )).all()) if rows else {}
+        history = []
+        for row in rows:
+            size = sizes.get(row.id)
+            history.append({
+                **row.model_dump(),
+                "output_size": size if size is not None else len(row.output.encode()) if row.output else 0,
+                "output_stored": size is not None,
+            })
+        return history, next_cursor
+
+    @staticmethod
+    async def get_output(db: AsyncSession, execution_id: int,
+                         result_id: int) -> Optional[Tuple[Optional[str], Optional[ExecutionOutput]]]:
+        """
+        获取结果输出的位置
+        :param db: 数据库会话
+        :param execution_id: 执行ID
+        :param result_id: 结果ID
+        :return: (结果行中的输出, 段文件中的完整输出位置)，结果不存在时为None
+        """
+        result = await db.get(ExecutionResult, result_id)
+        if result is None or result.execution_id != execution_id:
+            return None
+        return result.output, await db.get(ExecutionOutput, result_id)
+
+    @staticmethod
+    def stream_output(output: ExecutionOutput, compressed: bool = False,
+                      byte_range: Optional[Tuple[int, int]] = None) -> AsyncIterator[bytes]:
+        """
+        从段文件流式读取完整输出
+        :param output: 输出位置
+        :param compressed: 是否直接返回zlib压缩数据（HTTP deflate编码），与byte_range不能同时使用
+        :param byte_range: 只读取[start, end)字节范围，只解压覆盖该范围的分块
+        :return: 数据块
+        """
+        ref = SegmentRef(output.segment, output.offset, output.length)
+        return result_output_store.stream(ref, compressed, byte_range)
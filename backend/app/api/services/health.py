@@ -0,0 +1,255 @@
+import asyncio
+import os
+import random
+import time
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Optional, Set
+
+from sqlmodel import select
+
+from models.machine import Machine
+from utils.agent_client import agent_client
+from utils.db import async_session
+from utils.logger import log
+from utils.metrics import registry
+
+# 是否启用代理健康检查
+HEALTH_CHECK_ENABLED = os.environ.get("HEALTH_CHECK_ENABLED", "1") == "1"
+# 在线代理的检查间隔（秒）
+HEALTH_CHECK_INTERVAL = float(os.environ.get("HEALTH_CHECK_INTERVAL", "30"))
+# 单次检查的超时时间（秒）
+HEALTH_CHECK_TIMEOUT = float(os.environ.get("HEALTH_CHECK_TIMEOUT", "3"))
+# 同时进行的检查数上限
+HEALTH_CHECK_CONCURRENCY = int(os.environ.get("HEALTH_CHECK_CONCURRENCY", "200"))
+# 离线代理的最大检查间隔（秒），连续失败时检查间隔从HEALTH_CHECK_INTERVAL起翻倍
+HEALTH_CHECK_MAX_BACKOFF = float(os.environ.get("HEALTH_CHECK_MAX_BACKOFF", "600"))
+# 检查间隔的随机抖动比例，避免所有代理在同一时刻被检查
+HEALTH_CHECK_JITTER = 0.2
+# 调度循环的唤醒间隔（秒）
+HEALTH_SCHEDULE_TICK = 1.0
+# 从数据库重新加载机器列表的间隔（秒）
+HEALTH_TARGET_REFRESH_INTERVAL = 10.0
+
+HEALTH_CHECK_DURATION = registry.histogram("agent_health_check_duration_seconds", "代理健康检查耗时", ("result",))
+
+
+@dataclass
+class AgentHealth:
+    """单台机器上代理的健康状态"""
+    ip: str
+    status: str = "unknown"
+    latency_ms: Optional[float] = None
+    checked_at: Optional[datetime] = None
+    last_online_at: Optional[datetime] = None
+    failures: int = 0
+    error: Optional[str] = None
+    version: Optional[str] = None
+    # 下次检查的时间（time.monotonic）
+    next_check: float = 0.0
+
+    def brief(self) -> Dict[str, Any]:
+        """
+        机器列表中展示的状态
+        :return: status/latency_ms
+        """
+        return {"status": self.status, "latency_ms": self.latency_ms}
+
+    def detail(self, machine_id: int) -> Dict[str, Any]:
+        """
+        完整的健康状态
+        :param machine_id: 机器ID
+        :return: 状态字典
+        """
+        return {
+            "machine_id": machine_id,
+            "ip": self.ip,
+            "status": self.status,
+            "latency_ms": self.latency_ms,
+            "checked_at": self.checked_at,
+            "last_online_at": self.last_online_at,
+            "failures": self.failures,
+            "error": self.error,
+            "version": self.version,
+        }
+
+
+class AgentHealthMonitor:
+    """
+    代理健康监控
+
+    单个调度协程定时从数据库加载机器列表，到期的机器各起一个检查协程访问代理的/health接口，
+    并发数由信号量限制，请求通过连接数有上限的共享连接池发送。检查结果缓存在内存中，
+    机器列表接口直接读取，不产生额外请求。在线代理按固定间隔检查，失败的代理按指数退避检查，
+    所有间隔都带随机抖动
+    """
+
+    def __init__(self, interval: float = HEALTH_CHECK_INTERVAL, timeout: float = HEALTH_CHECK_TIMEOUT,
+                 concurrency: int = HEALTH_CHECK_CONCURRENCY, max_backoff: float = HEALTH_CHECK_MAX_BACKOFF):
+        self.interval = interval
+        self.timeout = timeout
+        self.concurrency = concurrency
+        self.max_backoff = max_backoff
+        self._states: Dict[int, AgentHealth] = {}
+        self._inflight: Set[int] = set()
+        self._probes: Set[asyncio.Task] = set()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._task: Optional[asyncio.Task] = None
+        # 机器的在线状态有变化时递增，参与机器列表的ETag计算；延迟每次检查都会变化，不计入，
+        # 否则列表几乎无法命中304
+        self.generation = 0
+
+    def get(self, machine_id: int) -> Dict[str, Any]:
+        """
+        获取机器在列表中展示的健康状态
+        :param machine_id: 机器ID
+        :return: status/latency_ms，尚未检查时status为unknown
+        """
+        state = self._states.get(machine_id)
+        return state.brief() if state is not None else {"status": "unknown", "latency_ms": None}
+
+    def states(self) -> Dict[int, AgentHealth]:
+        """
+        获取所有机器的健康状态
+        :return: 机器ID到健康状态的映射
+        """
+        return dict(self._states)
+
+    def summary(self) -> Dict[str, int]:
+        """
+        按状态统计机器数
+        :return: 状态到机器数的映射
+        """
+        counts = Counter(state.status for state in self._states.values())
+        return {status: counts.get(status, 0) for status in ("online", "offline", "unknown")}
+
+    def check_soon(self, machine_id: int):
+        """
+        让机器在下一轮调度时立即检查（例如部署完成后）
+        :param machine_id: 机器ID
+        """
+        state = self._states.get(machine_id)
+        if state is not None:
+            state.next_check = 0.0
+
+    def _delay(self, failures: int) -> float:
+        base = self.interval if failures == 0 else min(self.interval * 2 ** (failures - 1), self.max_backoff)
+        return base * random.uniform(1 - HEALTH_CHECK_JITTER, 1 + HEALTH_CHECK_JITTER)
+
+    async def _refresh_targets(self):
+        async with async_session() as db:
+            rows = (await db.exec(select(Machine.id, Machine.ip))).all()
+        now = time.monotonic()
+        targets = dict(rows)
+        changed = False
+        for machine_id in list(self._states):
+            if machine_id not in targets:
+                del self._states[machine_id]
+                changed = True
+        for machine_id, ip in targets.items():
+            state = self._states.get(machine_id)
+            if state is None or state.ip != ip:
+                # 新机器的首次检查随机分散在几秒内
+                first_check = now + random.uniform(0, min(self.interval, 5))
+                self._states[machine_id] = AgentHealth(ip=ip, next_check=first_check)
+                changed = changed or state is not None
+        if changed:
+            self.generation += 1
+
+    async def _probe(self, machine_id: int, state: AgentHealth):
+        try:
+            async with self._semaphore:
+                started = time.perf_counter()
+                try:
+                    body = await agent_client.health(state.ip, self.timeout)
+                    error = None
+                except Exception as e:
+                    body, error = None, str(e) or type(e).__name__
+                    if isinstance(e, asyncio.TimeoutError):
+                        error = f"超时（{self.timeout}秒）"
+                elapsed = time.perf_counter() - started
+            if self._states.get(machine_id) is not state:
+                # 检查期间机器已被删除或IP已修改
+                return
+            previous = state.status
+            state.checked_at = datetime.now()
+            if error is None:
+                HEALTH_CHECK_DURATION.labels("online").observe(elapsed)
+                state.status = "online"
+                state.latency_ms = round(elapsed * 1000, 1)
+                state.last_online_at = state.checked_at
+                state.failures = 0
+                state.error = None
+                state.version = body.get("version")
+            else:
+                HEALTH_CHECK_DURATION.labels("offline").observe(elapsed)
+                if state.status == "online":
+                    log.warning("代理离线: machine_id={}, ip={}, 错误: {}", machine_id, state.ip, error)
+                state.status = "offline"
+                state.latency_ms = None
+                state.failures += 1
+                state.error = error
+            if previous == "offline" and state.status == "online":
+                log.info("代理恢复在线: machine_id={}, ip={}", machine_id, state.ip)
+            state.next_check = time.monotonic() + self._delay(state.failures)
+            if state.status != previous:
+                self.generation += 1
+        finally:
+            self._inflight.discard(machine_id)
+
+    async def _run(self):
+        refreshed_at = None
+        while True:
+            try:
+                now = time.monotonic()
+                if refreshed_at is None or now - refreshed_at >= HEALTH_TARGET_REFRESH_INTERVAL:
+                    await self._refresh_targets()
+                    refreshed_at = now
+                for machine_id, state in self._states.items():
+                    if state.next_check <= now and machine_id not in self._inflight:
+                        self._inflight.add(machine_id)
+                        task = asyncio.create_task(self._probe(machine_id, state))
+                        self._probes.add(task)
+                        task.add_done_callback(self._probes.discard)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.exception("代理健康检查调度异常: {}", e)
+            await asyncio.sleep(HEALTH_SCHEDULE_TICK)
+
+    def start(self):
+        """
+        启动调度协程
+        """
+        if self._task is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._task = asyncio.create_task(self._run())
+            log.info("代理健康检查已启动，检查间隔: {}秒，并发数: {}", self.interval, self.concurrency)
+
+    async def stop(self):
+        """
+        停止调度协程和进行中的检查
+        """
+        if self._task is not None:
+            tasks = [self._task, *self._probes]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self._task = None
+            self._probes.clear()
+            self._inflight.clear()
+
+
+# 全局代理健康监控
+health_monitor = AgentHealthMonitor()
+
+
+def _collect_health_metrics():
+    return [
+        ("agent_health_machines", "各健康状态的机器数", "gauge",
+         [("", {"status": status}, count) for status, count in health_monitor.summary().items()]),
+    ]
+
+
+registry.register_collector(_collect_health_metrics)
@@ -0,0 +1,234 @@
+import asyncio
+import os
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import update
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.api.services.health import health_monitor
+from app.api.services.machine import MachineService
+from models.job import DeployJob
+from utils.db import async_session
+from utils.logger import log
+
+# 部署任务工作协程数量
+DEPLOY_WORKERS = int(os.environ.get("DEPLOY_WORKERS", "4"))
+# 单个部署任务的最长执行时间（秒）
+DEPLOY_JOB_TIMEOUT = float(os.environ.get("DEPLOY_JOB_TIMEOUT", "300"))
+# 重试退避基数与上限（秒）
+RETRY_BACKOFF_BASE = 5
+RETRY_BACKOFF_MAX = 300
+# 没有新任务通知时的轮询间隔（秒）
+POLL_INTERVAL = 1.0
+
+
+class JobService:
+    """部署任务服务"""
+
+    @staticmethod
+    async def enqueue_deploy(db: AsyncSession, machine_id: int, force: bool = False, max_attempts: int = 3) -> DeployJob:
+        """
+        提交部署任务
+        :param db: 数据库会话
+        :param machine_id: 机器ID
+        :param force: 是否强制重新部署
+        :param max_attempts: 最大尝试次数
+        :return: 部署任务
+        """
+        job = DeployJob(machine_id=machine_id, force=force, max_attempts=max_attempts)
+        db.add(job)
+        await db.commit()
+        await db.refresh(job)
+        log.info("提交部署任务: job_id={}, machine_id={}", job.id, machine_id)
+        deploy_queue.notify()
+        return job
+
+    @staticmethod
+    async def get_job(db: AsyncSession, job_id: int) -> Optional[DeployJob]:
+        """
+        获取部署任务
+        :param db: 数据库会话
+        :param job_id: 任务ID
+        :return: 部署任务
+        """
+        return await db.get(DeployJob, job_id)
+
+    @staticmethod
+    async def get_jobs(db: AsyncSession, machine_id: Optional[int] = None, status: Optional[str] = None,
+                       skip: int = 0, limit: int = 100) -> List[DeployJob]:
+        """
+        获取部署任务列表
+        :param db: 数据库会话
+        :param machine_id: 按机器ID筛选
+        :param status: 按状态筛选
+        :param skip: 跳过数量
+        :param limit: 限制数量
+        :return: 部署任务列表
+        """
+        query = select(DeployJob)
+        if machine_id is not None:
+            query = query.where(DeployJob.machine_id == machine_id)
+        if status is not None:
+            query = query.where(DeployJob.status == status)
+        query = query.order_by(DeployJob.id.desc()).offset(skip).limit(limit)
+        return (await db.exec(query)).all()
+
+
+class DeployJobQueue:
+    """
+    基于SQLite持久化的部署任务队列
+
+    任务记录保存在deploy_jobs表中，服务重启后未完成的任务会重新排队；
+    多个工作协程并发领取任务，失败后按指数退避重试
+    """
+
+    def __init__(self, workers: int = DEPLOY_WORKERS):
+        self.workers = workers
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def notify(self):
+        """
+        通知工作协程有新任务
+        """
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def start(self):
+        """
+        恢复中断的任务并启动工作协程
+        """
+        async with async_session() as db:
+            result = await db.exec(
+                update(DeployJob)
+                .where(DeployJob.status == "running")
+                .values(status="pending", run_after=datetime.now(), updated_at=datetime.now())
+            )
+            await db.commit()
+            if result.rowcount:
+                log.warning("恢复中断的部署任务: {}个", result.rowcount)
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        log.info("部署任务队列已启动，工作协程数: {}", self.workers)
+
+    async def stop(self):
+        """
+        停止工作协程，正在执行的任务在下次启动时重新排队
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._wakeup = None
+
+    async def _claim(self) -> Optional[int]:
+        async with async_session() as db:
+            now = datetime.now()
+            job_ids = (await db.exec(
+                select(DeployJob.id)
+                .where(DeployJob.status == "pending", DeployJob.run_after <= now)
+                .order_by(DeployJob.run_after, DeployJob.id)
+                .limit(self.workers)
+            )).all()
+            for job_id in job_ids:
+                # 条件更新保证同一任务只会被一个工作协程领取
+                result = await db.exec(
+                    update(DeployJob)
+                    .where(DeployJob.id == job_id, DeployJob.status == "pending")
+                    .values(status="running", attempts=DeployJob.attempts + 1,
+                            started_at=now, updated_at=now)
+                )
+                await db.commit()
+                if result.rowcount:
+                    return job_id
+        return None
+
+    async def _worker(self, index: int):
+        while True:
+            try:
+                job_id = await self._claim()
+                if job_id is None:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), POLL_INTERVAL)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self._execute(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.exception("部署任务工作协程异常: worker={}, 错误: {}", index, e)
+                await asyncio.sleep(POLL_INTERVAL)
+
+    async def _execute(self, job_id: int):
+        try:
+            await self._run(job_id)
+        except Exception as e:
+            # 任务已被领取为running，异常时必须写回状态，否则任务会一直停留在running直到重启
+            log.exception("执行部署任务异常: job_id={}, 错误: {}", job_id, e)
+            async with async_session() as db:
+                job = await db.get(DeployJob, job_id)
+                if job is not None and job.status == "running":
+                    self._apply_result(job, {"success": False, "message": f"执行部署任务异常: {str(e)}"})
+                    await db.commit()
+
+    async def _run(self, job_id: int):
+        # 读取任务和部署目标后立即归还连接，远程部署期间不占用数据库连接
+        async with async_session() as db:
+            job = await db.get(DeployJob, job_id)
+            target = await MachineService.load_deploy_target(db, job.machine_id)
+        log.info("执行部署任务: job_id={}, machine_id={}, 第{}次尝试", job_id, job.machine_id, job.attempts)
+        if target is None:
+            result = {"success": False, "message": f"未找到ID为{job.machine_id}的机器"}
+            job.attempts = job.max_attempts
+        else:
+            machine, package = target
+            try:
+                result = await asyncio.wait_for(
+                    MachineService._deploy_agent_internal(machine, package, force=job.force),
+                    DEPLOY_JOB_TIMEOUT,
+                )
+            except asyncio.TimeoutError:
+                result = {"success": False, "message": f"部署超时（{DEPLOY_JOB_TIMEOUT}秒）"}
+
+        self._apply_result(job, result)
+
+        # 在新的短事务中保存任务状态，部署成功时同时更新机器记录
+        async with async_session() as db:
+            db.add(job)
+            if result["success"]:
+                await MachineService.mark_deployed(db, job.machine_id)
+            await db.commit()
+        if result["success"]:
+            # 部署完成后尽快刷新代理的在线状态
+            health_monitor.check_soon(job.machine_id)
+
+    @staticmethod
+    def _apply_result(job: DeployJob, result: dict):
+        """
+        根据执行结果更新任务状态：成功、退避后重试或最终失败
+        :param job: 部署任务
+        :param result: 执行结果
+        """
+        now = datetime.now()
+        job.message = result["message"]
+        job.updated_at = now
+        if result["success"]:
+            job.status = "succeeded"
+            job.finished_at = now
+        elif job.attempts < job.max_attempts:
+            delay = min(RETRY_BACKOFF_BASE * 2 ** (job.attempts - 1), RETRY_BACKOFF_MAX)
+            job.status = "pending"
+            job.run_after = now + timedelta(seconds=delay)
+            log.warning("部署任务失败，{}秒后重试: job_id={}, 原因: {}", delay, job.id, result['message'])
+        else:
+            job.status = "failed"
+            job.finished_at = now
+            log.error("部署任务最终失败: job_id={}, 原因: {}", job.id, result['message'])
+
+
+# 全局部署任务队列
+deploy_queue = DeployJobQueue()
@@ -1,16 +1,34 @@
+import asyncio
 import paramiko
 import socket
-import os
-import time
 from datetime import datetime
-from typing import List, Optional, Dict
-from sqlmodel import Session, select
+from typing import List, Optional, Dict, Tuple
+from sqlalchemy import delete, func, insert, update
+from sqlalchemy.orm import joinedload, selectinload
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from utils.logger import log
 from app.api.models.machine import (
     MachineConnection, MachineConnectionResponse,
-    MachineCreate, MachineUpdate
+    MachineCreate, MachineUpdate, MachineTestCaseAssign
 )
+from app.api.services.agent_version import AgentVersionService
+from app.api.services.deploy_progress import DeployProgress
+from app.api.services.performance import PerformanceService
+from constants import (DEFAULT_AGENT_PACKAGE, REMOTE_AGENT_DIR, REMOTE_AGENT_LOG, REMOTE_PACKAGE_DIR,
+                       REMOTE_PACKAGE_MARKER, SSH_PORT)
 from models.machine import Machine, MachineTestCase
+from utils.pagination import DEFAULT_PAGE_SIZE, paginate, prefix_range
+from utils.ssh import AsyncSSHClient, CommandResult, ssh_pool
+
+# 机器列表允许的排序字段
+MACHINE_SORT_FIELDS = ("id", "name", "ip", "test_type", "created_at", "updated_at")
+# 单条SQL语句的绑定参数上限，按较早SQLite版本的999计算（3.32起为32766）
+SQLITE_MAX_VARIABLES = 999
+# 批量插入关联记录时每条INSERT语句的行数，每行绑定machine_id和test_case_id两个参数
+LINK_INSERT_BATCH_SIZE = SQLITE_MAX_VARIABLES // 2
+# 部署失败信息中附带的nc_agent.log末尾行数，完整日志写入部署日志
+DEPLOY_MESSAGE_LOG_LINES = 20
 
 
 class MachineService:
@@ -24,63 +42,54 @@ class MachineService:
         :return: 连接结果
         """
         try:
-            log.info(f"开始检查机器连接: {connection_data.ip}")
-            
-            # 创建SSH客户端
-            client = paramiko.SSHClient()
-            client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+            log.info("开始检查机器连接: {}", connection_data.ip)
             
-            # 尝试连接，设置超时时间为5秒
-            client.connect(
+            # 尝试连接，设置超时时间为5秒，并执行简单命令验证连接
+            async with ssh_pool.acquire(
                 hostname=connection_data.ip,
                 username=connection_data.username,
                 password=connection_data.password,
-                timeout=5
-            )
-            
-            # 执行简单命令验证连接
-            stdin, stdout, stderr = client.exec_command("echo 'Connection success'")
-            output = stdout.read().decode().strip()
+                port=SSH_PORT,
+                connect_timeout=5
+            ) as client:
+                await client.exec("echo 'Connection success'", timeout=5)
             
-            # 关闭连接
-            client.close()
-            
-            log.info(f"机器连接成功: {connection_data.ip}")
+            log.info("机器连接成功: {}", connection_data.ip)
             return MachineConnectionResponse(
                 success=True,
                 message="连接成功"
             )
             
         except paramiko.AuthenticationException:
-            log.error(f"机器连接认证失败: {connection_data.ip}")
+            log.error("机器连接认证失败: {}", connection_data.ip)
             return MachineConnectionResponse(
                 success=False,
                 message="认证失败，请检查用户名和密码"
             )
             
         except socket.timeout:
-            log.error(f"机器连接超时: {connection_data.ip}")
+            log.error("机器连接超时: {}", connection_data.ip)
             return MachineConnectionResponse(
                 success=False,
                 message="连接超时，请检查IP地址和网络状态"
             )
             
         except Exception as e:
-            log.exception(f"机器连接异常: {connection_data.ip}, 错误: {str(e)}")
+            log.exception("机器连接异常: {}, 错误: {}", connection_data.ip, e)
             return MachineConnectionResponse(
                 success=False,
                 message=f"连接异常: {str(e)}"
             )
     
     @staticmethod
-    async def create_machine(db: Session, machine_data: MachineCreate) -> dict:
+    async def create_machine(db: AsyncSession, machine_data: MachineCreate) -> Machine:
         """
-        创建机器信息并自动部署代理
+        创建机器信息，代理部署由部署任务队列在后台完成
         :param db: 数据库会话
         :param machine_data: 机器信息
-        :return: 创建和部署结果
+        :return: 机器信息
         """
-        log.info(f"创建机器信息: {machine_data.name}, IP: {machine_data.ip}")
+        log.info("创建机器信息: {}, IP: {}", machine_data.name, machine_data.ip)
         
         # 创建机器记录
         db_machine = Machine(
@@ -92,58 +101,102 @@ class MachineService:
             username=machine_data.username,
             password=machine_data.password
         )
-        print(machine_data)
         db.add(db_machine)
-        db.commit()
-        db.refresh(db_machine)
+        await db.commit()
+        await db.refresh(db_machine)
         
         # 添加测试用例关联
         if machine_data.test_case_ids:
-            for test_case_id in machine_data.test_case_ids:
-                print(test_case_id)
-                link = MachineTestCase(
-                    machine_id=db_machine.id,
-                    test_case_id=test_case_id
-                )
-                db.add(link)
-            
-            db.commit()
-            db.refresh(db_machine)
+            await MachineService._apply_test_case_links(db, [db_machine.id], machine_data.test_case_ids, mode="add")
+            await db.commit()
+            await db.refresh(db_machine)
         
-        # 自动部署代理
-        log.info(f"自动部署代理: machine_id={db_machine.id}")
-        deploy_result = await MachineService._deploy_agent_internal(db, db_machine)
-        deploy_result = {"success": True, "message": "代理部署成功"}
-        return {
-            "machine": db_machine,
-            "deploy_result": deploy_result
-        }
+        return db_machine
     
     @staticmethod
-    async def get_machines(db: Session) -> List[Machine]:
+    async def get_machines(db: AsyncSession, limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None,
+                           sort: str = "id", test_type: Optional[str] = None,
+                           agent_version_id: Optional[int] = None, ip: Optional[str] = None,
+                           name_prefix: Optional[str] = None) -> Tuple[List[Machine], Optional[str]]:
         """
-        获取机器列表
+        获取机器列表（游标分页）
         :param db: 数据库会话
-        :param skip: 跳过数量
         :param limit: 限制数量
-        :return: 机器列表
+        :param cursor: 上一页返回的游标
+        :param sort: 排序字段，前缀"-"表示倒序
+        :param test_type: 按测试类型筛选
+        :param agent_version_id: 按代理版本ID筛选
+        :param ip: 按IP地址筛选
+        :param name_prefix: 按名称前缀筛选
+        :return: (机器列表, 下一页游标)
         """
+        query = MachineService._filter(select(Machine), test_type, agent_version_id, ip, name_prefix)
+        return await paginate(db, query, Machine, sort, MACHINE_SORT_FIELDS, cursor, limit)
+
+    @staticmethod
+    def _filter(query, test_type: Optional[str], agent_version_id: Optional[int], ip: Optional[str],
+                name_prefix: Optional[str]):
+        if test_type is not None:
+            query = query.where(Machine.test_type == test_type)
+        if agent_version_id is not None:
+            query = query.where(Machine.agent_version_id == agent_version_id)
+        if ip is not None:
+            query = query.where(Machine.ip == ip)
+        if name_prefix:
+            query = query.where(prefix_range(Machine.name, name_prefix))
+        return query
 
+    @staticmethod
+    async def get_machines_fingerprint(db: AsyncSession, test_type: Optional[str] = None,
+                                       agent_version_id: Optional[int] = None, ip: Optional[str] = None,
+                                       name_prefix: Optional[str] = None) -> Tuple[int, Optional[datetime]]:
+        """
+        获取机器列表的版本指纹，用于条件请求，只执行一条聚合查询，不加载机器记录
+        新增、修改会改变最大更新时间，删除会改变数量
+        :param db: 数据库会话
+        :param test_type: 按测试类型筛选
+        :param agent_version_id: 按代理版本ID筛选
+        :param ip: 按IP地址筛选
+        :param name_prefix: 按名称前缀筛选
+        :return: (机器数量, 最大更新时间)
+        """
+        query = MachineService._filter(select(func.count(), func.max(Machine.updated_at)), test_type,
+                                       agent_version_id, ip, name_prefix)
+        count, last_modified = (await db.exec(query)).one()
+        return count, last_modified
     
     @staticmethod
-    async def get_machine(db: Session, machine_id: int) -> Optional[Machine]:
+    async def get_machine(db: AsyncSession, machine_id: int) -> Optional[Machine]:
         """
         获取机器信息
         :param db: 数据库会话
         :param machine_id: 机器ID
         :return: 机器信息
         """
-        log.info(f"获取机器信息: id={machine_id}")
+        log.info("获取机器信息: id={}", machine_id)
         query = select(Machine).where(Machine.id == machine_id)
-        return db.exec(query).first()
+        return (await db.exec(query)).first()
     
     @staticmethod
-    async def update_machine(db: Session, machine_id: int, machine_data: MachineUpdate) -> Optional[Machine]:
+    async def get_machine_detail(db: AsyncSession, machine_id: int) -> Optional[Machine]:
+        """
+        获取机器信息，并预加载代理版本和测试用例
+        代理版本通过JOIN加载，测试用例通过一次IN查询加载，总共固定两条SQL
+        :param db: 数据库会话
+        :param machine_id: 机器ID
+        :return: 机器信息
+        """
+        log.info("获取机器详细信息: id={}", machine_id)
+        query = (
+            select(Machine)
+            .where(Machine.id == machine_id)
+            .options(joinedload(Machine.agent_version), selectinload(Machine.test_cases))
+            .execution_options(populate_existing=True)
+        )
+        return (await db.exec(query)).first()
+    
+    @staticmethod
+    async def update_machine(db: AsyncSession, machine_id: int, machine_data: MachineUpdate) -> Optional[Machine]:
         """
         更新机器信息
         :param db: 数据库会话
@@ -151,11 +204,11 @@ class MachineService:
         :param machine_data: 机器信息
         :return: 更新后的机器信息
         """
-        log.info(f"更新机器信息: id={machine_id}")
+        log.info("更新机器信息: id={}", machine_id)
         db_machine = await MachineService.get_machine(db, machine_id)
         
         if not db_machine:
-            log.error(f"未找到机器: id={machine_id}")
+            log.error("未找到机器: id={}", machine_id)
             return None
         
         # 更新机器基本信息
@@ -168,217 +221,318 @@ class MachineService:
         
         # 如果提供了测试用例ID列表，则更新关联关系
         if machine_data.test_case_ids is not None:
-            # 删除现有关联
-            query = select(MachineTestCase).where(MachineTestCase.machine_id == machine_id)
-            existing_links = db.exec(query).all()
-            for link in existing_links:
-                db.delete(link)
-            
-            # 添加新关联
-            for test_case_id in machine_data.test_case_ids:
-                link = MachineTestCase(
-                    machine_id=machine_id,
-                    test_case_id=test_case_id
-                )
-                db.add(link)
+            await MachineService._apply_test_case_links(db, [machine_id], machine_data.test_case_ids, mode="replace")
         
-        db.commit()
-        db.refresh(db_machine)
-        return db_machine
+        await db.commit()
+        # 重新加载并预加载关联数据，避免响应序列化时逐个懒加载
+        return await MachineService.get_machine_detail(db, machine_id)
     
     @staticmethod
-    async def delete_machine(db: Session, machine_id: int) -> bool:
+    async def delete_machine(db: AsyncSession, machine_id: int) -> bool:
         """
         删除机器信息
         :param db: 数据库会话
         :param machine_id: 机器ID
         :return: 是否删除成功
         """
-        log.info(f"删除机器信息: id={machine_id}")
+        log.info("删除机器信息: id={}", machine_id)
         db_machine = await MachineService.get_machine(db, machine_id)
         
         if not db_machine:
-            log.error(f"未找到机器: id={machine_id}")
+            log.error("未找到机器: id={}", machine_id)
             return False
         
         # 删除关联关系
-        query = select(MachineTestCase).where(MachineTestCase.machine_id == machine_id)
-        existing_links = db.exec(query).all()
-        for link in existing_links:
-            db.delete(link)
+        await db.exec(delete(MachineTestCase).where(MachineTestCase.machine_id == machine_id))
         
         # 删除机器记录
-        db.delete(db_machine)
-        db.commit()
+        await db.delete(db_machine)
+        await db.commit()
+
+        # 删除性能数据
+        await PerformanceService.drop(machine_id)
         return True
     
     @staticmethod
-    async def deploy_agent(db: Session, machine_id: int) -> Dict[str, bool | str]:
+    async def _apply_test_case_links(db: AsyncSession, machine_ids: List[int], test_case_ids: List[int],
+                               mode: str = "replace") -> Tuple[int, int]:
         """
-        远程部署代理
+        按集合差异批量更新机器与测试用例的关联，只执行一条DELETE和分批的多行INSERT，不提交事务
+        :param db: 数据库会话
+        :param machine_ids: 机器ID列表
+        :param test_case_ids: 测试用例ID列表
+        :param mode: replace-替换为给定集合, add-追加, remove-移除
+        :return: (删除的关联数, 新增的关联数)
+        """
+        if not machine_ids:
+            return 0, 0
+        wanted = set(test_case_ids)
+        existing = set((await db.exec(
+            select(MachineTestCase.machine_id, MachineTestCase.test_case_id)
+            .where(MachineTestCase.machine_id.in_(machine_ids))
+        )).all())
+        
+        if mode == "remove":
+            remove_ids = wanted & {test_case_id for _, test_case_id in existing}
+            add_pairs = set()
+        else:
+            remove_ids = {test_case_id for _, test_case_id in existing} - wanted if mode == "replace" else set()
+            add_pairs = {(machine_id, test_case_id) for machine_id in machine_ids for test_case_id in wanted} - existing
+        
+        deleted = 0
+        if remove_ids:
+            result = await db.exec(
+                delete(MachineTestCase)
+                .where(MachineTestCase.machine_id.in_(machine_ids), MachineTestCase.test_case_id.in_(remove_ids))
+            )
+            deleted = result.rowcount
+        
+        rows = [{"machine_id": machine_id, "test_case_id": test_case_id} for machine_id, test_case_id in sorted(add_pairs)]
+        for start in range(0, len(rows), LINK_INSERT_BATCH_SIZE):
+            await db.exec(insert(MachineTestCase).values(rows[start:start + LINK_INSERT_BATCH_SIZE]))
+        
+        log.info("更新测试用例关联: 机器数={}, 删除={}, 新增={}", len(machine_ids), deleted, len(rows))
+        return deleted, len(rows)
+    
+    @staticmethod
+    async def assign_test_cases(db: AsyncSession, data: MachineTestCaseAssign) -> Dict[str, int]:
+        """
+        在一个事务中为多台机器批量分配测试用例
+        :param db: 数据库会话
+        :param data: 批量分配参数
+        :return: 处理的机器数、删除和新增的关联数
+        """
+        log.info("批量分配测试用例: 机器数={}, 测试用例数={}, 模式={}", len(data.machine_ids),
+                 len(data.test_case_ids), data.mode)
+        # 只处理存在的机器，避免产生孤立的关联记录
+        machine_ids = (await db.exec(select(Machine.id).where(Machine.id.in_(data.machine_ids)))).all()
+        deleted, inserted = await MachineService._apply_test_case_links(db, machine_ids, data.test_case_ids, mode=data.mode)
+        if deleted or inserted:
+            await db.exec(update(Machine).where(Machine.id.in_(machine_ids)).values(updated_at=datetime.now()))
+        await db.commit()
+        return {"machines": len(machine_ids), "deleted": deleted, "inserted": inserted}
+    
+    @staticmethod
+    async def deploy_agent(db: AsyncSession, machine_id: int) -> Dict[str, bool | str]:
+        """
+        远程部署代理，远程操作期间不占用数据库连接
         :param db: 数据库会话
         :param machine_id: 机器ID
         :return: 部署结果
         """
-        log.info(f"开始远程部署代理: machine_id={machine_id}")
-        
-        # 获取机器信息
-        machine = await MachineService.get_machine(db, machine_id)
-        if not machine:
-            log.error(f"未找到机器: id={machine_id}")
+        log.info("开始远程部署代理: machine_id={}", machine_id)
+
+        # 获取机器信息和安装包，读取后立即归还连接
+        target = await MachineService.load_deploy_target(db, machine_id)
+        await db.close()
+        if target is None:
+            log.error("未找到机器: id={}", machine_id)
             return {"success": False, "message": f"未找到ID为{machine_id}的机器"}
-        
-        # 调用内部部署方法
-        return await MachineService._deploy_agent_internal(db, machine)
+
+        # 调用内部部署方法，成功后在新的短事务中记录
+        machine, package = target
+        result = await MachineService._deploy_agent_internal(machine, package)
+        if result["success"]:
+            await MachineService.mark_deployed(db, machine_id)
+            await db.commit()
+        return result
+
+    @staticmethod
+    async def load_deploy_target(db: AsyncSession,
+                                 machine_id: int) -> Optional[Tuple[Machine, Optional[Tuple[str, str]]]]:
+        """
+        读取部署所需的机器信息和安装包，调用方读取后应先关闭会话再进行远程部署
+        :param db: 数据库会话
+        :param machine_id: 机器ID
+        :return: (机器, 本地安装包(路径, sha256)或None)，机器不存在时返回None
+        """
+        machine = await db.get(Machine, machine_id)
+        if machine is None:
+            return None
+        package = await AgentVersionService.resolve_package(db, machine.agent_version_id)
+        return machine, package
 
     @staticmethod
-    async def _deploy_agent_internal(db: Session, machine: Machine) -> Dict[str, bool | str]:
+    async def mark_deployed(db: AsyncSession, machine_id: int):
         """
-        内部使用的代理部署方法
+        记录部署成功（更新机器的更新时间），由调用方提交
         :param db: 数据库会话
-        :param machine: 机器对象
+        :param machine_id: 机器ID
+        """
+        await db.exec(update(Machine).where(Machine.id == machine_id).values(updated_at=datetime.now()))
+
+    @staticmethod
+    async def _deploy_steps(client: AsyncSSHClient, package: Optional[Tuple[str, str]],
+                            force: bool = False, progress: Optional[DeployProgress] = None) -> Dict[str, bool | str]:
+        """
+        在已建立的SSH连接上执行部署步骤
+        :param client: 异步SSH客户端
+        :param package: 本地安装包(路径, sha256)，不存在时为None
+        :param force: 是否强制重新部署（停止已有进程并覆盖安装）
+        :param progress: 部署进度上报，提供时推送各阶段及远程命令输出
         :return: 部署结果
         """
-        try:
-            # 创建SSH客户端
-            client = paramiko.SSHClient()
-            client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            
-            # 连接到目标机器
-            log.info(f"连接到目标机器: {machine.ip}")
-            client.connect(
-                hostname=machine.ip,
-                username=machine.username,
-                password=machine.password,
-                timeout=10
-            )
-            
-            # 1. 检查/opt/nc_agent目录是否存在
-            log.info(f"检查/opt/nc_agent目录是否存在")
-            cmd = "if [ -d /opt/nc_agent ]; then echo 'exists'; else echo 'not_exists'; fi"
-            stdin, stdout, stderr = client.exec_command(cmd)
-            result = stdout.read().decode().strip()
-            
-            if result == 'exists':
-                log.info(f"目标机器上/opt/nc_agent目录已存在，检查是否有进程运行")
-                
-                # 检查是否有nc_agent进程运行
-                cmd = "ps -ef | grep nc_agent | grep -v grep | wc -l"
-                stdin, stdout, stderr = client.exec_command(cmd)
-                process_count = stdout.read().decode().strip()
-                
-                if process_count != "0":
-                    log.info(f"nc_agent进程已在运行")
-                    client.close()
-                    return {"success": True, "message": "目标机器上代理已存在且正在运行"}
-                else:
-                    log.info(f"nc_agent目录存在但进程未运行，检查日志")
-                    cmd = "if [ -f /opt/nc_agent/nc_agent.log ]; then cat /opt/nc_agent/nc_agent.log | tail -n 20; else echo 'No log file'; fi"
-                    stdin, stdout, stderr = client.exec_command(cmd)
-                    log_content = stdout.read().decode().strip()
-                    client.close()
-                    return {"success": False, "message": f"目标机器上代理目录已存在但进程未运行，最近日志: {log_content}"}
-            
-            # 创建/opt/nc_agent目录
-            log.info(f"创建/opt/nc_agent目录")
-            commands = [
-                "if [ -d /opt/nc_agent ]; then rm -rf /opt/nc_agent; fi",
-                "mkdir -p /opt/nc_agent"
-            ]
-            
-            for cmd in commands:
-                stdin, stdout, stderr = client.exec_command(cmd)
-                exit_status = stdout.channel.recv_exit_status()
-                if exit_status != 0:
-                    error = stderr.read().decode().strip()
-                    log.error(f"执行命令失败: {cmd}, 错误: {error}")
-                    client.close()
-                    return {"success": False, "message": f"创建目录失败: {error}"}
-            
-            # 2. 上传并解压install.tar.gz
-            log.info(f"上传install.tar.gz到目标机器")
-            local_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))), "static/install.tar.gz")
-            
-            if not os.path.exists(local_path):
-                log.error(f"安装包不存在: {local_path}")
-                client.close()
-                return {"success": False, "message": "安装包不存在"}
-            
-            # 使用SFTP上传文件
-            sftp = client.open_sftp()
-            remote_path = "/opt/nc_agent/install.tar.gz"
-            sftp.put(local_path, remote_path)
-            sftp.close()
-            
-            # 解压文件
-            log.info(f"解压install.tar.gz")
-            cmd = "cd /opt/nc_agent && tar -xzf install.tar.gz"
-            stdin, stdout, stderr = client.exec_command(cmd)
-            exit_status = stdout.channel.recv_exit_status()
-            if exit_status != 0:
-                error = stderr.read().decode().strip()
-                log.error(f"解压安装包失败: {error}")
-                client.close()
-                return {"success": False, "message": f"解压安装包失败: {error}"}
-            
-            # 3. 后台执行nc_agent程序
-            log.info(f"后台启动nc_agent程序")
-            cmd = "cd /opt/nc_agent && nohup ./nc_agent > /opt/nc_agent/nc_agent.log 2>&1 &"
-            stdin, stdout, stderr = client.exec_command(cmd)
-            exit_status = stdout.channel.recv_exit_status()
-            if exit_status != 0:
-                error = stderr.read().decode().strip()
-                log.error(f"启动nc_agent失败: {error}")
-                client.close()
-                return {"success": False, "message": f"启动nc_agent失败: {error}"}
-            
-            # 4. 检查nc_agent是否启动成功
-            log.info(f"检查nc_agent是否启动成功")
-            # 等待进程启动
-            time.sleep(2)
+
+        def stage(name: str, message: str):
+            log.info(message)
+            if progress is not None:
+                progress.stage(name, message)
+
+        async def run(command: str) -> CommandResult:
+            return await client.exec(command, on_output=progress.output if progress is not None else None)
+
+        # 1. 检查安装目录是否存在，并读取已安装安装包的哈希
+        stage("check", f"检查{REMOTE_AGENT_DIR}目录是否存在")
+        cmd = f"if [ -d {REMOTE_AGENT_DIR} ]; then echo 'exists'; cat {REMOTE_PACKAGE_MARKER} 2>/dev/null; else echo 'not_exists'; fi"
+        lines = (await run(cmd)).stdout.splitlines()
+        result = lines[0] if lines else ""
+        remote_sha256 = lines[1].strip() if len(lines) > 1 else None
+        up_to_date = package is not None and remote_sha256 == package[1]
+        
+        if result == 'exists' and force:
+            stage("stop", "强制重新部署，停止已有nc_agent进程")
+            await run("pkill -x nc_agent; true")
+        elif result == 'exists':
+            log.info("目标机器上{}目录已存在，检查是否有进程运行", REMOTE_AGENT_DIR)
             
-            # 检查进程是否存在
+            # 检查是否有nc_agent进程运行
             cmd = "ps -ef | grep nc_agent | grep -v grep | wc -l"
-            stdin, stdout, stderr = client.exec_command(cmd)
-            process_count = stdout.read().decode().strip()
+            process_count = (await run(cmd)).stdout
             
-            if process_count == "0":
-                log.error("nc_agent进程未启动")
-                # 检查日志文件
-                cmd = "cat /opt/nc_agent/nc_agent.log"
-                stdin, stdout, stderr = client.exec_command(cmd)
-                log_content = stdout.read().decode().strip()
-                client.close()
-                return {"success": False, "message": f"nc_agent进程未启动，日志内容: {log_content}"}
+            if process_count != "0":
+                log.info("nc_agent进程已在运行")
+                return {"success": True, "message": "目标机器上代理已存在且正在运行"}
+            elif not up_to_date:
+                log.info("nc_agent目录存在但进程未运行，检查日志")
+                cmd = (f"if [ -f {REMOTE_AGENT_LOG} ]; then cat {REMOTE_AGENT_LOG} | tail -n {DEPLOY_MESSAGE_LOG_LINES}; "
+                       f"else echo 'No log file'; fi")
+                log_content = (await run(cmd)).stdout
+                return {"success": False, "message": f"目标机器上代理目录已存在但进程未运行，最近日志: {log_content}"}
+        
+        if up_to_date:
+            # 目标机器上已是相同的安装包，跳过上传和解压
+            log.info("目标机器安装包已是最新，跳过上传: sha256={}", remote_sha256)
+        else:
+            if package is None:
+                log.error("安装包不存在: {}", DEFAULT_AGENT_PACKAGE)
+                return {"success": False, "message": "安装包不存在"}
+            local_path, sha256 = package
             
-            # 检查端口是否监听
-            cmd = "netstat -tunlp | grep nc_agent | wc -l"
-            stdin, stdout, stderr = client.exec_command(cmd)
-            port_count = stdout.read().decode().strip()
+            # 2. 上传安装包到缓存目录，支持断点续传
+            stage("mkdir", f"创建安装包缓存目录: {REMOTE_PACKAGE_DIR}")
+            cmd_result = await run(f"mkdir -p {REMOTE_PACKAGE_DIR}")
+            if cmd_result.exit_status != 0:
+                log.error("创建安装包缓存目录失败: {}", cmd_result.stderr)
+                return {"success": False, "message": f"创建目录失败: {cmd_result.stderr}"}
             
-            if port_count == "0":
-                log.error("nc_agent端口未监听")
-                client.close()
-                return {"success": False, "message": "nc_agent端口未监听"}
+            stage("upload", f"上传安装包到目标机器: sha256={sha256}")
+            remote_path = f"{REMOTE_PACKAGE_DIR}/{sha256}.tar.gz"
+            sent = await client.put_resumable(local_path, remote_path,
+                                              on_progress=progress.upload if progress is not None else None)
+            log.info("安装包上传完成: 传输{}字节", sent)
             
-            # 部署成功
-            log.info(f"远程部署nc_agent成功: {machine.ip}")
-            client.close()
+            # 校验上传结果，不一致时删除，下次部署重新上传
+            stage("verify", "校验安装包")
+            cmd_result = await run(f"sha256sum {remote_path}")
+            if cmd_result.stdout.split(" ")[0] != sha256:
+                await run(f"rm -f {remote_path}")
+                log.error("安装包校验失败: {}", cmd_result.stdout or cmd_result.stderr)
+                return {"success": False, "message": "安装包校验失败，请重新部署"}
             
-            # 更新机器记录
-            machine.updated_at = datetime.now()
-            db.commit()
+            # 解压到安装目录，并清理缓存目录中的旧安装包
+            stage("extract", "解压安装包")
+            cmd = (
+                f"rm -rf {REMOTE_AGENT_DIR} && mkdir -p {REMOTE_AGENT_DIR} "
+                f"&& tar -xzvf {remote_path} -C {REMOTE_AGENT_DIR} "
+                f"&& echo {sha256} > {REMOTE_PACKAGE_MARKER} "
+                f"&& find {REMOTE_PACKAGE_DIR} -type f ! -name {sha256}.tar.gz -delete"
+            )
+            cmd_result = await run(cmd)
+            if cmd_result.exit_status != 0:
+                log.error("解压安装包失败: {}", cmd_result.stderr)
+                return {"success": False, "message": f"解压安装包失败: {cmd_result.stderr}"}
+        
+        # 3. 后台执行nc_agent程序
+        stage("start", "后台启动nc_agent程序")
+        cmd_result = await run(f"cd {REMOTE_AGENT_DIR} && nohup ./nc_agent > {REMOTE_AGENT_LOG} 2>&1 &")
+        if cmd_result.exit_status != 0:
+            log.error("启动nc_agent失败: {}", cmd_result.stderr)
+            return {"success": False, "message": f"启动nc_agent失败: {cmd_result.stderr}"}
+        
+        # 4. 检查nc_agent是否启动成功
+        stage("process_check", "检查nc_agent是否启动成功")
+        # 等待进程启动，不阻塞事件循环
+        await asyncio.sleep(2)
+        
+        # 检查进程是否存在
+        cmd = "ps -ef | grep nc_agent | grep -v grep | wc -l"
+        process_count = (await run(cmd)).stdout
+        
+        if process_count == "0":
+            log.error("nc_agent进程未启动")
+            # 检查日志文件：完整内容逐行写入部署日志，失败信息中只保留末尾部分
+            log_lines = (await run(f"cat {REMOTE_AGENT_LOG}")).stdout.splitlines()
+            log_content = "\n".join(log_lines[-DEPLOY_MESSAGE_LOG_LINES:])
+            return {"success": False, "message": f"nc_agent进程未启动，最近日志: {log_content}"}
+        
+        # 检查端口是否监听
+        stage("port_check", "检查nc_agent端口是否监听")
+        port_count = (await run("netstat -tunlp | grep nc_agent | wc -l")).stdout
+        
+        if port_count == "0":
+            log.error("nc_agent端口未监听")
+            return {"success": False, "message": "nc_agent端口未监听"}
+        
+        return {"success": True, "message": "远程部署nc_agent成功"}
+
+    @staticmethod
+    async def _deploy_agent_internal(machine: Machine, package: Optional[Tuple[str, str]],
+                                     force: bool = False) -> Dict[str, bool | str]:
+        """
+        内部使用的代理部署方法，部署过程通过deploy_events按机器ID推送；
+        只进行远程操作，不访问数据库，部署结果由调用方在新的短事务中保存
+        :param machine: 机器对象（由load_deploy_target读取）
+        :param package: 本地安装包(路径, sha256)，不存在时为None
+        :param force: 是否强制重新部署
+        :return: 部署结果
+        """
+        progress = DeployProgress(machine.id)
+        progress.start(machine.ip, force)
+        result = {"success": False, "message": "部署已取消或超时"}
+        try:
+            result = await MachineService._deploy_agent_run(machine, package, force, progress)
+            return result
+        finally:
+            progress.finish(result)
+
+    @staticmethod
+    async def _deploy_agent_run(machine: Machine, package: Optional[Tuple[str, str]], force: bool,
+                                progress: DeployProgress) -> Dict[str, bool | str]:
+        try:
+            # 连接到目标机器
+            progress.stage("connect", f"连接到目标机器: {machine.ip}")
+            log.info("连接到目标机器: {}", machine.ip)
+            async with ssh_pool.acquire(
+                hostname=machine.ip,
+                username=machine.username,
+                password=machine.password,
+                port=SSH_PORT,
+                connect_timeout=10
+            ) as client:
+                result = await MachineService._deploy_steps(client, package, force=force, progress=progress)
             
-            return {"success": True, "message": "远程部署nc_agent成功"}
+            if result["success"]:
+                log.info("远程部署nc_agent成功: {}", machine.ip)
+            return result
             
         except paramiko.AuthenticationException:
-            log.error(f"机器连接认证失败: {machine.ip}")
+            log.error("机器连接认证失败: {}", machine.ip)
             return {"success": False, "message": "认证失败，请检查用户名和密码"}
             
         except socket.timeout:
-            log.error(f"机器连接超时: {machine.ip}")
+            log.error("机器连接超时: {}", machine.ip)
             return {"success": False, "message": "连接超时，请检查IP地址和网络状态"}
             
         except Exception as e:
-            log.exception(f"远程部署代理异常: {machine.ip}, 错误: {str(e)}")
+            log.exception("远程部署代理异常: {}, 错误: {}", machine.ip, e)
             return {"success": False, "message": f"远程部署代理异常: {str(e)}"} 
\ No newline at end of file
@@ -0,0 +1,84 @@
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from app.api.models.performance import PerformanceSamples
+from constants import PERFORMANCE_DATA_DIR
+from utils.logger import log
+from utils.timeseries import RESOLUTIONS, TimeSeriesStore
+
+# 存储的性能指标，顺序即存储列顺序
+PERFORMANCE_FIELDS = ("cpu", "memory", "disk_io", "network_io")
+# 返回给前端时的字段名（与前端PerformanceData类型一致）
+PERFORMANCE_OUTPUT_FIELDS = ("cpu", "memory", "diskIO", "networkIO")
+# 未指定时间范围时默认查询最近的时长（秒）
+DEFAULT_QUERY_RANGE = 3600
+
+# 全局性能数据存储，序列为机器ID
+performance_store = TimeSeriesStore(PERFORMANCE_DATA_DIR, PERFORMANCE_FIELDS)
+
+
+class PerformanceService:
+    """性能数据服务"""
+
+    @staticmethod
+    async def ingest(machine_id: int, samples: PerformanceSamples) -> int:
+        """
+        写入一批性能样本
+        :param machine_id: 机器ID
+        :param samples: 按列的性能样本
+        :return: 写入的样本数
+        """
+        count = len(samples.timestamps)
+        values = np.full((count, len(PERFORMANCE_FIELDS)), np.nan)
+        for index, field in enumerate(PERFORMANCE_FIELDS):
+            column = getattr(samples, field)
+            if column is None:
+                continue
+            if len(column) != count:
+                raise ValueError(f"{field}的长度({len(column)})与timestamps的长度({count})不一致")
+            values[:, index] = np.array(column, dtype=np.float64)
+        written = await performance_store.add(str(machine_id), np.array(samples.timestamps, dtype=np.float64), values)
+        log.debug("写入性能样本: machine_id={}, 样本数={}/{}", machine_id, written, count)
+        return written
+
+    @staticmethod
+    async def query(machine_id: int, start: Optional[float] = None, end: Optional[float] = None, points: int = 500,
+                    resolution: Optional[int] = None, aggregate: str = "avg") -> Dict[str, Any]:
+        """
+        查询机器的性能数据，自动选择满足点数的分辨率
+        :param machine_id: 机器ID
+        :param start: 起始时间戳（秒），默认为end之前一小时
+        :param end: 结束时间戳（秒），默认为当前时间
+        :param points: 最大点数
+        :param resolution: 指定分辨率（秒），为空时自动选择
+        :param aggregate: 每个点的取值方式: avg/min/max
+        :return: 分辨率与数据点列表
+        """
+        if resolution is not None and resolution not in RESOLUTIONS:
+            raise ValueError(f"分辨率只能是{list(RESOLUTIONS)}之一")
+        end = time.time() if end is None else end
+        start = end - DEFAULT_QUERY_RANGE if start is None else start
+        if start >= end:
+            raise ValueError("start必须小于end")
+
+        series = await performance_store.query(str(machine_id), start, end, max_points=points, resolution=resolution)
+        values = {"avg": series.mean, "min": series.min, "max": series.max}[aggregate]
+        # NaN（该指标在桶内无样本）转为None
+        values = values.astype(np.float64)
+        rows = np.where(np.isnan(values), None, np.round(values, 3)).tolist()
+        data = [
+            {"timestamp": datetime.fromtimestamp(ts).isoformat(), **dict(zip(PERFORMANCE_OUTPUT_FIELDS, row))}
+            for ts, row in zip(series.timestamps.tolist(), rows)
+        ]
+        return {"resolution": series.resolution, "start": start, "end": end, "aggregate": aggregate, "points": data}
+
+    @staticmethod
+    async def drop(machine_id: int):
+        """
+        删除机器的全部性能数据
+        :param machine_id: 机器ID
+        """
+        await performance_store.drop(str(machine_id))
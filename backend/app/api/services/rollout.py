@@ -0,0 +1,147 @@
+import asyncio
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.api.models.rollout import RolloutCreate, RolloutMachineStatus, RolloutResponse
+from app.api.services.machine import MachineService
+from models.machine import Machine
+from utils.db import async_session
+from utils.logger import log
+
+# 内存中最多保留的批量部署记录数
+MAX_ROLLOUT_HISTORY = 100
+
+
+class _Rollout:
+    """批量部署运行状态"""
+
+    def __init__(self, data: RolloutCreate, machines: List[Machine]):
+        self.id = uuid.uuid4().hex
+        self.status = "running"
+        self.parallelism = data.parallelism
+        self.host_timeout = data.host_timeout
+        self.force = data.force
+        self.created_at = datetime.now()
+        self.finished_at: Optional[datetime] = None
+        self.machines: Dict[int, RolloutMachineStatus] = {
+            machine.id: RolloutMachineStatus(machine_id=machine.id, name=machine.name, ip=machine.ip)
+            for machine in machines
+        }
+
+    def to_response(self) -> RolloutResponse:
+        summary = {"total": len(self.machines), "pending": 0, "running": 0, "succeeded": 0, "failed": 0}
+        for item in self.machines.values():
+            summary[item.status] += 1
+        return RolloutResponse(
+            id=self.id,
+            status=self.status,
+            parallelism=self.parallelism,
+            host_timeout=self.host_timeout,
+            force=self.force,
+            created_at=self.created_at,
+            finished_at=self.finished_at,
+            summary=summary,
+            machines=list(self.machines.values()),
+        )
+
+
+class RolloutService:
+    """批量部署服务"""
+
+    _rollouts: "OrderedDict[str, _Rollout]" = OrderedDict()
+    # 持有后台任务引用，防止任务被垃圾回收
+    _tasks: Set[asyncio.Task] = set()
+
+    @staticmethod
+    async def start_rollout(db: AsyncSession, data: RolloutCreate) -> RolloutResponse:
+        """
+        创建批量部署任务，在后台并发部署
+        :param db: 数据库会话
+        :param data: 批量部署参数
+        :return: 批量部署进度
+        """
+        if data.machine_ids is None and data.test_type is None and data.agent_version_id is None:
+            raise ValueError("machine_ids、test_type、agent_version_id至少需要提供一项")
+
+        query = select(Machine)
+        if data.machine_ids is not None:
+            query = query.where(Machine.id.in_(data.machine_ids))
+        if data.test_type is not None:
+            query = query.where(Machine.test_type == data.test_type)
+        if data.agent_version_id is not None:
+            query = query.where(Machine.agent_version_id == data.agent_version_id)
+        machines = (await db.exec(query)).all()
+
+        rollout = _Rollout(data, machines)
+        RolloutService._remember(rollout)
+        log.info("创建批量部署: id={}, 机器数={}, 并发={}", rollout.id, len(machines), data.parallelism)
+
+        task = asyncio.create_task(RolloutService._run(rollout))
+        RolloutService._tasks.add(task)
+        task.add_done_callback(RolloutService._tasks.discard)
+        return rollout.to_response()
+
+    @staticmethod
+    def get_rollout(rollout_id: str) -> Optional[RolloutResponse]:
+        """
+        获取批量部署进度
+        :param rollout_id: 批量部署ID
+        :return: 批量部署进度
+        """
+        rollout = RolloutService._rollouts.get(rollout_id)
+        return rollout.to_response() if rollout else None
+
+    @staticmethod
+    def _remember(rollout: _Rollout):
+        rollouts = RolloutService._rollouts
+        rollouts[rollout.id] = rollout
+        # 超出保留数量时，丢弃最早的已完成记录
+        for rollout_id in list(rollouts):
+            if len(rollouts) <= MAX_ROLLOUT_HISTORY:
+                break
+            if rollouts[rollout_id].status != "running":
+                del rollouts[rollout_id]
+
+    @staticmethod
+    async def _run(rollout: _Rollout):
+        semaphore = asyncio.Semaphore(rollout.parallelism)
+
+        async def deploy_one(status: RolloutMachineStatus):
+            async with semaphore:
+                status.status = "running"
+                status.started_at = datetime.now()
+                try:
+                    # 远程部署期间不占用数据库连接：先在短会话中读取，部署完成后再用新的短会话记录
+                    async with async_session() as db:
+                        target = await MachineService.load_deploy_target(db, status.machine_id)
+                    if target is None:
+                        result = {"success": False, "message": "机器已被删除"}
+                    else:
+                        machine, package = target
+                        result = await asyncio.wait_for(
+                            MachineService._deploy_agent_internal(machine, package, force=rollout.force),
+                            rollout.host_timeout,
+                        )
+                        if result["success"]:
+                            async with async_session() as db:
+                                await MachineService.mark_deployed(db, machine.id)
+                                await db.commit()
+                except asyncio.TimeoutError:
+                    result = {"success": False, "message": f"部署超时（{rollout.host_timeout}秒）"}
+                except Exception as e:
+                    log.exception("批量部署单台机器异常: machine_id={}, 错误: {}", status.machine_id, e)
+                    result = {"success": False, "message": f"远程部署代理异常: {str(e)}"}
+                status.status = "succeeded" if result["success"] else "failed"
+                status.message = result["message"]
+                status.finished_at = datetime.now()
+
+        await asyncio.gather(*(deploy_one(status) for status in rollout.machines.values()))
+        rollout.status = "completed"
+        rollout.finished_at = datetime.now()
+        summary = rollout.to_response().summary
+        log.info("批量部署完成: id={}, 成功={}, 失败={}", rollout.id, summary['succeeded'], summary['failed'])
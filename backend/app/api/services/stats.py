@@ -0,0 +1,283 @@
+import asyncio
+import re
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.api.services.agent_version import AgentVersionService
+from models.execution import ExecutionResult
+from models.machine import TestCase
+from utils.analytics import AggregateTable, histogram
+from utils.db import async_session
+from utils.logger import log
+
+# 参与统计的指标：耗时（毫秒）、读/写吞吐（MB/s）、IOPS
+RESULT_METRICS = ("duration_ms", "read_mbps", "write_mbps", "iops")
+# 计入统计的结果状态（取消的结果不算测试结论）
+FINISHED_STATUSES = ("completed", "failed")
+# 启动时从数据库加载结果的分批大小
+STATS_LOAD_BATCH = 50000
+# 判定回归的默认阈值：耗时/吞吐的相对变化，或通过率的绝对下降
+DEFAULT_REGRESSION_THRESHOLD = 0.1
+
+_UNIT_MB = {"GB": 1024.0, "MB": 1.0, "KB": 1 / 1024.0}
+_OUTPUT_PATTERNS = {
+    "read_mbps": re.compile(r"(?:读取速度|读速度|read[ _]?speed)\s*[:：]?\s*([\d.]+)\s*([GMK]B)/s", re.IGNORECASE),
+    "write_mbps": re.compile(r"(?:写入速度|写速度|write[ _]?speed)\s*[:：]?\s*([\d.]+)\s*([GMK]B)/s", re.IGNORECASE),
+    "iops": re.compile(r"IOPS\s*[:：]?\s*([\d.]+)"),
+}
+
+
+def parse_result_metrics(output: Optional[str], data: Any) -> Dict[str, Optional[float]]:
+    """
+    从代理返回的结构化数据或输出文本中提取吞吐与IOPS，结构化数据优先
+    :param output: 测试输出，例如"读取速度: 500 MB/s"、"IOPS: 12000"
+    :param data: 测试结构化数据，可包含read_mbps/write_mbps/iops
+    :return: 指标名 -> 数值，未找到为None
+    """
+    metrics: Dict[str, Optional[float]] = {}
+    for name, pattern in _OUTPUT_PATTERNS.items():
+        value = data.get(name) if isinstance(data, dict) else None
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            metrics[name] = float(value)
+            continue
+        match = pattern.search(output) if output else None
+        if match is None:
+            metrics[name] = None
+        elif name == "iops":
+            metrics[name] = float(match.group(1))
+        else:
+            metrics[name] = float(match.group(1)) * _UNIT_MB[match.group(2).upper()]
+    return metrics
+
+
+class StatsKey(NamedTuple):
+    """统计分组键"""
+    agent_version_id: Optional[int]
+    test_case_id: int
+    test_type: Optional[str]
+
+
+class ResultStats:
+    """
+    测试结果的增量聚合缓存，按(代理版本, 测试用例, 测试类型)分组
+
+    首次使用时从数据库分批加载已结束的结果，之后由执行服务在结果提交后调用observe增量更新；
+    加载期间到达的结果先暂存，加载完成后按结果ID去重再合并
+    """
+
+    def __init__(self):
+        self.table = AggregateTable(RESULT_METRICS)
+        self._loaded = False
+        self._pending: Optional[List[Dict[str, Any]]] = None
+        self._lock = asyncio.Lock()
+
+    def _add_columns(self, agent_version_ids: Sequence[Optional[int]], test_case_ids: Sequence[int],
+                     test_types: Sequence[Optional[str]], statuses: Sequence[str], metrics: Sequence[Sequence[Any]]):
+        keys = list(map(StatsKey, agent_version_ids, test_case_ids, test_types))
+        passed = np.array(statuses, dtype=object) == "completed"
+        # None转为NaN
+        values = np.array(metrics, dtype=np.float64).T.reshape(len(keys), len(RESULT_METRICS))
+        self.table.add(keys, passed, values)
+
+    def _add(self, rows: List[Dict[str, Any]]):
+        if not rows:
+            return
+        self._add_columns(
+            [row["agent_version_id"] for row in rows], [row["test_case_id"] for row in rows],
+            [row["test_type"] for row in rows], [row["status"] for row in rows],
+            [[row.get(metric) for row in rows] for metric in RESULT_METRICS],
+        )
+
+    async def ensure_loaded(self):
+        """
+        首次使用时加载数据库中已结束的结果
+        """
+        if self._loaded:
+            return
+        async with self._lock:
+            if self._loaded:
+                return
+            self._pending = []
+            loaded_ids: List[np.ndarray] = []
+            columns = [ExecutionResult.id, ExecutionResult.agent_version_id, ExecutionResult.test_case_id,
+                       ExecutionResult.test_type, ExecutionResult.status,
+                       *(getattr(ExecutionResult, metric) for metric in RESULT_METRICS)]
+            try:
+                last_id = 0
+                async with async_session() as db:
+                    while True:
+                        batch = (await db.exec(
+                            select(*columns)
+                            .where(ExecutionResult.status.in_(FINISHED_STATUSES), ExecutionResult.id > last_id)
+                            .order_by(ExecutionResult.id)
+                            .limit(STATS_LOAD_BATCH)
+                        )).all()
+                        if not batch:
+                            break
+                        ids, agent_version_ids, test_case_ids, test_types, statuses, *metrics = zip(*batch)
+                        self._add_columns(agent_version_ids, test_case_ids, test_types, statuses, metrics)
+                        ids = np.array(ids, dtype=np.int64)
+                        loaded_ids.append(ids)
+                        last_id = int(ids[-1])
+            except BaseException:
+                self.table = AggregateTable(RESULT_METRICS)
+                self._pending = None
+                raise
+            pending, self._pending = self._pending, None
+            if pending:
+                seen = np.concatenate(loaded_ids) if loaded_ids else np.zeros(0, dtype=np.int64)
+                fresh = ~np.isin(np.fromiter((row["id"] for row in pending), dtype=np.int64, count=len(pending)), seen)
+                self._add([row for row, keep in zip(pending, fresh) if keep])
+            self._loaded = True
+            log.info("加载测试结果统计: 结果数={}, 分组数={}", int(self.table.total.sum()), len(self.table))
+
+    def observe(self, rows: List[Dict[str, Any]]):
+        """
+        新的已结束结果提交后调用
+        :param rows: 结果字段(id/agent_version_id/test_case_id/test_type/status及各指标)
+        """
+        rows = [row for row in rows if row["status"] in FINISHED_STATUSES]
+        if self._pending is not None:
+            self._pending.extend(rows)
+        elif self._loaded:
+            self._add(rows)
+        # 尚未加载时忽略，加载时会从数据库读到这些已提交的结果
+
+
+# 全局测试结果统计
+result_stats = ResultStats()
+
+
+class StatsService:
+    """测试结果统计服务"""
+
+    GROUP_FIELDS = {"agent_version": "agent_version_id", "test_case": "test_case_id", "test_type": "test_type"}
+
+    @staticmethod
+    async def _names(db: AsyncSession, field: str, values: Iterable[Any]) -> Dict[Any, Optional[str]]:
+        if field == "agent_version_id":
+            versions = await AgentVersionService.get_agent_version_map(db)
+            return {value: versions[value].name if value in versions else None for value in values}
+        if field == "test_case_id":
+            ids = [value for value in values if value is not None]
+            rows = (await db.exec(select(TestCase.id, TestCase.name).where(TestCase.id.in_(ids)))).all()
+            return dict(rows)
+        return {}
+
+    @staticmethod
+    async def get_summary(agent_version_id: Optional[int] = None, test_case_id: Optional[int] = None,
+                          test_type: Optional[str] = None) -> Dict[str, Any]:
+        """
+        获取汇总统计：通过率、耗时/吞吐/IOPS的均值与p50/p95/p99
+        :param agent_version_id: 按代理版本筛选
+        :param test_case_id: 按测试用例筛选
+        :param test_type: 按测试类型筛选
+        :return: 汇总统计
+        """
+        await result_stats.ensure_loaded()
+        table = result_stats.table
+        return table.summarize(table.select(agent_version_id=agent_version_id, test_case_id=test_case_id,
+                                            test_type=test_type))
+
+    @staticmethod
+    async def get_grouped(db: AsyncSession, group_by: str, agent_version_id: Optional[int] = None,
+                          test_case_id: Optional[int] = None, test_type: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        按代理版本/测试用例/测试类型分组统计通过率与指标分位数
+        :param db: 数据库会话
+        :param group_by: agent_version/test_case/test_type
+        :param agent_version_id: 按代理版本筛选
+        :param test_case_id: 按测试用例筛选
+        :param test_type: 按测试类型筛选
+        :return: 每组的统计
+        """
+        await result_stats.ensure_loaded()
+        table = result_stats.table
+        field = StatsService.GROUP_FIELDS[group_by]
+        mask = table.select(agent_version_id=agent_version_id, test_case_id=test_case_id, test_type=test_type)
+        groups = {value: group for value, group in table.group(field, mask).items() if group.any()}
+        names = await StatsService._names(db, field, groups)
+        return [
+            {field: value, "name": names.get(value), **table.summarize(group)}
+            for value, group in groups.items()
+        ]
+
+    @staticmethod
+    async def get_histogram(metric: str, bins: int = 20, agent_version_id: Optional[int] = None,
+                            test_case_id: Optional[int] = None, test_type: Optional[str] = None) -> Dict[str, Any]:
+        """
+        获取指标的分布直方图
+        :param metric: 指标名
+        :param bins: 区间数
+        :param agent_version_id: 按代理版本筛选
+        :param test_case_id: 按测试用例筛选
+        :param test_type: 按测试类型筛选
+        :return: 各区间的起止与样本数
+        """
+        if metric not in RESULT_METRICS:
+            raise ValueError(f"指标只能是{list(RESULT_METRICS)}之一")
+        await result_stats.ensure_loaded()
+        table = result_stats.table
+        mask = table.select(agent_version_id=agent_version_id, test_case_id=test_case_id, test_type=test_type)
+        counts, edges = histogram(table.metric_hist(metric, mask), bins=bins)
+        return {
+            "metric": metric,
+            "bins": [{"start": float(edges[i]), "end": float(edges[i + 1]), "count": int(counts[i])}
+                     for i in range(len(counts))],
+        }
+
+    @staticmethod
+    async def get_regression(db: AsyncSession, base_version_id: int, target_version_id: int,
+                             test_type: Optional[str] = None,
+                             threshold: float = DEFAULT_REGRESSION_THRESHOLD) -> List[Dict[str, Any]]:
+        """
+        对比两个代理版本在各测试用例上的表现
+        :param db: 数据库会话
+        :param base_version_id: 基准代理版本ID
+        :param target_version_id: 目标代理版本ID
+        :param test_type: 按测试类型筛选
+        :param threshold: 判定回归的阈值
+        :return: 每个测试用例的基准/目标统计、变化率以及回归项
+        """
+        await result_stats.ensure_loaded()
+        table = result_stats.table
+        base_mask = table.select(agent_version_id=base_version_id, test_type=test_type)
+        target_mask = table.select(agent_version_id=target_version_id, test_type=test_type)
+        base_groups = table.group("test_case_id", base_mask)
+        target_groups = table.group("test_case_id", target_mask)
+        test_case_ids = [test_case_id for test_case_id in base_groups
+                         if base_groups[test_case_id].any() and target_groups[test_case_id].any()]
+        names = await StatsService._names(db, "test_case_id", test_case_ids)
+
+        comparisons = []
+        for test_case_id in sorted(test_case_ids):
+            base = table.summarize(base_groups[test_case_id])
+            target = table.summarize(target_groups[test_case_id])
+            deltas: Dict[str, Any] = {"pass_rate": target["pass_rate"] - base["pass_rate"]}
+            regressions = []
+            if deltas["pass_rate"] < -threshold:
+                regressions.append("pass_rate")
+            for metric in RESULT_METRICS:
+                if metric not in base["metrics"] or metric not in target["metrics"]:
+                    continue
+                for stat in ("p50", "p95"):
+                    before, after = base["metrics"][metric][stat], target["metrics"][metric][stat]
+                    deltas[f"{metric}_{stat}"] = (after - before) / before if before else None
+                change = deltas[f"{metric}_p50"]
+                if change is None:
+                    continue
+                # 耗时变长、吞吐和IOPS变低视为回归
+                if (metric == "duration_ms" and change > threshold) or (metric != "duration_ms" and change < -threshold):
+                    regressions.append(metric)
+            comparisons.append({
+                "test_case_id": test_case_id,
+                "name": names.get(test_case_id),
+                "base": base,
+                "target": target,
+                "deltas": deltas,
+                "regressions": regressions,
+            })
+        return comparisons
@@ -1,33 +1,62 @@
-from typing import List, Optional
-from sqlmodel import Session, select
+from typing import Optional
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from utils.cache import CacheRegion, CachedPage, compute_etag, invalidate_on_write
 from utils.logger import log
+from utils.pagination import DEFAULT_PAGE_SIZE, paginate, prefix_range
 from models.machine import TestCase
 
+# 测试用例列表允许的排序字段
+TEST_CASE_SORT_FIELDS = ("id", "name", "type", "created_at", "updated_at")
+
+# 测试用例目录缓存，测试用例写入提交后自动失效
+test_case_cache = CacheRegion("test_cases")
+invalidate_on_write(test_case_cache, TestCase)
+
 
 class TestCaseService:
     """测试用例服务"""
 
     @staticmethod
-    async def get_test_cases(db: Session, skip: int = 0, limit: int = 100) -> List[TestCase]:
+    async def get_test_cases(db: AsyncSession, limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None,
+                             sort: str = "id", type: Optional[str] = None,
+                             name_prefix: Optional[str] = None) -> CachedPage:
         """
-        获取测试用例列表
+        获取测试用例列表（游标分页，结果按查询参数缓存）
         :param db: 数据库会话
-        :param skip: 跳过数量
         :param limit: 限制数量
-        :return: 测试用例列表
+        :param cursor: 上一页返回的游标
+        :param sort: 排序字段，前缀"-"表示倒序
+        :param type: 按测试用例类型筛选
+        :param name_prefix: 按名称前缀筛选
+        :return: 测试用例列表、下一页游标及ETag
         """
-        log.info(f"获取测试用例列表: skip={skip}, limit={limit}")
-        query = select(TestCase).offset(skip).limit(limit)
-        return db.exec(query).all()
+        log.info("获取测试用例列表: cursor={}, limit={}", cursor, limit)
+
+        async def load() -> CachedPage:
+            query = select(TestCase)
+            if type is not None:
+                query = query.where(TestCase.type == type)
+            if name_prefix:
+                query = query.where(prefix_range(TestCase.name, name_prefix))
+            items, next_cursor = await paginate(db, query, TestCase, sort, TEST_CASE_SORT_FIELDS, cursor, limit)
+            last_modified = max((item.updated_at for item in items), default=None)
+            return CachedPage(items, next_cursor, compute_etag([items, next_cursor]), last_modified)
+
+        return await test_case_cache.get_or_load(("list", limit, cursor, sort, type, name_prefix), load)
     
     @staticmethod
-    async def get_test_case(db: Session, test_case_id: int) -> Optional[TestCase]:
+    async def get_test_case(db: AsyncSession, test_case_id: int) -> Optional[TestCase]:
         """
         获取测试用例
         :param db: 数据库会话
         :param test_case_id: 测试用例ID
         :return: 测试用例
         """
-        log.info(f"获取测试用例: id={test_case_id}")
-        query = select(TestCase).where(TestCase.id == test_case_id)
-        return db.exec(query).first()
+        log.info("获取测试用例: id={}", test_case_id)
+
+        async def load() -> Optional[TestCase]:
+            query = select(TestCase).where(TestCase.id == test_case_id)
+            return (await db.exec(query)).first()
+
+        return await test_case_cache.get_or_load(("id", test_case_id), load)
@@ -0,0 +1,217 @@
+"""
+后端API压测
+
+用法（在backend目录下）:
+    python -m benchmarks.api_load --machines 10000 --concurrency 1,10,50 --requests 500 --output api.json
+    python -m benchmarks.api_load --mode http --routes machines_list,machine_detail
+
+在临时数据库中用Faker生成数据，按各并发级别对每个接口发送固定数量的请求，
+输出每个接口的吞吐量和p50/p95/p99延迟:
+- inprocess: 通过ASGI直接调用应用，不经过网络和HTTP服务器，反映应用本身的开销
+- http: 在子进程中用uvicorn启动应用，通过本机HTTP访问；客户端与服务端在同一台机器上，
+  高并发时客户端本身也会占用CPU
+后台代理健康检查在压测时关闭（生成的机器IP不可达）
+"""
+import os
+
+# 压测时默认只输出警告以上的日志，避免日志写入影响结果
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("LOG_FILE_LEVEL", "WARNING")
+
+import argparse
+import asyncio
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from benchmarks.common import BACKEND_DIR, environment, summarize, write_results
+
+API_PREFIX = "/api/v1"
+# 每个接口正式计时前的预热请求数
+WARMUP_REQUESTS = 20
+# 等待uvicorn子进程就绪的最长时间（秒）
+SERVER_START_TIMEOUT = 30
+
+
+@dataclass
+class Context:
+    """生成请求时使用的数据规模和预先获取的值"""
+    rng: random.Random
+    machines: int
+    test_types: Tuple[str, ...]
+    machines_etag: Optional[str] = None
+
+
+# 接口名称 -> (根据上下文生成请求路径和请求头, 期望的状态码)
+ROUTES: Dict[str, Tuple[Callable[[Context], Tuple[str, Dict[str, str]]], int]] = {
+    "machines_list": (lambda ctx: (f"{API_PREFIX}/machines/?limit=100", {}), 200),
+    "machines_list_filtered": (
+        lambda ctx: (f"{API_PREFIX}/machines/?limit=100&test_type={ctx.rng.choice(ctx.test_types)}", {}), 200),
+    "machines_list_not_modified": (
+        lambda ctx: (f"{API_PREFIX}/machines/?limit=100", {"If-None-Match": ctx.machines_etag}), 304),
+    "machine_detail": (lambda ctx: (f"{API_PREFIX}/machines/{ctx.rng.randint(1, ctx.machines)}", {}), 200),
+    "test_cases_list": (lambda ctx: (f"{API_PREFIX}/test-cases/?limit=100", {}), 200),
+    "agent_versions_list": (lambda ctx: (f"{API_PREFIX}/agent-versions/", {}), 200),
+}
+
+
+async def _measure(client: httpx.AsyncClient, ctx: Context, route: str, concurrency: int,
+                   requests: int) -> Dict[str, Any]:
+    build, expected = ROUTES[route]
+    latencies: List[float] = []
+    errors = 0
+    remaining = requests
+
+    async def send() -> Optional[float]:
+        path, headers = build(ctx)
+        started = time.perf_counter()
+        try:
+            response = await client.get(path, headers=headers)
+        except httpx.HTTPError:
+            return None
+        elapsed = time.perf_counter() - started
+        return elapsed if response.status_code == expected else None
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            elapsed = await send()
+            if elapsed is None:
+                errors += 1
+            else:
+                latencies.append(elapsed)
+
+    for _ in range(WARMUP_REQUESTS):
+        await send()
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, time.perf_counter() - started, errors)
+
+
+async def _run_routes(client: httpx.AsyncClient, ctx: Context, mode: str, routes: List[str], levels: List[int],
+                      requests: int) -> List[Dict[str, Any]]:
+    response = await client.get(f"{API_PREFIX}/machines/?limit=100")
+    response.raise_for_status()
+    ctx.machines_etag = response.headers.get("etag")
+    results = []
+    for route in routes:
+        for concurrency in levels:
+            result = await _measure(client, ctx, route, concurrency, requests)
+            results.append({"mode": mode, "route": route, "concurrency": concurrency, **result})
+            print(f"mode={mode} route={route} concurrency={concurrency} throughput_rps={result['throughput_rps']} "
+                  f"p50_ms={result['p50_ms']} p99_ms={result['p99_ms']} errors={result['errors']}", flush=True)
+    return results
+
+
+async def _run_inprocess(ctx: Context, routes: List[str], levels: List[int], requests: int) -> List[Dict[str, Any]]:
+    from app import create_app, lifespan
+
+    app = create_app()
+    async with lifespan(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            return await _run_routes(client, ctx, "inprocess", routes, levels, requests)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _run_http(ctx: Context, routes: List[str], levels: List[int], requests: int) -> List[Dict[str, Any]]:
+    port = _free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning", "--no-access-log"],
+        cwd=BACKEND_DIR, env=os.environ.copy(),
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        limits = httpx.Limits(max_connections=max(levels), max_keepalive_connections=max(levels))
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+            deadline = time.monotonic() + SERVER_START_TIMEOUT
+            while True:
+                if server.poll() is not None:
+                    raise RuntimeError(f"uvicorn启动失败，退出码{server.returncode}")
+                try:
+                    await client.get(f"{API_PREFIX}/agent-versions/")
+                    break
+                except httpx.TransportError:
+                    if time.monotonic() > deadline:
+                        raise RuntimeError("等待uvicorn启动超时")
+                    await asyncio.sleep(0.2)
+            return await _run_routes(client, ctx, "http", routes, levels, requests)
+    finally:
+        server.terminate()
+        try:
+            server.wait(10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+
+async def run(args) -> List[Dict[str, Any]]:
+    """
+    生成数据并按模式运行压测
+    :param args: 命令行参数
+    :return: 每个模式、接口和并发级别的统计结果
+    """
+    routes = args.routes.split(",") if args.routes else list(ROUTES)
+    unknown = [route for route in routes if route not in ROUTES]
+    if unknown:
+        raise SystemExit(f"未知的接口: {unknown}，可选: {list(ROUTES)}")
+    levels = [int(level) for level in args.concurrency.split(",")]
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        # 应用在导入时读取这些配置，必须在导入应用代码之前设置
+        os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(tmpdir, 'bench.db')}"
+        os.environ["DATA_DIR"] = os.path.join(tmpdir, "data")
+        os.environ["HEALTH_CHECK_ENABLED"] = "0"
+        from benchmarks.seed import TEST_TYPES, seed
+
+        counts = await seed(os.environ["DATABASE_URL"], args.machines, args.agent_versions, args.test_cases,
+                            args.links_per_machine, seed_value=args.seed)
+        print(" ".join(f"{key}={value}" for key, value in counts.items()), flush=True)
+        ctx = Context(rng=random.Random(args.seed), machines=args.machines, test_types=TEST_TYPES)
+
+        results = []
+        for mode in args.mode.split(","):
+            if mode == "inprocess":
+                results += await _run_inprocess(ctx, routes, levels, args.requests)
+            elif mode == "http":
+                results += await _run_http(ctx, routes, levels, args.requests)
+            else:
+                raise SystemExit(f"未知的模式: {mode}，可选: inprocess/http")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="后端API压测")
+    parser.add_argument("--machines", type=int, default=10000)
+    parser.add_argument("--agent-versions", type=int, default=10)
+    parser.add_argument("--test-cases", type=int, default=200)
+    parser.add_argument("--links-per-machine", type=int, default=5)
+    parser.add_argument("--concurrency", default="1,10,50", help="逗号分隔的并发级别")
+    parser.add_argument("--requests", type=int, default=500, help="每个接口在每个并发级别下的请求数")
+    parser.add_argument("--mode", default="inprocess,http", help="逗号分隔: inprocess/http")
+    parser.add_argument("--routes", help=f"逗号分隔的接口，默认全部: {','.join(ROUTES)}")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="结果JSON文件路径")
+    args = parser.parse_args()
+
+    meta = environment(vars(args))
+    results = asyncio.run(run(args))
+    print()
+    write_results(args.output, "api", meta, results)
+
+
+if __name__ == "__main__":
+    main()
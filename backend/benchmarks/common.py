@@ -0,0 +1,78 @@
+"""
+压测公共工具：延迟统计、运行环境信息与JSON结果输出
+"""
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def summarize(latencies: Sequence[float], elapsed: float, errors: int = 0) -> Dict[str, Any]:
+    """
+    汇总一组请求的耗时
+    :param latencies: 成功请求的耗时（秒）
+    :param elapsed: 整组请求的总耗时（秒）
+    :param errors: 失败请求数
+    :return: 请求数、吞吐量及p50/p95/p99等延迟（毫秒）
+    """
+    result = {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed > 0 else None,
+    }
+    if latencies:
+        values = np.asarray(latencies) * 1000
+        p50, p95, p99 = np.percentile(values, [50, 95, 99])
+        result.update(mean_ms=round(float(values.mean()), 2), p50_ms=round(float(p50), 2),
+                      p95_ms=round(float(p95), 2), p99_ms=round(float(p99), 2), max_ms=round(float(values.max()), 2))
+    else:
+        result.update(mean_ms=None, p50_ms=None, p95_ms=None, p99_ms=None, max_ms=None)
+    return result
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def environment(args: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    运行环境与参数，写入结果文件便于对比不同的运行
+    :param args: 命令行参数
+    :return: 环境信息
+    """
+    return {
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "args": args,
+    }
+
+
+def write_results(path: Optional[str], benchmark: str, meta: Dict[str, Any], results: List[Dict[str, Any]]):
+    """
+    输出结果：逐行打印，并在指定路径时写入JSON文件
+    :param path: JSON文件路径，为空时只打印
+    :param benchmark: 压测名称
+    :param meta: 运行环境信息
+    :param results: 结果列表
+    """
+    for row in results:
+        print(" ".join(f"{key}={value}" for key, value in row.items()))
+    if path:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"benchmark": benchmark, "meta": meta, "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入: {path}")
@@ -0,0 +1,74 @@
+"""
+对比两次压测的JSON结果
+
+用法（在backend目录下）:
+    python -m benchmarks.compare before.json after.json
+
+按结果中的维度字段（模式、接口、阶段、并发级别等）匹配两次运行的结果行，
+输出吞吐量和延迟分位数的变化；延迟变大或吞吐量下降超过阈值的行标记为回退
+"""
+import argparse
+import json
+from typing import Any, Dict, List, Tuple
+
+# 参与对比的指标及其方向：1表示越大越好，-1表示越小越好
+METRICS = {"throughput_rps": 1, "p50_ms": -1, "p95_ms": -1, "p99_ms": -1}
+# 不作为匹配维度的字段
+MEASURED_FIELDS = {"requests", "errors", "elapsed_s", "mean_ms", "max_ms", "stage_mean_ms", "first_error",
+                   "package_kb", *METRICS}
+
+
+def _key(row: Dict[str, Any]) -> Tuple:
+    return tuple((name, value) for name, value in row.items() if name not in MEASURED_FIELDS)
+
+
+def compare(before: Dict[str, Any], after: Dict[str, Any], threshold: float) -> List[Dict[str, Any]]:
+    """
+    对比两次运行的结果
+    :param before: 基准运行的结果文件内容
+    :param after: 新运行的结果文件内容
+    :param threshold: 判定为回退的变化比例
+    :return: 每个匹配行的指标变化
+    """
+    baseline = {_key(row): row for row in before["results"]}
+    rows = []
+    for row in after["results"]:
+        old = baseline.get(_key(row))
+        if old is None:
+            continue
+        changes = {}
+        regressed = False
+        for metric, direction in METRICS.items():
+            if old.get(metric) is None or row.get(metric) is None or not old[metric]:
+                continue
+            change = (row[metric] - old[metric]) / old[metric]
+            changes[metric] = f"{old[metric]} -> {row[metric]} ({change:+.1%})"
+            regressed = regressed or change * direction < -threshold
+        rows.append({**dict(_key(row)), **changes, "regressed": regressed})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比两次压测的JSON结果")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=0.1, help="判定为回退的变化比例")
+    args = parser.parse_args()
+
+    with open(args.before, encoding="utf-8") as f:
+        before = json.load(f)
+    with open(args.after, encoding="utf-8") as f:
+        after = json.load(f)
+    if before.get("benchmark") != after.get("benchmark"):
+        raise SystemExit(f"压测类型不同: {before.get('benchmark')} / {after.get('benchmark')}")
+    print(f"基准: {before['meta'].get('git_commit')} {before['meta'].get('started_at')}")
+    print(f"对比: {after['meta'].get('git_commit')} {after['meta'].get('started_at')}")
+    rows = compare(before, after, args.threshold)
+    for row in rows:
+        print(("[回退] " if row.pop("regressed") else "       ") + " ".join(f"{k}={v}" for k, v in row.items()))
+    if not rows:
+        print("两次运行没有可匹配的结果")
+
+
+if __name__ == "__main__":
+    main()
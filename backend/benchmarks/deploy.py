@@ -0,0 +1,163 @@
+"""
+代理部署压测：在本地模拟机器集群上执行MachineService._deploy_agent_internal
+
+用法（在backend目录下）:
+    python -m benchmarks.deploy --machines 20 --concurrency 1,5,20 --package-size-kb 1024 --output deploy.json
+    python -m benchmarks.deploy --machines 200 --concurrency 50 --sftp-rate-kbps 2048 --command-failure-rate 0.01
+
+每个并发级别运行两轮，每轮部署全部机器:
+- fresh: 清空模拟机器后部署，走完整流程（上传、校验、解压、启动、进程和端口检查）
+- redeploy: 紧接着再部署一次，代理已在运行，只做目录和进程检查
+每台机器对应模拟集群中的一个回环地址，输出每轮的吞吐量、延迟分位数和各阶段平均耗时。
+注意部署流程在启动后固定等待2秒再检查进程，fresh轮的延迟下限约为2秒
+"""
+import os
+
+# 压测时默认只输出警告以上的日志，避免日志写入影响结果
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("LOG_FILE_LEVEL", "WARNING")
+
+import argparse
+import asyncio
+import io
+import random
+import tarfile
+import tempfile
+import time
+from typing import Any, Dict, List, Tuple
+
+from benchmarks.common import environment, summarize, write_results
+from benchmarks.seed import seed
+
+
+def _build_package(size_kb: int) -> bytes:
+    # 内容为随机字节的nc_agent，压缩后大小约为size_kb
+    payload = random.Random(size_kb).randbytes(size_kb * 1024)
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as tar:
+        info = tarfile.TarInfo("nc_agent")
+        info.size = len(payload)
+        info.mode = 0o755
+        tar.addfile(info, io.BytesIO(payload))
+    return buffer.getvalue()
+
+
+def _stage_totals(histogram) -> Dict[str, Tuple[float, float]]:
+    totals: Dict[str, List[float]] = {}
+    for suffix, labels, value in histogram.collect()[3]:
+        if suffix in ("_count", "_sum"):
+            totals.setdefault(labels["stage"], [0, 0.0])[0 if suffix == "_count" else 1] = value
+    return {stage: (count, total) for stage, (count, total) in totals.items()}
+
+
+async def run(args) -> List[Dict[str, Any]]:
+    """
+    启动模拟集群并按各并发级别运行部署压测
+    :param args: 命令行参数
+    :return: 每轮的统计结果
+    """
+    # 应用在导入时读取SSH端口，必须在导入模拟集群和部署代码之前设置
+    os.environ["SSH_PORT"] = str(args.ssh_port)
+    from simulator import FleetConfig, Simulator
+
+    levels = [int(level) for level in args.concurrency.split(",")]
+    results = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        sim = Simulator(FleetConfig(machines=args.machines, ssh_port=args.ssh_port, ssh_latency=args.command_latency,
+                                    command_failure_rate=args.command_failure_rate,
+                                    auth_failure_rate=args.auth_failure_rate, sftp_rate_kbps=args.sftp_rate_kbps))
+        await sim.start()
+        from app.api.services.deploy_progress import DEPLOY_STAGE_DURATION
+        from app.api.services.machine import MachineService
+        from models.machine import AgentPackage
+        from utils.db import build_engine, build_sessionmaker
+        from utils.package_store import package_store
+        from utils.ssh import ssh_pool
+
+        url = f"sqlite+aiosqlite:///{os.path.join(tmpdir, 'bench.db')}"
+        await seed(url, 0, agent_versions=1, test_cases=10, links_per_machine=0)
+        package = _build_package(args.package_size_kb)
+
+        async def chunks():
+            yield package
+
+        sha256, size = await package_store.save_stream(chunks())
+        engine = build_engine(url)
+        session_factory = build_sessionmaker(engine)
+        async with session_factory() as db:
+            db.add(AgentPackage(agent_version_id=1, sha256=sha256, size=size))
+            await db.commit()
+            machine_ids = await sim.register(db, agent_version_id=1)
+
+        async def deploy(machine_id: int, latencies: List[float], failures: List[str]):
+            async with session_factory() as db:
+                machine, package = await MachineService.load_deploy_target(db, machine_id)
+            started = time.perf_counter()
+            result = await MachineService._deploy_agent_internal(machine, package)
+            if result["success"]:
+                latencies.append(time.perf_counter() - started)
+            else:
+                failures.append(result["message"])
+
+        ssh_pool.start()
+        try:
+            for concurrency in levels:
+                # 每个并发级别从全新安装开始
+                for machine in sim.machines.values():
+                    machine.reset()
+                for phase in ("fresh", "redeploy"):
+                    semaphore = asyncio.Semaphore(concurrency)
+                    latencies, failures = [], []
+
+                    async def limited(machine_id: int):
+                        async with semaphore:
+                            await deploy(machine_id, latencies, failures)
+
+                    before = _stage_totals(DEPLOY_STAGE_DURATION)
+                    started = time.perf_counter()
+                    await asyncio.gather(*(limited(machine_id) for machine_id in machine_ids))
+                    elapsed = time.perf_counter() - started
+                    after = _stage_totals(DEPLOY_STAGE_DURATION)
+                    stages = {}
+                    for stage, (count, total) in after.items():
+                        count -= before.get(stage, (0, 0.0))[0]
+                        total -= before.get(stage, (0, 0.0))[1]
+                        if count:
+                            stages[stage] = round(total / count * 1000, 1)
+                    results.append({
+                        "phase": phase,
+                        "concurrency": concurrency,
+                        "machines": len(machine_ids),
+                        "package_kb": size // 1024,
+                        **summarize(latencies, elapsed, len(failures)),
+                        "stage_mean_ms": stages,
+                        "first_error": failures[0] if failures else None,
+                    })
+        finally:
+            await ssh_pool.close()
+            await engine.dispose()
+            await sim.stop()
+            os.remove(package_store.path(sha256))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="代理部署压测")
+    parser.add_argument("--machines", type=int, default=20)
+    parser.add_argument("--concurrency", default="1,5,20", help="逗号分隔的并发级别")
+    parser.add_argument("--package-size-kb", type=int, default=1024)
+    parser.add_argument("--command-latency", type=float, default=0.005, help="模拟机器每条命令的平均延迟（秒）")
+    parser.add_argument("--command-failure-rate", type=float, default=0.0)
+    parser.add_argument("--auth-failure-rate", type=float, default=0.0)
+    parser.add_argument("--sftp-rate-kbps", type=float, default=0.0, help="SFTP上传速率上限，0表示不限")
+    parser.add_argument("--ssh-port", type=int, default=2222, help="模拟SSH服务端口")
+    parser.add_argument("--output", help="结果JSON文件路径")
+    args = parser.parse_args()
+
+    meta = environment(vars(args))
+    results = asyncio.run(run(args))
+    write_results(args.output, "deploy", meta, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+机器列表响应序列化前后的耗时对比
+
+用法（在backend目录下）:
+    python -m benchmarks.response_serialization --machines 10000 --rounds 20
+
+在内存中构造机器和代理版本，分别按两种方式生成机器列表接口的响应体：
+- dict: 逐行构建字典，再经response_model=dict时FastAPI的处理（校验、转换为JSON兼容对象、json.dumps编码）
+- model: 与现在的机器列表接口相同，用机器已加载的列值校验一次为MachineListResponse，由pydantic-core序列化为JSON字节
+两条路径的输出解析后应完全一致
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from sqlalchemy import inspect
+
+from app.api.models.machine import MachineListResponse
+from models.machine import AgentVersion, Machine
+from utils.responses import ModelResponse
+
+
+def _fixtures(count: int):
+    now = datetime.now()
+    versions = {i: AgentVersion(id=i, name=f"v1.{i}", description=f"版本{i}") for i in range(1, 11)}
+    machines = [
+        Machine(id=i, name=f"bench-{i:05d}", description=f"压测机器{i}", test_type="performance",
+                agent_version_id=i % 10 + 1, ip=f"10.{i // 65536}.{i // 256 % 256}.{i % 256}", username="root",
+                password="pw", created_at=now - timedelta(seconds=i), updated_at=now - timedelta(microseconds=i))
+        for i in range(1, count + 1)
+    ]
+    return machines, versions
+
+
+def _build(machines, versions) -> dict:
+    # 原机器列表接口组装响应的方式
+    data = []
+    for machine in machines:
+        agent_version = versions.get(machine.agent_version_id)
+        data.append({
+            "id": machine.id,
+            "name": machine.name,
+            "description": machine.description,
+            "test_type": machine.test_type,
+            "ip": machine.ip,
+            "created_at": machine.created_at,
+            "updated_at": machine.updated_at,
+            "agent_version": {
+                "id": agent_version.id if agent_version else None,
+                "name": agent_version.name if agent_version else None,
+                "description": agent_version.description if agent_version else None
+            }
+        })
+    return {"status": True, "message": "获取机器列表成功", "data": data, "total": len(data), "next_cursor": None}
+
+
+async def _dict_path(machines, versions, field) -> bytes:
+    content = await serialize_response(field=field, response_content=_build(machines, versions))
+    return JSONResponse(content).body
+
+
+async def _model_path(machines, versions, field) -> bytes:
+    agent_versions = {version_id: {"id": version.id, "name": version.name, "description": version.description}
+                      for version_id, version in versions.items()}
+    missing_version = {"id": None, "name": None, "description": None}
+    response = MachineListResponse(
+        message="获取机器列表成功",
+        data=[{**inspect(machine).dict, "agent_version": agent_versions.get(machine.agent_version_id, missing_version)}
+              for machine in machines],
+        total=len(machines),
+        next_cursor=None
+    )
+    return ModelResponse(response).body
+
+
+async def run(count: int, rounds: int):
+    machines, versions = _fixtures(count)
+    field = create_model_field(name="Response_get_machines", type_=dict, mode="serialization")
+    outputs = {}
+    for name, path in (("dict", _dict_path), ("model", _model_path)):
+        await path(machines, versions, field)
+        timings = []
+        for _ in range(rounds):
+            started = time.perf_counter()
+            body = await path(machines, versions, field)
+            timings.append(time.perf_counter() - started)
+        outputs[name] = body
+        print(f"path={name} machines={count} bytes={len(body)} "
+              f"median_ms={statistics.median(timings) * 1000:.2f} min_ms={min(timings) * 1000:.2f}")
+    print(f"same_payload={json.loads(outputs['dict']) == json.loads(outputs['model'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="机器列表响应序列化前后的耗时对比")
+    parser.add_argument("--machines", type=int, default=10000)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(run(args.machines, args.rounds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+用Faker生成压测数据
+
+用法（在backend目录下）:
+    python -m benchmarks.seed --database-url sqlite+aiosqlite:///bench.db --machines 10000
+
+生成代理版本、测试用例、机器及机器与测试用例的关联；随机种子固定，相同参数生成的数据相同
+"""
+import argparse
+import asyncio
+import random
+from datetime import datetime, timedelta
+from typing import Dict
+
+from faker import Faker
+from sqlalchemy import insert
+
+from models.machine import AgentVersion, Machine, MachineTestCase, TestCase
+from utils.db import _create_all, build_engine
+
+# 机器的测试类型，筛选压测按这些值查询
+TEST_TYPES = ("performance", "functional", "stability", "io", "network")
+# 每条INSERT语句的行数，避免超过SQLite的参数数量上限
+INSERT_BATCH_SIZE = 500
+# 机器的默认登录密码
+SEED_PASSWORD = "bench"
+
+
+async def _insert(connection, model, rows):
+    for start in range(0, len(rows), INSERT_BATCH_SIZE):
+        await connection.execute(insert(model), rows[start:start + INSERT_BATCH_SIZE])
+
+
+async def seed(url: str, machines: int, agent_versions: int = 10, test_cases: int = 200,
+               links_per_machine: int = 5, seed_value: int = 42) -> Dict[str, int]:
+    """
+    建表并写入压测数据
+    :param url: 数据库URL
+    :param machines: 机器数
+    :param agent_versions: 代理版本数
+    :param test_cases: 测试用例数
+    :param links_per_machine: 每台机器关联的测试用例数
+    :param seed_value: 随机种子
+    :return: 各表写入的行数
+    """
+    fake = Faker()
+    Faker.seed(seed_value)
+    rng = random.Random(seed_value)
+    now = datetime.now()
+
+    def timestamp() -> datetime:
+        return now - timedelta(seconds=rng.randint(0, 90 * 24 * 3600))
+
+    version_rows = [
+        {"id": i, "name": f"v{1 + i // 100}.{i // 10 % 10}.{i % 10}", "description": fake.sentence(nb_words=6),
+         "created_at": timestamp(), "updated_at": timestamp()}
+        for i in range(1, agent_versions + 1)
+    ]
+    test_case_rows = [
+        {"id": i, "name": f"{fake.catch_phrase()} #{i}", "type": rng.choice(TEST_TYPES),
+         "description": fake.paragraph(nb_sentences=2), "created_at": timestamp(), "updated_at": timestamp()}
+        for i in range(1, test_cases + 1)
+    ]
+    machine_rows = []
+    for i in range(1, machines + 1):
+        created_at = timestamp()
+        machine_rows.append({
+            "id": i,
+            "name": f"{fake.hostname(levels=0)}-{i:06d}",
+            "description": fake.sentence(nb_words=8),
+            "test_type": rng.choice(TEST_TYPES),
+            "agent_version_id": rng.randint(1, agent_versions),
+            "ip": fake.unique.ipv4_private(),
+            "username": fake.user_name(),
+            "password": SEED_PASSWORD,
+            "created_at": created_at,
+            "updated_at": created_at + timedelta(seconds=rng.randint(0, 3600)),
+        })
+    link_rows = [
+        {"machine_id": i, "test_case_id": test_case_id}
+        for i in range(1, machines + 1)
+        for test_case_id in rng.sample(range(1, test_cases + 1), min(links_per_machine, test_cases))
+    ]
+
+    engine = build_engine(url)
+    try:
+        async with engine.begin() as connection:
+            await connection.run_sync(_create_all)
+            await _insert(connection, AgentVersion, version_rows)
+            await _insert(connection, TestCase, test_case_rows)
+            await _insert(connection, Machine, machine_rows)
+            await _insert(connection, MachineTestCase, link_rows)
+    finally:
+        await engine.dispose()
+    return {"agent_versions": len(version_rows), "test_cases": len(test_case_rows), "machines": len(machine_rows),
+            "machine_test_cases": len(link_rows)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="用Faker生成压测数据")
+    parser.add_argument("--database-url", required=True, help="目标数据库，需为空库")
+    parser.add_argument("--machines", type=int, default=10000)
+    parser.add_argument("--agent-versions", type=int, default=10)
+    parser.add_argument("--test-cases", type=int, default=200)
+    parser.add_argument("--links-per-machine", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    counts = asyncio.run(seed(args.database_url, args.machines, args.agent_versions, args.test_cases,
+                              args.links_per_machine, seed_value=args.seed))
+    print(" ".join(f"{key}={value}" for key, value in counts.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+SQLite调优前后的读写混合吞吐对比
+
+用法（在backend目录下）:
+    python -m benchmarks.sqlite_tuning --concurrency 50 --duration 10 --write-ratio 0.2
+
+分别在临时数据库上以默认配置（回滚日志、无写串行化）和调优配置（WAL、连接参数、单写者会话）
+运行相同的负载：读操作按更新时间分页查询机器列表，写操作模拟部署完成后更新机器时间并提交
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime
+
+from sqlalchemy import update
+from sqlmodel import select
+
+from models.machine import AgentVersion, Machine
+from utils.db import _create_all, build_engine, build_sessionmaker
+
+SEED_MACHINES = 2000
+
+
+async def _seed(engine):
+    async with engine.begin() as connection:
+        await connection.run_sync(_create_all)
+    session_factory = build_sessionmaker(engine, serialize_writes=False)
+    async with session_factory() as db:
+        db.add(AgentVersion(id=1, name="bench"))
+        for i in range(SEED_MACHINES):
+            db.add(Machine(name=f"bench-{i:05d}", test_type="performance", agent_version_id=1,
+                           ip=f"10.0.{i // 256}.{i % 256}", username="root", password="pw"))
+        await db.commit()
+
+
+async def _worker(session_factory, deadline: float, write_ratio: float, stats: dict):
+    while time.perf_counter() < deadline:
+        is_write = random.random() < write_ratio
+        start = time.perf_counter()
+        try:
+            async with session_factory() as db:
+                if is_write:
+                    machine_id = random.randint(1, SEED_MACHINES)
+                    await db.exec(update(Machine).where(Machine.id == machine_id).values(updated_at=datetime.now()))
+                    await db.commit()
+                else:
+                    query = select(Machine).order_by(Machine.updated_at.desc(), Machine.id.desc()).limit(50)
+                    (await db.exec(query)).all()
+        except Exception as e:
+            stats["errors"] += 1
+            stats["last_error"] = str(e).splitlines()[0]
+            continue
+        stats["writes" if is_write else "reads"].append(time.perf_counter() - start)
+
+
+async def run(tuned: bool, concurrency: int, duration: float, write_ratio: float) -> dict:
+    """
+    在临时数据库上运行一轮读写混合负载
+    :param tuned: 是否启用SQLite调优
+    :param concurrency: 并发协程数
+    :param duration: 运行时长（秒）
+    :param write_ratio: 写操作比例
+    :return: 统计结果
+    """
+    with tempfile.TemporaryDirectory() as tmpdir:
+        url = f"sqlite+aiosqlite:///{os.path.join(tmpdir, 'bench.db')}"
+        engine = build_engine(url, sqlite_tuning=tuned)
+        stats = {"reads": [], "writes": [], "errors": 0, "last_error": None}
+        try:
+            await _seed(engine)
+            session_factory = build_sessionmaker(engine, serialize_writes=tuned)
+            deadline = time.perf_counter() + duration
+            await asyncio.gather(*(_worker(session_factory, deadline, write_ratio, stats)
+                                   for _ in range(concurrency)))
+        finally:
+            await engine.dispose()
+
+    def percentile(values, q):
+        return round(statistics.quantiles(values, n=100)[q - 1] * 1000, 2) if len(values) > 1 else None
+
+    total = len(stats["reads"]) + len(stats["writes"])
+    return {
+        "profile": "tuned" if tuned else "default",
+        "ops_per_sec": round(total / duration, 1),
+        "reads": len(stats["reads"]),
+        "writes": len(stats["writes"]),
+        "errors": stats["errors"],
+        "read_p50_ms": percentile(stats["reads"], 50),
+        "read_p99_ms": percentile(stats["reads"], 99),
+        "write_p50_ms": percentile(stats["writes"], 50),
+        "write_p99_ms": percentile(stats["writes"], 99),
+        "last_error": stats["last_error"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite调优前后的读写混合吞吐对比")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    args = parser.parse_args()
+
+    for tuned in (False, True):
+        result = asyncio.run(run(tuned, args.concurrency, args.duration, args.write_ratio))
+        print(" ".join(f"{key}={value}" for key, value in result.items()))
+
+
+if __name__ == "__main__":
+    main()
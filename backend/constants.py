@@ -0,0 +1,32 @@
+import os
+
+# 后端根目录
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# 静态资源目录
+STATIC_DIR = os.path.join(BASE_DIR, "static")
+# 默认代理安装包（未给代理版本上传安装包时使用）
+DEFAULT_AGENT_PACKAGE = os.path.join(STATIC_DIR, "install.tar.gz")
+# 按内容哈希存放的代理安装包目录
+AGENT_PACKAGE_DIR = os.path.join(STATIC_DIR, "packages")
+
+# 目标机器上的代理安装目录
+REMOTE_AGENT_DIR = "/opt/nc_agent"
+# 目标机器上的安装包缓存目录，独立于安装目录，重新安装时不会被清理
+REMOTE_PACKAGE_DIR = "/opt/nc_agent.pkg"
+# 记录已安装安装包哈希的文件
+REMOTE_PACKAGE_MARKER = f"{REMOTE_AGENT_DIR}/.package_sha256"
+# 目标机器上nc_agent的运行日志
+REMOTE_AGENT_LOG = f"{REMOTE_AGENT_DIR}/nc_agent.log"
+# 目标机器的SSH端口
+SSH_PORT = int(os.environ.get("SSH_PORT", "22"))
+# 目标机器上代理HTTP服务端口
+AGENT_PORT = int(os.environ.get("AGENT_PORT", "65535"))
+
+# 运行时数据目录
+DATA_DIR = os.environ.get("DATA_DIR", os.path.join(BASE_DIR, "data"))
+# 机器性能时间序列目录
+PERFORMANCE_DATA_DIR = os.path.join(DATA_DIR, "performance")
+# 测试结果大输出的段文件目录
+RESULT_OUTPUT_DIR = os.path.join(DATA_DIR, "results")
+# 部署日志（阶段及远程命令输出）的分块文件目录
+DEPLOY_LOG_DIR = os.path.join(DATA_DIR, "deploy_logs")
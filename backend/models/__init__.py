@@ -1 +1,3 @@
-from models.machine import Machine, AgentVersion, TestCase, MachineTestCase
+from models.machine import Machine, AgentVersion, TestCase, MachineTestCase, AgentPackage
+from models.job import DeployJob
+from models.execution import Execution, ExecutionResult
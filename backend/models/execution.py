@@ -0,0 +1,59 @@
+from sqlalchemy import Index
+from sqlmodel import SQLModel, Field
+from typing import Optional
+from datetime import datetime
+
+# Define the Execution model: one fan-out run of linked test cases across machines
+class Execution(SQLModel, table=True):
+    __tablename__ = "executions"
+    id: Optional[int] = Field(default=None, primary_key=True)
+    # running / completed / failed / interrupted
+    status: str = Field(default="running", max_length=20, nullable=False, index=True)
+    total: int = Field(default=0)
+    succeeded: int = Field(default=0)
+    failed: int = Field(default=0)
+    # JSON encoded params passed to every test run
+    params: Optional[str] = Field(default=None)
+    created_at: datetime = Field(default_factory=datetime.now, index=True)
+    finished_at: Optional[datetime] = Field(default=None)
+
+# Define the ExecutionResult model: result of one test case on one machine within an Execution
+class ExecutionResult(SQLModel, table=True):
+    __tablename__ = "execution_results"
+    # History lookups: results of a test case on a machine, newest first
+    __table_args__ = (
+        Index("ix_execution_results_machine_case_finished", "machine_id", "test_case_id", "finished_at"),
+    )
+    id: Optional[int] = Field(default=None, primary_key=True)
+    execution_id: int = Field(foreign_key="executions.id", nullable=False, index=True)
+    machine_id: int = Field(nullable=False, index=True)
+    test_case_id: int = Field(nullable=False)
+    # Agent side test id, i.e. TestCase.name at dispatch time
+    test_name: str = Field(max_length=255, nullable=False)
+    # Machine's agent version and test type at dispatch time, used for statistics
+    agent_version_id: Optional[int] = Field(default=None, index=True)
+    test_type: Optional[str] = Field(default=None, max_length=50)
+    # pending / running / completed / failed / cancelled
+    status: str = Field(default="pending", max_length=20, nullable=False)
+    started_at: Optional[datetime] = Field(default=None)
+    finished_at: Optional[datetime] = Field(default=None)
+    duration_ms: Optional[int] = Field(default=None)
+    # Full output when small, otherwise the tail of it; the full output is in ExecutionOutput
+    output: Optional[str] = Field(default=None)
+    error: Optional[str] = Field(default=None)
+    # JSON encoded structured data reported by the agent
+    data: Optional[str] = Field(default=None)
+    # Metrics parsed from the agent output/data: throughput in MB/s and IOPS
+    read_mbps: Optional[float] = Field(default=None)
+    write_mbps: Optional[float] = Field(default=None)
+    iops: Optional[float] = Field(default=None)
+
+# Define the ExecutionOutput model: location of a large result output in the compressed segment files
+class ExecutionOutput(SQLModel, table=True):
+    __tablename__ = "execution_outputs"
+    result_id: int = Field(foreign_key="execution_results.id", primary_key=True)
+    segment: int = Field(nullable=False)
+    offset: int = Field(nullable=False)
+    # Compressed and original size in bytes
+    length: int = Field(nullable=False)
+    size: int = Field(nullable=False)
@@ -0,0 +1,20 @@
+from sqlmodel import SQLModel, Field
+from typing import Optional
+from datetime import datetime
+
+# Define the DeployJob model: persistent queue entry for background agent deployment
+class DeployJob(SQLModel, table=True):
+    __tablename__ = "deploy_jobs"
+    id: Optional[int] = Field(default=None, primary_key=True)
+    machine_id: int = Field(nullable=False, index=True)
+    force: bool = Field(default=False)
+    # pending / running / succeeded / failed
+    status: str = Field(default="pending", max_length=20, nullable=False, index=True)
+    attempts: int = Field(default=0)
+    max_attempts: int = Field(default=3)
+    message: Optional[str] = Field(default=None)
+    run_after: datetime = Field(default_factory=datetime.now)
+    created_at: datetime = Field(default_factory=datetime.now)
+    updated_at: datetime = Field(default_factory=datetime.now)
+    started_at: Optional[datetime] = Field(default=None)
+    finished_at: Optional[datetime] = Field(default=None)
@@ -24,15 +24,15 @@ class TestCase(SQLModel, table=True):
 class Machine(SQLModel, table=True):
     __tablename__ = "machines"
     id: Optional[int] = Field(default=None, primary_key=True)
-    name: str = Field(max_length=255, nullable=False)
+    name: str = Field(max_length=255, nullable=False, index=True)
     description: Optional[str] = Field(default=None)
-    test_type: str = Field(max_length=50, nullable=False)
-    agent_version_id: int = Field(foreign_key="agent_versions.id", nullable=False)  # Fixed: Changed 'forward_key' to 'foreign_key'
-    ip: str = Field(max_length=15, nullable=False)
+    test_type: str = Field(max_length=50, nullable=False, index=True)
+    agent_version_id: int = Field(foreign_key="agent_versions.id", nullable=False, index=True)  # Fixed: Changed 'forward_key' to 'foreign_key'
+    ip: str = Field(max_length=15, nullable=False, index=True)
     username: str = Field(max_length=255, nullable=False)
     password: str = Field(max_length=255, nullable=False)
     created_at: datetime = Field(default_factory=datetime.now)
-    updated_at: datetime = Field(default_factory=datetime.now)
+    updated_at: datetime = Field(default_factory=datetime.now, index=True)
     # One-to-many relationship: Linked to AgentVersion
     agent_version: Optional["AgentVersion"] = Relationship(back_populates="machines")
     # Many-to-many relationship: Linked to TestCase via MachineTestCase
@@ -47,4 +47,12 @@ class AgentVersion(SQLModel, table=True):
     created_at: datetime = Field(default_factory=datetime.now)
     updated_at: datetime = Field(default_factory=datetime.now)
     # One-to-many relationship: Linked to Machine
-    machines: List["Machine"] = Relationship(back_populates="agent_version")
\ No newline at end of file
+    machines: List["Machine"] = Relationship(back_populates="agent_version")
+
+# Define the AgentPackage model: content-addressed install package of an AgentVersion
+class AgentPackage(SQLModel, table=True):
+    __tablename__ = "agent_packages"
+    agent_version_id: int = Field(foreign_key="agent_versions.id", primary_key=True)
+    sha256: str = Field(max_length=64, nullable=False, index=True)
+    size: int = Field(nullable=False)
+    created_at: datetime = Field(default_factory=datetime.now)
@@ -0,0 +1,7 @@
+"""
+本地模拟机器集群：在回环地址上模拟大量目标机器的SSH服务和nc_agent代理HTTP服务，
+用于在一台Linux机器上对部署、灰度发布、健康检查和测试下发进行规模测试
+"""
+from simulator.fleet import FleetConfig, SimulatedMachine, Simulator
+
+__all__ = ["FleetConfig", "SimulatedMachine", "Simulator"]
@@ -0,0 +1,92 @@
+"""
+启动本地模拟机器集群
+
+用法（在backend目录下）:
+    python -m simulator --machines 1000 --register
+    python -m simulator --machines 200 --agent-running --auth-failure-rate 0.01 --sftp-rate-kbps 512
+
+每台模拟机器占用一个127.x回环地址（Linux上整个127.0.0.0/8都指向本机，无需额外配置）。
+--register将模拟机器写入DATABASE_URL指向的数据库，后端需使用相同的SSH_PORT和AGENT_PORT启动，
+之后即可通过正常的接口对这些机器进行部署、灰度发布、健康检查和测试下发。按Ctrl-C停止
+"""
+import argparse
+import asyncio
+import dataclasses
+from typing import Optional
+
+from sqlmodel import select
+
+from simulator.fleet import FleetConfig, Simulator
+
+
+async def _register(sim: Simulator, agent_version_id: Optional[int], test_type: str, test_case_ids):
+    from models.machine import AgentVersion
+    from utils.db import async_session, create_db_and_tables
+
+    await create_db_and_tables()
+    async with async_session() as db:
+        if agent_version_id is None:
+            version = (await db.exec(select(AgentVersion).where(AgentVersion.name == "simulator"))).first()
+            if version is None:
+                version = AgentVersion(name="simulator", description="模拟集群使用的代理版本")
+                db.add(version)
+                await db.commit()
+                await db.refresh(version)
+            agent_version_id = version.id
+        await sim.register(db, agent_version_id, test_type, test_case_ids)
+
+
+async def run(args):
+    """
+    启动模拟集群并运行到被中断
+    :param args: 命令行参数
+    """
+    options = {f.name: getattr(args, f.name) for f in dataclasses.fields(FleetConfig) if hasattr(args, f.name)}
+    sim = Simulator(FleetConfig(**options))
+    await sim.start()
+    try:
+        if args.register:
+            test_case_ids = [int(i) for i in args.test_case_ids.split(",")] if args.test_case_ids else []
+            await _register(sim, args.agent_version_id, args.test_type, test_case_ids)
+        print(f"后端启动时需设置: SSH_PORT={sim.config.ssh_port} AGENT_PORT={sim.config.agent_port}", flush=True)
+        while True:
+            await asyncio.sleep(args.stats_interval)
+            print(" ".join(f"{key}={value}" for key, value in sim.stats().items()), flush=True)
+    finally:
+        await sim.stop()
+
+
+def main():
+    defaults = FleetConfig()
+    parser = argparse.ArgumentParser(description="启动本地模拟机器集群")
+    parser.add_argument("--machines", type=int, default=defaults.machines)
+    parser.add_argument("--first-ip", default=defaults.first_ip, help="第一台机器的回环地址")
+    parser.add_argument("--ssh-port", type=int, default=defaults.ssh_port)
+    parser.add_argument("--agent-port", type=int, default=defaults.agent_port)
+    parser.add_argument("--bind-host", default=defaults.bind_host)
+    parser.add_argument("--ssh-latency", type=float, default=defaults.ssh_latency, help="每条远程命令的平均延迟（秒）")
+    parser.add_argument("--agent-latency", type=float, default=defaults.agent_latency, help="每个代理请求的平均延迟（秒）")
+    parser.add_argument("--latency-jitter", type=float, default=defaults.latency_jitter)
+    parser.add_argument("--command-failure-rate", type=float, default=defaults.command_failure_rate)
+    parser.add_argument("--auth-failure-rate", type=float, default=defaults.auth_failure_rate)
+    parser.add_argument("--unreachable-rate", type=float, default=defaults.unreachable_rate)
+    parser.add_argument("--sftp-rate-kbps", type=float, default=defaults.sftp_rate_kbps, help="SFTP上传速率上限，0表示不限")
+    parser.add_argument("--test-failure-rate", type=float, default=defaults.test_failure_rate)
+    parser.add_argument("--test-duration", type=float, default=defaults.test_duration, help="测试运行的平均耗时（秒）")
+    parser.add_argument("--test-output-kb", type=int, default=defaults.test_output_kb, help="每次测试输出的附加日志大小（KB）")
+    parser.add_argument("--agent-running", action="store_true", help="启动时代理已在运行，无需先部署")
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--register", action="store_true", help="将模拟机器写入DATABASE_URL指向的数据库")
+    parser.add_argument("--agent-version-id", type=int, help="注册机器的代理版本，默认使用（或创建）名为simulator的版本")
+    parser.add_argument("--test-type", default="performance")
+    parser.add_argument("--test-case-ids", help="逗号分隔的测试用例ID，注册时与每台机器关联")
+    parser.add_argument("--stats-interval", type=float, default=10, help="输出统计的间隔（秒）")
+    args = parser.parse_args()
+    try:
+        asyncio.run(run(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+import asyncio
+import json
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple
+
+from simulator.fleet import SimulatedMachine, Simulator
+from utils.logger import log
+
+# 模拟代理的版本号
+AGENT_VERSION = "1.0.0-sim"
+# 请求头的最大长度
+_MAX_HEADER_SIZE = 16 * 1024
+# 代理上可运行的测试用例
+_TESTS = [
+    {"id": "disk_io", "name": "磁盘IO测试", "description": "模拟顺序读写与随机IOPS测试"},
+    {"id": "network", "name": "网络测试", "description": "模拟网络吞吐测试"},
+    {"id": "cpu", "name": "CPU测试", "description": "模拟CPU计算测试"},
+]
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _log_lines(size: int, rng) -> str:
+    # 模拟压测过程中逐秒输出的进度日志
+    lines, total, second = [], 0, 0
+    while total < size:
+        line = (f"[{second:06d}s] bs=4k qd=32 read={rng.uniform(300, 600):.1f}MB/s "
+                f"write={rng.uniform(250, 500):.1f}MB/s iops={rng.randint(8000, 15000)} lat_us={rng.randint(80, 900)}\n")
+        lines.append(line)
+        total += len(line)
+        second += 1
+    return "".join(lines)
+
+
+class AgentServer:
+    """
+    模拟nc_agent的HTTP服务
+
+    在一个端口上接受所有模拟机器的连接，按连接的本地地址确定机器；
+    机器不可达或代理未运行时连接被立即关闭，表现为连接被拒绝。
+    支持HTTP/1.1长连接，只实现后端实际调用的接口
+    """
+
+    def __init__(self, sim: Simulator):
+        self.sim = sim
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        """
+        开始监听
+        """
+        config = self.sim.config
+        self._server = await asyncio.start_server(self._handle, config.bind_host, config.agent_port, backlog=1024)
+
+    async def stop(self):
+        """
+        停止监听
+        """
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        machine = self.sim.machine(writer.get_extra_info("sockname")[0])
+        try:
+            while machine is not None and machine.reachable and machine.agent_running:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, path, body, keep_alive = request
+                machine.agent_requests += 1
+                await asyncio.sleep(self.sim.latency(self.sim.config.agent_latency))
+                if not machine.agent_running:
+                    # 请求处理期间代理被停止
+                    break
+                status, payload = await self._dispatch(machine, method, path, body)
+                data = json.dumps(payload, ensure_ascii=False).encode()
+                writer.write(
+                    f"HTTP/1.1 {status} {_REASONS.get(status, 'Unknown')}\r\n"
+                    f"Content-Type: application/json; charset=utf-8\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            pass
+        except Exception as e:
+            log.warning("模拟代理{}处理请求异常: {}", machine.ip if machine else "-", str(e))
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_request(reader: asyncio.StreamReader) -> Optional[Tuple[str, str, bytes, bool]]:
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError:
+            return None
+        if len(head) > _MAX_HEADER_SIZE:
+            raise ValueError("请求头过长")
+        lines = head.decode("latin-1").split("\r\n")
+        method, path, version = lines[0].split(" ", 2)
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        length = int(headers.get("content-length", "0"))
+        body = await reader.readexactly(length) if length else b""
+        connection = headers.get("connection", "").lower()
+        keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+        return method, path.split("?", 1)[0], body, keep_alive
+
+    async def _dispatch(self, machine: SimulatedMachine, method: str, path: str,
+                        body: bytes) -> Tuple[int, Dict[str, Any]]:
+        if path == "/health":
+            return 200, {"status": "ok", "timestamp": int(time.time()), "version": AGENT_VERSION}
+        if path == "/api/v1/system/info":
+            return 200, {"hostname": machine.name, "os": "linux", "platform": "simulator", "cpu_count": 8,
+                         "cpu_model": "Simulated CPU", "memory_total": 16 * 1024 ** 3,
+                         "disk_total": 512 * 1024 ** 3, "ip": machine.ip}
+        if path == "/api/v1/tests/list":
+            return 200, {"tests": _TESTS}
+        if path.startswith("/api/v1/tests/run/"):
+            if method != "POST":
+                return 405, {"error": "仅支持POST"}
+            try:
+                params = json.loads(body or b"{}").get("params") or {}
+            except (ValueError, AttributeError):
+                return 400, {"error": "请求体不是有效的JSON"}
+            return await self._run_test(machine, path.rsplit("/", 1)[-1], params)
+        if path.startswith("/api/v1/tests/results/"):
+            result = machine.results.get(path.rsplit("/", 1)[-1])
+            if result is None:
+                return 404, {"error": "没有该测试用例的执行结果"}
+            return 200, result
+        return 404, {"error": f"未知的接口: {path}"}
+
+    async def _run_test(self, machine: SimulatedMachine, test_id: str,
+                        params: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        config = self.sim.config
+        rng = self.sim.rng
+        started = _now()
+        begin = time.perf_counter()
+        await asyncio.sleep(self.sim.latency(config.test_duration))
+        duration_ms = int((time.perf_counter() - begin) * 1000)
+        if rng.random() < config.test_failure_rate:
+            # 一半模拟为代理内部错误，一半模拟为测试本身失败
+            if rng.random() < 0.5:
+                return 500, {"error": "模拟代理内部错误"}
+            result = {"id": test_id, "status": "failed", "started": started, "finished": _now(),
+                      "duration_ms": duration_ms, "output": "", "error": "模拟测试失败"}
+        else:
+            # 每台机器的性能围绕各自的基准值波动，便于统计和对比
+            base = 400 + machine.index % 20 * 10
+            data = {"read_mbps": round(base * rng.uniform(0.9, 1.1), 1),
+                    "write_mbps": round(base * 0.8 * rng.uniform(0.9, 1.1), 1),
+                    "iops": int(base * 25 * rng.uniform(0.9, 1.1))}
+            output = f"读取速度: {data['read_mbps']} MB/s\n写入速度: {data['write_mbps']} MB/s\nIOPS: {data['iops']}"
+            if config.test_output_kb:
+                output = _log_lines(config.test_output_kb * 1024, rng) + output
+            result = {"id": test_id, "status": "completed", "started": started, "finished": _now(),
+                      "duration_ms": duration_ms, "output": output, "data": data}
+            if params:
+                result["params"] = params
+        machine.results[test_id] = result
+        return 200, result
@@ -0,0 +1,231 @@
+import asyncio
+import hashlib
+import ipaddress
+import random
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+from sqlalchemy import insert
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from constants import AGENT_PORT
+from models.machine import Machine, MachineTestCase
+from utils.logger import log
+
+# 模拟SSH服务的默认端口，避免与本机sshd的22端口冲突
+DEFAULT_SSH_PORT = 2222
+# 模拟机器的第一个IP，之后依次递增（跳过网络地址和广播地址）
+DEFAULT_FIRST_IP = "127.0.1.1"
+# 模拟机器的登录信息
+SIMULATED_USERNAME = "root"
+SIMULATED_PASSWORD = "simulated"
+# 注册机器时每条INSERT语句的行数，避免超过SQLite的参数数量上限
+REGISTER_BATCH_SIZE = 500
+# 模拟机器上初始存在的目录
+INITIAL_DIRS = ("/", "/opt", "/root", "/tmp")
+
+
+@dataclass
+class FleetConfig:
+    """模拟集群配置，比例类参数取值0~1"""
+    machines: int = 100
+    first_ip: str = DEFAULT_FIRST_IP
+    ssh_port: int = DEFAULT_SSH_PORT
+    agent_port: int = AGENT_PORT
+    # 监听地址：0.0.0.0可同时接收发往所有127.x地址的连接，不属于模拟机器的连接会被直接关闭
+    bind_host: str = "0.0.0.0"
+    # 每条远程命令、每个代理请求的平均延迟（秒），实际延迟在±latency_jitter比例内随机
+    ssh_latency: float = 0.01
+    agent_latency: float = 0.005
+    latency_jitter: float = 0.5
+    # 远程命令（不含只读检查）随机失败的概率
+    command_failure_rate: float = 0.0
+    # 拒绝密码认证的机器比例
+    auth_failure_rate: float = 0.0
+    # 不可达的机器比例：SSH和代理端口接受连接后立即断开
+    unreachable_rate: float = 0.0
+    # SFTP上传速率上限（KB/s），0表示不限
+    sftp_rate_kbps: float = 0.0
+    # 代理测试运行失败的概率和平均耗时（秒）
+    test_failure_rate: float = 0.0
+    test_duration: float = 0.5
+    # 每次测试输出的附加日志大小（KB），用于模拟磁盘压测等产生大量输出的测试
+    test_output_kb: int = 0
+    # 启动时代理是否已在运行（不经过部署即可进行健康检查和测试）
+    agent_running: bool = False
+    seed: int = 42
+
+
+class Blob(NamedTuple):
+    """模拟文件系统中的文件内容"""
+    data: bytes
+    sha256: str
+
+
+@dataclass
+class SimulatedMachine:
+    """
+    一台模拟机器
+
+    文件系统为内存中的路径到文件内容的映射，相同内容的文件在所有机器间共享同一份数据
+    """
+    index: int
+    ip: str
+    reachable: bool = True
+    auth_ok: bool = True
+    agent_running: bool = False
+    files: Dict[str, Blob] = field(default_factory=dict)
+    dirs: set = field(default_factory=lambda: set(INITIAL_DIRS))
+    # 代理上每个测试用例的最近一次结果
+    results: Dict[str, dict] = field(default_factory=dict)
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+    # 统计
+    ssh_connections: int = 0
+    commands: int = 0
+    agent_requests: int = 0
+
+    @property
+    def name(self) -> str:
+        return f"sim-{self.index:05d}"
+
+    def reset(self):
+        """
+        清空文件系统并停止代理，恢复为未部署状态
+        """
+        with self.lock:
+            self.files.clear()
+            self.dirs = set(INITIAL_DIRS)
+            self.results.clear()
+            self.agent_running = False
+
+
+class Simulator:
+    """
+    本地模拟机器集群
+
+    每台模拟机器使用一个127.x回环地址，所有机器共用一个SSH监听端口和一个代理HTTP监听端口，
+    按连接的本地地址区分机器。SSH服务在后台线程中运行（paramiko为阻塞库），
+    代理HTTP服务运行在调用start()的事件循环中
+    """
+
+    def __init__(self, config: FleetConfig):
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.machines: Dict[str, SimulatedMachine] = {}
+        self._blobs: Dict[str, Blob] = {}
+        self._blob_lock = threading.Lock()
+        first = ipaddress.IPv4Address(config.first_ip)
+        address = first
+        for index in range(config.machines):
+            while address.packed[-1] in (0, 255):
+                address += 1
+            machine = SimulatedMachine(index=index + 1, ip=str(address), agent_running=config.agent_running)
+            machine.reachable = self.rng.random() >= config.unreachable_rate
+            machine.auth_ok = self.rng.random() >= config.auth_failure_rate
+            self.machines[machine.ip] = machine
+            address += 1
+        self._ssh = None
+        self._agent = None
+
+    def latency(self, mean: float) -> float:
+        """
+        按配置的抖动比例生成一次延迟
+        :param mean: 平均延迟（秒）
+        :return: 延迟（秒）
+        """
+        jitter = self.config.latency_jitter
+        return max(mean * self.rng.uniform(1 - jitter, 1 + jitter), 0.0)
+
+    def blob(self, data: bytes) -> Blob:
+        """
+        保存文件内容，相同内容只保留一份
+        :param data: 文件内容
+        :return: 文件内容及其哈希
+        """
+        sha256 = hashlib.sha256(data).hexdigest()
+        with self._blob_lock:
+            blob = self._blobs.get(sha256)
+            if blob is None:
+                blob = self._blobs[sha256] = Blob(data, sha256)
+        return blob
+
+    def machine(self, ip: str) -> Optional[SimulatedMachine]:
+        """
+        根据连接的本地地址查找模拟机器
+        :param ip: 地址
+        :return: 模拟机器，不属于集群时为None
+        """
+        return self.machines.get(ip)
+
+    async def start(self):
+        """
+        启动模拟SSH服务和代理HTTP服务
+        """
+        from simulator.agent import AgentServer
+        from simulator.ssh import SSHServer
+
+        self._ssh = SSHServer(self)
+        self._ssh.start()
+        self._agent = AgentServer(self)
+        await self._agent.start()
+        log.info("模拟集群已启动: 机器数={}, 地址={}~{}, SSH端口={}, 代理端口={}", len(self.machines),
+                 next(iter(self.machines), None), next(reversed(self.machines), None),
+                 self.config.ssh_port, self.config.agent_port)
+
+    async def stop(self):
+        """
+        停止模拟服务
+        """
+        if self._agent is not None:
+            await self._agent.stop()
+            self._agent = None
+        if self._ssh is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self._ssh.stop)
+            self._ssh = None
+
+    def stats(self) -> Dict[str, int]:
+        """
+        集群统计
+        :return: 机器数、代理运行数及SSH连接、命令、代理请求总数
+        """
+        machines = list(self.machines.values())
+        return {
+            "machines": len(machines),
+            "agents_running": sum(machine.agent_running for machine in machines),
+            "ssh_connections": sum(machine.ssh_connections for machine in machines),
+            "commands": sum(machine.commands for machine in machines),
+            "agent_requests": sum(machine.agent_requests for machine in machines),
+        }
+
+    async def register(self, db: AsyncSession, agent_version_id: int, test_type: str = "performance",
+                       test_case_ids: Sequence[int] = ()) -> List[int]:
+        """
+        将模拟机器写入数据库，已存在相同IP和名称的机器跳过
+        :param db: 数据库会话
+        :param agent_version_id: 代理版本ID
+        :param test_type: 测试类型
+        :param test_case_ids: 关联的测试用例ID
+        :return: 新写入的机器ID
+        """
+        existing = set((await db.exec(
+            select(Machine.ip).where(Machine.name.startswith("sim-"), Machine.ip.in_(list(self.machines)))
+        )).all())
+        rows = [
+            {"name": machine.name, "description": "模拟机器", "test_type": test_type,
+             "agent_version_id": agent_version_id, "ip": machine.ip, "username": SIMULATED_USERNAME,
+             "password": SIMULATED_PASSWORD}
+            for machine in self.machines.values() if machine.ip not in existing
+        ]
+        machine_ids = []
+        for start in range(0, len(rows), REGISTER_BATCH_SIZE):
+            result = await db.exec(insert(Machine).values(rows[start:start + REGISTER_BATCH_SIZE]).returning(Machine.id))
+            machine_ids.extend(result.scalars().all())
+        links = [{"machine_id": machine_id, "test_case_id": test_case_id}
+                 for machine_id in machine_ids for test_case_id in test_case_ids]
+        for start in range(0, len(links), REGISTER_BATCH_SIZE):
+            await db.exec(insert(MachineTestCase).values(links[start:start + REGISTER_BATCH_SIZE]))
+        await db.commit()
+        log.info("注册模拟机器: 新增{}台，已存在{}台", len(machine_ids), len(existing))
+        return machine_ids
@@ -0,0 +1,530 @@
+import io
+import os
+import posixpath
+import re
+import shlex
+import socket
+import stat
+import tarfile
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import paramiko
+
+from simulator.fleet import SIMULATED_PASSWORD, Blob, SimulatedMachine, Simulator
+from utils.logger import log
+
+# 会修改机器状态的命令，按command_failure_rate随机失败
+_MUTATING_COMMANDS = {"mkdir", "rm", "tar", "find", "nohup", "pkill"}
+# if [ -d X ]; then A; else B; fi
+_IF_PATTERN = re.compile(r"^if \[ (-[df]) (\S+) \]; then (.*?); else (.*?); fi$")
+# 命令列表分隔符
+_LIST_PATTERN = re.compile(r"\s*(&&|;)\s*")
+# 模拟进程表中的基础进程
+_BASE_PROCESSES = [
+    "root         1     0  0 00:00 ?        00:00:01 /sbin/init",
+    "root       512     1  0 00:00 ?        00:00:00 /usr/sbin/sshd -D",
+    "root       640     1  0 00:00 ?        00:00:00 /usr/sbin/cron -f",
+]
+_AGENT_PID = 4242
+
+
+class CommandResult:
+    """一条模拟命令的执行结果"""
+    __slots__ = ("stdout", "stderr", "status")
+
+    def __init__(self, stdout: str = "", stderr: str = "", status: int = 0):
+        self.stdout = stdout
+        self.stderr = stderr
+        self.status = status
+
+
+class _Shell:
+    """
+    模拟机器上的命令解释器
+
+    只支持部署流程实际发送的命令形式：if/then/else、&&和;串联、管道、输出重定向，
+    以及mkdir/rm/tar/echo/cat/sha256sum/find/cd/nohup/pkill/ps/netstat/grep/wc/tail/head
+    """
+
+    def __init__(self, server: "SSHServer", machine: SimulatedMachine):
+        self.server = server
+        self.sim = server.sim
+        self.machine = machine
+        self.cwd = "/root"
+
+    def _path(self, path: str) -> str:
+        return posixpath.normpath(posixpath.join(self.cwd, path))
+
+    def _fail(self, name: str) -> bool:
+        return name in _MUTATING_COMMANDS and self.sim.rng.random() < self.sim.config.command_failure_rate
+
+    def run(self, command: str) -> CommandResult:
+        """
+        执行一条命令行
+        :param command: 命令行
+        :return: 执行结果
+        """
+        command = command.strip()
+        match = _IF_PATTERN.match(command)
+        if match:
+            test, path, then_branch, else_branch = match.groups()
+            path = self._path(path)
+            exists = path in self.machine.dirs if test == "-d" else path in self.machine.files
+            return self.run(then_branch if exists else else_branch)
+
+        parts = _LIST_PATTERN.split(command)
+        result = CommandResult()
+        stdout, stderr = [], []
+        operator = ";"
+        for index in range(0, len(parts), 2):
+            if parts[index] and (operator == ";" or result.status == 0):
+                result = self._pipeline(parts[index])
+                stdout.append(result.stdout)
+                stderr.append(result.stderr)
+            operator = parts[index + 1] if index + 1 < len(parts) else ";"
+        return CommandResult("".join(stdout), "".join(stderr), result.status)
+
+    def _pipeline(self, command: str) -> CommandResult:
+        stages = [stage.strip() for stage in command.split(" | ")]
+        result = CommandResult()
+        stdin: Optional[str] = None
+        for stage in stages:
+            result = self._simple(stage, stdin, stages)
+            stdin = result.stdout
+        return result
+
+    def _simple(self, command: str, stdin: Optional[str], pipeline: List[str]) -> CommandResult:
+        try:
+            tokens = shlex.split(command)
+        except ValueError as e:
+            return CommandResult(stderr=f"sh: {e}\n", status=2)
+        args, redirect, merge, discard_stderr, background = [], None, False, False, False
+        iterator = iter(tokens)
+        for token in iterator:
+            if token == ">":
+                redirect = next(iterator, None)
+            elif token.startswith(">") and len(token) > 1:
+                redirect = token[1:]
+            elif token == "2>&1":
+                merge = True
+            elif token == "2>/dev/null":
+                discard_stderr = True
+            elif token == "&":
+                background = True
+            else:
+                args.append(token)
+        if not args:
+            return CommandResult()
+
+        name = args[0]
+        if self._fail(name):
+            result = CommandResult(stderr=f"{name}: 模拟命令失败\n", status=1)
+        else:
+            handler = getattr(self, f"_cmd_{name.replace('.', '_').replace('/', '_')}", None)
+            if handler is None:
+                result = CommandResult(stderr=f"sh: {name}: not found\n", status=127)
+            else:
+                result = handler(args[1:], stdin, pipeline)
+        if merge:
+            result = CommandResult(result.stdout + result.stderr, "", result.status)
+        if discard_stderr:
+            result.stderr = ""
+        if redirect is not None and redirect != "/dev/null":
+            path = self._path(redirect)
+            if posixpath.dirname(path) not in self.machine.dirs:
+                return CommandResult(stderr=f"sh: can't create {redirect}: nonexistent directory\n", status=2)
+            self.machine.files[path] = self.sim.blob(result.stdout.encode())
+            result.stdout = ""
+        elif redirect == "/dev/null":
+            result.stdout = ""
+        if background:
+            # 后台命令的退出码总是0，失败只能通过后续检查发现
+            result.status = 0
+        return result
+
+    def _remove(self, path: str):
+        prefix = path.rstrip("/") + "/"
+        self.machine.files.pop(path, None)
+        self.machine.dirs.discard(path)
+        for name in [name for name in self.machine.files if name.startswith(prefix)]:
+            del self.machine.files[name]
+        self.machine.dirs.difference_update([name for name in self.machine.dirs if name.startswith(prefix)])
+
+    def _makedirs(self, path: str):
+        while path not in self.machine.dirs:
+            self.machine.dirs.add(path)
+            path = posixpath.dirname(path)
+
+    def _cmd_true(self, args, stdin, pipeline) -> CommandResult:
+        return CommandResult()
+
+    def _cmd_cd(self, args, stdin, pipeline) -> CommandResult:
+        path = self._path(args[0] if args else "/root")
+        if path not in self.machine.dirs:
+            return CommandResult(stderr=f"sh: cd: can't cd to {args[0]}\n", status=2)
+        self.cwd = path
+        return CommandResult()
+
+    def _cmd_echo(self, args, stdin, pipeline) -> CommandResult:
+        return CommandResult(" ".join(args) + "\n")
+
+    def _cmd_cat(self, args, stdin, pipeline) -> CommandResult:
+        if not args:
+            return CommandResult(stdin or "")
+        blob = self.machine.files.get(self._path(args[0]))
+        if blob is None:
+            return CommandResult(stderr=f"cat: {args[0]}: No such file or directory\n", status=1)
+        return CommandResult(blob.data.decode(errors="replace"))
+
+    def _cmd_mkdir(self, args, stdin, pipeline) -> CommandResult:
+        parents = "-p" in args
+        for arg in (arg for arg in args if not arg.startswith("-")):
+            path = self._path(arg)
+            if path in self.machine.files:
+                return CommandResult(stderr=f"mkdir: can't create directory '{arg}': File exists\n", status=1)
+            if not parents and posixpath.dirname(path) not in self.machine.dirs:
+                return CommandResult(stderr=f"mkdir: can't create directory '{arg}': No such file or directory\n",
+                                     status=1)
+            self._makedirs(path)
+        return CommandResult()
+
+    def _cmd_rm(self, args, stdin, pipeline) -> CommandResult:
+        recursive = any(arg.startswith("-") and "r" in arg for arg in args)
+        for arg in (arg for arg in args if not arg.startswith("-")):
+            path = self._path(arg)
+            if path in self.machine.dirs and not recursive:
+                return CommandResult(stderr=f"rm: '{arg}' is a directory\n", status=1)
+            self._remove(path)
+        return CommandResult()
+
+    def _cmd_tar(self, args, stdin, pipeline) -> CommandResult:
+        if not args or "x" not in args[0] or "f" not in args[0] or len(args) < 2:
+            return CommandResult(stderr="tar: 仅支持解压: tar -xzvf FILE -C DIR\n", status=2)
+        archive = self._path(args[1])
+        target = self._path(args[args.index("-C") + 1]) if "-C" in args else self.cwd
+        blob = self.machine.files.get(archive)
+        if blob is None:
+            return CommandResult(stderr=f"tar: {args[1]}: Cannot open: No such file or directory\n", status=2)
+        if target not in self.machine.dirs:
+            return CommandResult(stderr=f"tar: {target}: Cannot open: No such file or directory\n", status=2)
+        members = self.server.members(blob)
+        if members is None:
+            return CommandResult(stderr="tar: This does not look like a tar archive\n", status=2)
+        for name, content in members:
+            path = posixpath.join(target, name)
+            if content is None:
+                self._makedirs(path)
+            else:
+                self._makedirs(posixpath.dirname(path))
+                self.machine.files[path] = content
+        verbose = "v" in args[0]
+        return CommandResult("".join(f"{name}\n" for name, _ in members) if verbose else "")
+
+    def _cmd_sha256sum(self, args, stdin, pipeline) -> CommandResult:
+        blob = self.machine.files.get(self._path(args[0])) if args else None
+        if blob is None:
+            return CommandResult(stderr=f"sha256sum: {args[0] if args else ''}: No such file or directory\n", status=1)
+        return CommandResult(f"{blob.sha256}  {args[0]}\n")
+
+    def _cmd_find(self, args, stdin, pipeline) -> CommandResult:
+        root = self._path(args[0]) if args else self.cwd
+        if root not in self.machine.dirs:
+            return CommandResult(stderr=f"find: {root}: No such file or directory\n", status=1)
+        excluded = args[args.index("-name") + 1] if "!" in args and "-name" in args else None
+        prefix = root.rstrip("/") + "/"
+        matched = [path for path in self.machine.files
+                   if path.startswith(prefix) and posixpath.basename(path) != excluded]
+        if "-delete" in args:
+            for path in matched:
+                del self.machine.files[path]
+            return CommandResult()
+        return CommandResult("".join(f"{path}\n" for path in matched))
+
+    def _cmd_nohup(self, args, stdin, pipeline) -> CommandResult:
+        program = self._path(args[0]) if args else ""
+        if program in self.machine.files and posixpath.basename(program) == "nc_agent":
+            self.machine.agent_running = True
+            return CommandResult(f"nc_agent started, listening on :{self.sim.config.agent_port}\n")
+        return CommandResult(stderr=f"nohup: can't execute '{args[0] if args else ''}': No such file or directory\n",
+                             status=127)
+
+    def _cmd_pkill(self, args, stdin, pipeline) -> CommandResult:
+        if "nc_agent" in args and self.machine.agent_running:
+            self.machine.agent_running = False
+            return CommandResult()
+        return CommandResult(status=1)
+
+    def _cmd_ps(self, args, stdin, pipeline) -> CommandResult:
+        lines = list(_BASE_PROCESSES)
+        if self.machine.agent_running:
+            lines.append(f"root      {_AGENT_PID}     1  0 00:00 ?        00:00:03 ./nc_agent")
+        # 管道中的grep进程本身也会出现在进程表中
+        lines += [f"root      9{index:03d}   800  0 00:00 ?        00:00:00 {stage}"
+                  for index, stage in enumerate(pipeline) if stage.startswith("grep ")]
+        header = "UID        PID  PPID  C STIME TTY          TIME CMD"
+        return CommandResult("\n".join([header] + lines) + "\n")
+
+    def _cmd_netstat(self, args, stdin, pipeline) -> CommandResult:
+        lines = [
+            "Active Internet connections (only servers)",
+            "Proto Recv-Q Send-Q Local Address           Foreign Address         State       PID/Program name",
+            "tcp        0      0 0.0.0.0:22              0.0.0.0:*               LISTEN      512/sshd",
+        ]
+        if self.machine.agent_running:
+            lines.append(f"tcp6       0      0 :::{self.sim.config.agent_port:<20}:::*                    "
+                         f"LISTEN      {_AGENT_PID}/nc_agent")
+        return CommandResult("\n".join(lines) + "\n")
+
+    def _cmd_grep(self, args, stdin, pipeline) -> CommandResult:
+        invert = "-v" in args
+        patterns = [arg for arg in args if not arg.startswith("-")]
+        if not patterns:
+            return CommandResult(stderr="grep: 缺少匹配模式\n", status=2)
+        lines = [line for line in (stdin or "").splitlines() if (patterns[0] in line) != invert]
+        return CommandResult("".join(f"{line}\n" for line in lines), status=0 if lines else 1)
+
+    def _cmd_wc(self, args, stdin, pipeline) -> CommandResult:
+        return CommandResult(f"{len((stdin or '').splitlines())}\n")
+
+    def _lines(self, args, stdin) -> Tuple[int, List[str]]:
+        count = int(args[args.index("-n") + 1]) if "-n" in args else 10
+        return count, (stdin or "").splitlines()
+
+    def _cmd_tail(self, args, stdin, pipeline) -> CommandResult:
+        count, lines = self._lines(args, stdin)
+        return CommandResult("".join(f"{line}\n" for line in (lines[-count:] if count else [])))
+
+    def _cmd_head(self, args, stdin, pipeline) -> CommandResult:
+        count, lines = self._lines(args, stdin)
+        return CommandResult("".join(f"{line}\n" for line in lines[:count]))
+
+
+class _Session(paramiko.ServerInterface):
+    def __init__(self, server: "SSHServer", machine: SimulatedMachine):
+        self.server = server
+        self.machine = machine
+
+    def get_allowed_auths(self, username):
+        return "password"
+
+    def check_auth_password(self, username, password):
+        if not self.machine.auth_ok or password != SIMULATED_PASSWORD:
+            return paramiko.AUTH_FAILED
+        return paramiko.AUTH_SUCCESSFUL
+
+    def check_channel_request(self, kind, chanid):
+        return paramiko.OPEN_SUCCEEDED if kind == "session" else paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_exec_request(self, channel, command):
+        threading.Thread(target=self._exec, args=(channel, command.decode(errors="replace")), daemon=True).start()
+        return True
+
+    def _exec(self, channel: paramiko.Channel, command: str):
+        sim = self.server.sim
+        try:
+            time.sleep(sim.latency(sim.config.ssh_latency))
+            with self.machine.lock:
+                self.machine.commands += 1
+                result = _Shell(self.server, self.machine).run(command)
+            channel.sendall(result.stdout.encode())
+            channel.sendall_stderr(result.stderr.encode())
+            channel.send_exit_status(result.status)
+        except Exception as e:
+            log.warning("模拟机器{}执行命令异常: {}, 命令: {}", self.machine.ip, str(e), command)
+            try:
+                channel.sendall_stderr(str(e).encode())
+                channel.send_exit_status(255)
+            except Exception:
+                pass
+        finally:
+            channel.close()
+
+
+class _SFTPHandle(paramiko.SFTPHandle):
+    """内存中的SFTP文件句柄，关闭时写回模拟文件系统"""
+
+    def __init__(self, server: "_SFTPServer", path: str, data: bytes, flags: int):
+        super().__init__(flags)
+        self.sftp = server
+        self.path = path
+        self.buffer = io.BytesIO(data)
+        self.append = bool(flags & os.O_APPEND)
+        self.writable = bool(flags & (os.O_WRONLY | os.O_RDWR))
+
+    def read(self, offset, length):
+        self.buffer.seek(offset)
+        return self.buffer.read(length)
+
+    def write(self, offset, data):
+        rate = self.sftp.sim.config.sftp_rate_kbps
+        if rate > 0:
+            time.sleep(len(data) / (rate * 1024))
+        self.buffer.seek(0, io.SEEK_END) if self.append else self.buffer.seek(offset)
+        self.buffer.write(data)
+        return paramiko.SFTP_OK
+
+    def stat(self):
+        return self.sftp.attributes(len(self.buffer.getbuffer()), stat.S_IFREG | 0o644)
+
+    def close(self):
+        if self.writable:
+            blob = self.sftp.sim.blob(self.buffer.getvalue())
+            with self.sftp.machine.lock:
+                self.sftp.machine.files[self.path] = blob
+        super().close()
+
+
+class _SFTPServer(paramiko.SFTPServerInterface):
+    def __init__(self, session: _Session, *args, **kwargs):
+        super().__init__(session, *args, **kwargs)
+        self.sim = session.server.sim
+        self.machine = session.machine
+
+    @staticmethod
+    def attributes(size: int, mode: int) -> paramiko.SFTPAttributes:
+        attributes = paramiko.SFTPAttributes()
+        attributes.st_size = size
+        attributes.st_mode = mode
+        attributes.st_uid = attributes.st_gid = 0
+        attributes.st_atime = attributes.st_mtime = int(time.time())
+        return attributes
+
+    def open(self, path, flags, attr):
+        path = posixpath.normpath(path)
+        with self.machine.lock:
+            if posixpath.dirname(path) not in self.machine.dirs or path in self.machine.dirs:
+                return paramiko.SFTP_NO_SUCH_FILE
+            blob = self.machine.files.get(path)
+        if blob is None and not flags & os.O_CREAT:
+            return paramiko.SFTP_NO_SUCH_FILE
+        data = b"" if blob is None or flags & os.O_TRUNC else blob.data
+        return _SFTPHandle(self, path, data, flags)
+
+    def stat(self, path):
+        path = posixpath.normpath(path)
+        with self.machine.lock:
+            if path in self.machine.dirs:
+                return self.attributes(4096, stat.S_IFDIR | 0o755)
+            blob = self.machine.files.get(path)
+        if blob is None:
+            return paramiko.SFTP_NO_SUCH_FILE
+        return self.attributes(len(blob.data), stat.S_IFREG | 0o644)
+
+    lstat = stat
+
+    def remove(self, path):
+        with self.machine.lock:
+            if self.machine.files.pop(posixpath.normpath(path), None) is None:
+                return paramiko.SFTP_NO_SUCH_FILE
+        return paramiko.SFTP_OK
+
+    def rename(self, oldpath, newpath):
+        with self.machine.lock:
+            blob = self.machine.files.pop(posixpath.normpath(oldpath), None)
+            if blob is None:
+                return paramiko.SFTP_NO_SUCH_FILE
+            self.machine.files[posixpath.normpath(newpath)] = blob
+        return paramiko.SFTP_OK
+
+    posix_rename = rename
+
+
+class SSHServer:
+    """
+    模拟SSH服务
+
+    在一个端口上接受所有模拟机器的连接，按连接的本地地址确定机器，
+    每个连接由paramiko在独立线程中处理
+    """
+
+    def __init__(self, sim: Simulator):
+        self.sim = sim
+        self._host_key = paramiko.RSAKey.generate(2048)
+        self._socket: Optional[socket.socket] = None
+        self._thread: Optional[threading.Thread] = None
+        self._transports: List[paramiko.Transport] = []
+        # 安装包内容哈希 -> 解压出的成员（目录的内容为None），所有机器共享
+        self._members: Dict[str, Optional[List[Tuple[str, Optional[Blob]]]]] = {}
+        self._members_lock = threading.Lock()
+
+    def members(self, blob: Blob) -> Optional[List[Tuple[str, Optional[Blob]]]]:
+        """
+        解析tar.gz安装包的成员，相同内容只解析一次
+        :param blob: 安装包内容
+        :return: (相对路径, 文件内容)列表，不是有效的tar.gz时为None
+        """
+        with self._members_lock:
+            if blob.sha256 in self._members:
+                return self._members[blob.sha256]
+            try:
+                members = []
+                with tarfile.open(fileobj=io.BytesIO(blob.data), mode="r:gz") as tar:
+                    for info in tar:
+                        name = posixpath.normpath(info.name).lstrip("/")
+                        if name in (".", "") or name.startswith(".."):
+                            continue
+                        if info.isdir():
+                            members.append((name, None))
+                        elif info.isfile():
+                            members.append((name, self.sim.blob(tar.extractfile(info).read())))
+            except (tarfile.TarError, OSError, EOFError):
+                members = None
+            self._members[blob.sha256] = members
+            return members
+
+    def _accept(self, connection: socket.socket):
+        machine = self.sim.machine(connection.getsockname()[0])
+        if machine is None or not machine.reachable:
+            connection.close()
+            return
+        machine.ssh_connections += 1
+        transport = paramiko.Transport(connection)
+        transport.add_server_key(self._host_key)
+        transport.set_subsystem_handler("sftp", paramiko.SFTPServer, _SFTPServer)
+        self._transports = [item for item in self._transports if item.is_active()]
+        self._transports.append(transport)
+        try:
+            transport.start_server(server=_Session(self, machine))
+        except (paramiko.SSHException, EOFError, OSError):
+            transport.close()
+
+    def _serve(self):
+        while True:
+            try:
+                connection, _ = self._socket.accept()
+            except OSError:
+                return
+            self._accept(connection)
+
+    def start(self):
+        """
+        开始监听
+        """
+        config = self.sim.config
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind((config.bind_host, config.ssh_port))
+        self._socket.listen(1024)
+        self._thread = threading.Thread(target=self._serve, name="simulator-ssh", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        停止监听并断开所有连接
+        """
+        if self._socket is not None:
+            try:
+                # 唤醒阻塞在accept()上的线程
+                self._socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self._socket.close()
+            self._socket = None
+        for transport in self._transports:
+            transport.close()
+        self._transports.clear()
+        if self._thread is not None:
+            self._thread.join(5)
+            self._thread = None
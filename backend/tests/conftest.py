@@ -0,0 +1,45 @@
+import asyncio
+import os
+import sys
+import tempfile
+
+import pytest
+
+# 测试使用临时目录中的数据库和数据目录，必须在导入应用代码之前设置
+_TMP_DIR = tempfile.mkdtemp(prefix="nc_backend_test_")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(_TMP_DIR, 'test.db')}"
+os.environ["DATA_DIR"] = os.path.join(_TMP_DIR, "data")
+os.environ.setdefault("HEALTH_CHECK_ENABLED", "0")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("LOG_FILE_LEVEL", "WARNING")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def event_loop():
+    """整个测试会话共用一个事件循环，连接池中的异步连接绑定在该循环上"""
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture(scope="session")
+def app(event_loop):
+    """启动应用（含数据库建表），测试结束后关闭"""
+    from app import create_app, lifespan
+
+    application = create_app()
+    context = lifespan(application)
+    event_loop.run_until_complete(context.__aenter__())
+    yield application
+    event_loop.run_until_complete(context.__aexit__(None, None, None))
+
+
+@pytest.fixture(scope="session")
+def client(app, event_loop):
+    """通过ASGI直接调用应用的HTTP客户端"""
+    import httpx
+
+    http = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+    yield http
+    event_loop.run_until_complete(http.aclose())
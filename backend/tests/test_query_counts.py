@@ -0,0 +1,79 @@
+"""
+接口SQL语句数量测试：返回的记录数或关联数增加时语句数不应增长，用于发现N+1查询回归
+"""
+from typing import List
+
+import pytest
+from sqlmodel import select
+
+# 别名避免pytest把模型类当作测试类收集
+from models.machine import AgentVersion, Machine, MachineTestCase, TestCase as CaseModel
+from utils.db import assert_max_queries, async_session, count_queries
+
+
+async def _seed(machines: int, test_cases: int) -> List[int]:
+    # 创建一个代理版本、test_cases个测试用例和machines台机器，每台机器关联全部测试用例
+    async with async_session() as db:
+        version = AgentVersion(name="query-count")
+        cases = [CaseModel(name=f"case-{i}", type="performance") for i in range(test_cases)]
+        db.add(version)
+        db.add_all(cases)
+        await db.flush()
+        rows = [Machine(name=f"qc-{i}", test_type="performance", agent_version_id=version.id, ip=f"10.9.0.{i}",
+                        username="root", password="root") for i in range(machines)]
+        db.add_all(rows)
+        await db.flush()
+        db.add_all(MachineTestCase(machine_id=row.id, test_case_id=case.id) for row in rows for case in cases)
+        await db.commit()
+        return [row.id for row in rows]
+
+
+@pytest.fixture(scope="module")
+def seeded(app, event_loop):
+    """一台关联1个测试用例的机器、一台关联20个测试用例的机器，以及60台机器的列表数据"""
+    return {
+        "few": event_loop.run_until_complete(_seed(1, 1))[0],
+        "many": event_loop.run_until_complete(_seed(1, 20))[0],
+        "list": event_loop.run_until_complete(_seed(60, 2)),
+    }
+
+
+def _count(event_loop, request) -> int:
+    with count_queries() as counter:
+        response = event_loop.run_until_complete(request)
+    assert response.status_code == 200, response.text
+    return counter.count
+
+
+def test_machine_detail(client, event_loop, seeded):
+    # 代理版本通过JOIN加载，测试用例通过一次IN查询加载
+    few = _count(event_loop, client.get(f"/api/v1/machines/{seeded['few']}"))
+    with assert_max_queries(2):
+        response = event_loop.run_until_complete(client.get(f"/api/v1/machines/{seeded['many']}"))
+    assert len(response.json()["data"]["test_cases"]) == 20
+    assert few <= 2
+
+
+def test_machine_list(client, event_loop, seeded):
+    # 先请求一次，填充代理版本映射缓存
+    event_loop.run_until_complete(client.get("/api/v1/machines/", params={"limit": 1}))
+    small = _count(event_loop, client.get("/api/v1/machines/", params={"limit": 5}))
+    large = _count(event_loop, client.get("/api/v1/machines/", params={"limit": 50}))
+    assert small == large
+    assert large <= 2
+
+
+def test_update_machine(client, event_loop, seeded):
+    async def case_ids() -> List[int]:
+        async with async_session() as db:
+            return list((await db.exec(select(CaseModel.id).limit(20))).all())
+
+    ids = event_loop.run_until_complete(case_ids())
+    url = f"/api/v1/machines/{seeded['few']}"
+    counts = []
+    for selected in (ids[:1], ids):
+        # 每次都从没有关联开始替换，保证两次的差异只有关联数量
+        _count(event_loop, client.put(url, json={"test_case_ids": []}))
+        counts.append(_count(event_loop, client.put(url, json={"description": "updated", "test_case_ids": selected})))
+    assert counts[0] == counts[1]
+    assert counts[1] <= 6
@@ -0,0 +1,142 @@
+import asyncio
+import os
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+import httpx
+
+from constants import AGENT_PORT
+from utils.logger import log
+
+# 代理HTTP连接池：最大连接数与最大保活连接数
+AGENT_HTTP_MAX_CONNECTIONS = int(os.environ.get("AGENT_HTTP_MAX_CONNECTIONS", "512"))
+AGENT_HTTP_MAX_KEEPALIVE = int(os.environ.get("AGENT_HTTP_MAX_KEEPALIVE", "256"))
+# 健康检查使用独立的连接池，与测试请求互不占用：最大连接数、最大保活连接数及空闲连接的保活时间（秒）
+AGENT_HEALTH_MAX_CONNECTIONS = int(os.environ.get("AGENT_HEALTH_MAX_CONNECTIONS", "200"))
+AGENT_HEALTH_MAX_KEEPALIVE = int(os.environ.get("AGENT_HEALTH_MAX_KEEPALIVE", "100"))
+AGENT_HEALTH_KEEPALIVE_EXPIRY = float(os.environ.get("AGENT_HEALTH_KEEPALIVE_EXPIRY", "60"))
+# 每个代理同时执行的最大请求数
+AGENT_MAX_CONCURRENCY_PER_HOST = int(os.environ.get("AGENT_MAX_CONCURRENCY_PER_HOST", "2"))
+# 连接代理的超时时间（秒）
+AGENT_CONNECT_TIMEOUT = 5.0
+# 代理同步执行测试用例，默认的请求超时时间（秒）
+AGENT_REQUEST_TIMEOUT = 600.0
+
+
+class AgentError(Exception):
+    """代理返回错误响应"""
+
+
+class AgentClient:
+    """
+    代理HTTP客户端
+
+    所有请求共用一个httpx.AsyncClient连接池；每个代理按IP维护一个信号量，
+    调用方通过slot()限制同一代理上的并发数。健康检查使用另一个连接数有上限的连接池，
+    代理数量很多时只保留有限的空闲连接（超出的空闲连接由httpx关闭），不会占满文件描述符
+    """
+
+    def __init__(self, port: int = AGENT_PORT, max_per_host: int = AGENT_MAX_CONCURRENCY_PER_HOST):
+        self.port = port
+        self.max_per_host = max_per_host
+        self._client: Optional[httpx.AsyncClient] = None
+        self._health_client: Optional[httpx.AsyncClient] = None
+        self._slots: Dict[str, asyncio.Semaphore] = defaultdict(lambda: asyncio.Semaphore(self.max_per_host))
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=AGENT_HTTP_MAX_CONNECTIONS,
+                                    max_keepalive_connections=AGENT_HTTP_MAX_KEEPALIVE),
+                timeout=httpx.Timeout(AGENT_REQUEST_TIMEOUT, connect=AGENT_CONNECT_TIMEOUT),
+            )
+        return self._client
+
+    @property
+    def health_http(self) -> httpx.AsyncClient:
+        if self._health_client is None:
+            self._health_client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=AGENT_HEALTH_MAX_CONNECTIONS,
+                                    max_keepalive_connections=AGENT_HEALTH_MAX_KEEPALIVE,
+                                    keepalive_expiry=AGENT_HEALTH_KEEPALIVE_EXPIRY),
+                timeout=httpx.Timeout(AGENT_CONNECT_TIMEOUT),
+            )
+        return self._health_client
+
+    def url(self, ip: str, path: str) -> str:
+        """
+        拼接代理接口地址
+        :param ip: 代理IP
+        :param path: 接口路径
+        :return: 完整URL
+        """
+        return f"http://{ip}:{self.port}{path}"
+
+    @asynccontextmanager
+    async def slot(self, ip: str) -> AsyncIterator[None]:
+        """
+        占用代理的一个并发名额
+        :param ip: 代理IP
+        """
+        async with self._slots[ip]:
+            yield
+
+    async def _request(self, method: str, ip: str, path: str, timeout: Optional[float] = None,
+                       http: Optional[httpx.AsyncClient] = None, **kwargs) -> Dict[str, Any]:
+        response = await (http or self.http).request(method, self.url(ip, path),
+                                                     timeout=timeout or httpx.USE_CLIENT_DEFAULT, **kwargs)
+        try:
+            body = response.json()
+        except ValueError:
+            body = {"error": response.text}
+        if response.status_code != 200:
+            raise AgentError(f"代理返回{response.status_code}: {body.get('error') or body}")
+        return body
+
+    async def health(self, ip: str, timeout: float) -> Dict[str, Any]:
+        """
+        检查代理是否存活
+        :param ip: 代理IP
+        :param timeout: 超时时间（秒），包含等待连接池和建立连接
+        :return: 代理返回的状态（status/timestamp/version）
+        """
+        return await asyncio.wait_for(self._request("GET", ip, "/health", http=self.health_http), timeout)
+
+    async def run_test(self, ip: str, test_id: str, params: Optional[Dict[str, Any]] = None,
+                       timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        在代理上同步运行测试用例
+        :param ip: 代理IP
+        :param test_id: 代理侧测试用例ID
+        :param params: 测试参数
+        :param timeout: 请求超时时间（秒）
+        :return: 代理返回的测试结果（id/status/started/finished/duration_ms/output/error/data）
+        """
+        log.debug("调用代理运行测试: {}, test_id={}", ip, test_id)
+        return await self._request("POST", ip, f"/api/v1/tests/run/{test_id}", timeout=timeout,
+                                   json={"params": params or {}})
+
+    async def get_result(self, ip: str, test_id: str) -> Dict[str, Any]:
+        """
+        获取代理上测试用例的最近一次结果
+        :param ip: 代理IP
+        :param test_id: 代理侧测试用例ID
+        :return: 测试结果
+        """
+        return await self._request("GET", ip, f"/api/v1/tests/results/{test_id}")
+
+    async def close(self):
+        """
+        关闭连接池
+        """
+        for name in ("_client", "_health_client"):
+            client = getattr(self, name)
+            if client is not None:
+                setattr(self, name, None)
+                await client.aclose()
+
+
+# 全局代理客户端
+agent_client = AgentClient()
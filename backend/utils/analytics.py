@@ -0,0 +1,207 @@
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# 对数直方图的相对精度：分位数的相对误差不超过该值
+RELATIVE_ACCURACY = 0.02
+# 可表示的数值范围，超出的值归入首/末桶
+MIN_VALUE = 1e-3
+MAX_VALUE = 1e12
+
+_GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+_LOG_GAMMA = np.log(_GAMMA)
+_OFFSET = int(np.floor(np.log(MIN_VALUE) / _LOG_GAMMA))
+# 对数直方图的桶数
+BUCKETS = int(np.ceil(np.log(MAX_VALUE) / _LOG_GAMMA)) - _OFFSET + 1
+
+
+def bucket_index(values: np.ndarray) -> np.ndarray:
+    """
+    计算数值所在的对数桶，桶i覆盖(gamma^(i-1), gamma^i]
+    :param values: 数值数组
+    :return: 桶下标数组，非正数和NaN为-1
+    """
+    values = np.asarray(values, dtype=np.float64)
+    valid = values > 0
+    index = np.full(values.shape, -1, dtype=np.int64)
+    clipped = np.clip(values[valid], MIN_VALUE, MAX_VALUE)
+    index[valid] = np.ceil(np.log(clipped) / _LOG_GAMMA).astype(np.int64) - _OFFSET
+    return np.clip(index, -1, BUCKETS - 1)
+
+
+def bucket_value(index: np.ndarray) -> np.ndarray:
+    """
+    桶的代表值（使相对误差最小的点）
+    :param index: 桶下标数组
+    :return: 代表值数组
+    """
+    return 2 * _GAMMA ** (np.asarray(index) + _OFFSET) / (_GAMMA + 1)
+
+
+def quantiles(counts: np.ndarray, qs: Sequence[float]) -> np.ndarray:
+    """
+    从对数直方图计算分位数
+    :param counts: 直方图，最后一维为桶
+    :param qs: 分位点（0~1）
+    :return: 分位数，形状为counts.shape[:-1] + (len(qs),)，没有样本时为NaN
+    """
+    counts = np.asarray(counts)
+    cumulative = np.cumsum(counts, axis=-1)
+    total = cumulative[..., -1:]
+    # 第一个累计数超过 q*(n-1) 的桶，与按排名取值的分位数定义一致
+    ranks = np.asarray(qs, dtype=np.float64) * np.maximum(total - 1, 0)
+    index = (cumulative[..., None, :] <= ranks[..., :, None]).sum(axis=-1)
+    result = bucket_value(np.minimum(index, BUCKETS - 1))
+    return np.where(total > 0, result, np.nan)
+
+
+def histogram(counts: np.ndarray, bins: int = 20,
+              value_range: Optional[Tuple[float, float]] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    将对数直方图重新分到等宽区间，用于绘制分布图
+    :param counts: 一维对数直方图
+    :param bins: 区间数
+    :param value_range: 数值范围，默认取有样本的桶的代表值范围
+    :return: (各区间样本数, 区间边界)
+    """
+    occupied = np.flatnonzero(counts)
+    if not len(occupied):
+        return np.zeros(bins, dtype=np.int64), np.linspace(0, 1, bins + 1)
+    values = bucket_value(occupied)
+    if value_range is None:
+        value_range = (float(values[0]), float(values[-1]))
+        if value_range[0] == value_range[1]:
+            value_range = (value_range[0] * 0.5, value_range[1] * 1.5)
+    result, edges = np.histogram(values, bins=bins, range=value_range, weights=counts[occupied])
+    return result.astype(np.int64), edges
+
+
+class AggregateTable:
+    """
+    按分组键增量维护的聚合表
+
+    每个分组保存总数、通过数，以及每个指标的样本数、和与对数直方图；
+    新结果按批写入，分组内的统计通过对直方图求和合并，不需要保留原始数据
+    """
+
+    def __init__(self, metrics: Sequence[str]):
+        self.metrics = tuple(metrics)
+        self.keys: List[Hashable] = []
+        self._rows: Dict[Hashable, int] = {}
+        self.total = np.zeros(0, dtype=np.int64)
+        self.passed = np.zeros(0, dtype=np.int64)
+        self.count = np.zeros((0, len(self.metrics)), dtype=np.int64)
+        self.sum = np.zeros((0, len(self.metrics)), dtype=np.float64)
+        self.hist = np.zeros((0, len(self.metrics), BUCKETS), dtype=np.uint32)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def _grow(self, new_keys: List[Hashable]):
+        for key in new_keys:
+            self._rows[key] = len(self.keys)
+            self.keys.append(key)
+        size, extra = len(self.keys), len(new_keys)
+        self.total = np.concatenate([self.total, np.zeros(extra, dtype=np.int64)])
+        self.passed = np.concatenate([self.passed, np.zeros(extra, dtype=np.int64)])
+        self.count = np.concatenate([self.count, np.zeros((extra, len(self.metrics)), dtype=np.int64)])
+        self.sum = np.concatenate([self.sum, np.zeros((extra, len(self.metrics)))])
+        hist = np.zeros((size, len(self.metrics), BUCKETS), dtype=np.uint32)
+        hist[:size - extra] = self.hist
+        self.hist = hist
+
+    def add(self, keys: Sequence[Hashable], passed: np.ndarray, values: np.ndarray):
+        """
+        写入一批结果
+        :param keys: 每条结果的分组键
+        :param passed: 每条结果是否通过，形状(n,)
+        :param values: 指标值，形状(n, 指标数)，缺失为NaN
+        """
+        if not len(keys):
+            return
+        new_keys = list(dict.fromkeys(key for key in keys if key not in self._rows))
+        if new_keys:
+            self._grow(new_keys)
+        rows = np.fromiter((self._rows[key] for key in keys), dtype=np.int64, count=len(keys))
+        size = len(self.keys)
+        values = np.asarray(values, dtype=np.float64).reshape(len(keys), len(self.metrics))
+
+        self.total += np.bincount(rows, minlength=size)
+        self.passed += np.bincount(rows, weights=np.asarray(passed, dtype=np.float64), minlength=size).astype(np.int64)
+        for m in range(len(self.metrics)):
+            column = values[:, m]
+            valid = ~np.isnan(column)
+            self.count[:, m] += np.bincount(rows[valid], minlength=size)
+            self.sum[:, m] += np.bincount(rows[valid], weights=column[valid], minlength=size)
+            index = bucket_index(column)
+            ok = index >= 0
+            # (分组, 桶)组合去重计数后一次性累加，开销与本批大小相关而与分组数无关
+            combined, counts = np.unique(rows[ok] * BUCKETS + index[ok], return_counts=True)
+            self.hist[combined // BUCKETS, m, combined % BUCKETS] += counts.astype(np.uint32)
+
+    def select(self, **filters) -> np.ndarray:
+        """
+        按分组键字段筛选分组，分组键为具名元组
+        :param filters: 字段名=值，值为None的条件忽略
+        :return: 分组的布尔掩码
+        """
+        mask = np.ones(len(self.keys), dtype=bool)
+        for field, value in filters.items():
+            if value is None:
+                continue
+            mask &= np.fromiter((getattr(key, field) == value for key in self.keys), dtype=bool, count=len(self.keys))
+        return mask
+
+    def group(self, field: str, mask: Optional[np.ndarray] = None) -> Dict[Hashable, np.ndarray]:
+        """
+        按分组键的某个字段再分组
+        :param field: 字段名
+        :param mask: 限定的分组掩码
+        :return: 字段值 -> 分组掩码
+        """
+        values = [getattr(key, field) for key in self.keys]
+        groups: Dict[Hashable, np.ndarray] = {}
+        for value in dict.fromkeys(values):
+            groups[value] = np.fromiter((v == value for v in values), dtype=bool, count=len(values))
+            if mask is not None:
+                groups[value] &= mask
+        return groups
+
+    def summarize(self, mask: np.ndarray, qs: Sequence[float] = (0.5, 0.95, 0.99)) -> Dict[str, object]:
+        """
+        合并若干分组并计算汇总统计
+        :param mask: 分组掩码
+        :param qs: 分位点
+        :return: 总数、通过率，以及每个指标的样本数/均值/分位数
+        """
+        total = int(self.total[mask].sum())
+        passed = int(self.passed[mask].sum())
+        count = self.count[mask].sum(axis=0)
+        sums = self.sum[mask].sum(axis=0)
+        hist = self.hist[mask].sum(axis=0, dtype=np.int64)
+        values = quantiles(hist, qs)
+        metrics = {}
+        for m, metric in enumerate(self.metrics):
+            if not count[m]:
+                continue
+            metrics[metric] = {
+                "count": int(count[m]),
+                "mean": float(sums[m] / count[m]),
+                **{f"p{round(q * 100)}": float(v) for q, v in zip(qs, values[m])},
+            }
+        return {
+            "total": total,
+            "passed": passed,
+            "failed": total - passed,
+            "pass_rate": passed / total if total else None,
+            "metrics": metrics,
+        }
+
+    def metric_hist(self, metric: str, mask: np.ndarray) -> np.ndarray:
+        """
+        合并若干分组某个指标的对数直方图
+        :param metric: 指标名
+        :param mask: 分组掩码
+        :return: 一维对数直方图
+        """
+        return self.hist[mask, self.metrics.index(metric), :].sum(axis=0, dtype=np.int64)
@@ -0,0 +1,252 @@
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, NamedTuple, Optional, Set, Tuple, Type
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlmodel import SQLModel
+
+from utils.logger import log
+from utils.metrics import registry
+
+# 目录类数据缓存的默认过期时间（秒）与最大条目数
+CACHE_TTL = float(os.environ.get("CATALOG_CACHE_TTL", "300"))
+CACHE_MAX_ENTRIES = int(os.environ.get("CATALOG_CACHE_MAX_ENTRIES", "256"))
+
+# 会话中待失效的缓存区域，提交后统一失效
+_PENDING_KEY = "cache_regions_to_invalidate"
+
+
+class CachedPage(NamedTuple):
+    """缓存的分页结果"""
+    items: list
+    next_cursor: Optional[str]
+    etag: str
+    # 本页记录的最大updated_at
+    last_modified: Optional[datetime] = None
+
+
+def compute_etag(value: Any) -> str:
+    """
+    根据内容计算弱ETag
+    :param value: 可JSON序列化的内容，SQLModel对象会先转为字典
+    :return: ETag
+    """
+
+    def default(obj):
+        if isinstance(obj, SQLModel):
+            return obj.model_dump()
+        return str(obj)
+
+    raw = json.dumps(value, default=default, sort_keys=True, ensure_ascii=False)
+    return f'W/"{hashlib.sha1(raw.encode()).hexdigest()}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    判断请求头If-None-Match是否命中ETag
+    :param if_none_match: 请求头If-None-Match
+    :param etag: 当前ETag
+    :return: 是否命中
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # 弱比较：忽略W/前缀
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag.removeprefix("W/") in candidates
+
+
+def http_date(value: datetime) -> str:
+    """
+    格式化为HTTP日期（Last-Modified）
+    :param value: 时间，不带时区时按本地时间处理
+    :return: 如"Wed, 21 Oct 2015 07:28:00 GMT"
+    """
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def not_modified(if_none_match: Optional[str], if_modified_since: Optional[str], etag: str,
+                 last_modified: Optional[datetime] = None) -> bool:
+    """
+    判断条件请求是否可以返回304：有If-None-Match时只比较ETag，否则比较If-Modified-Since
+    （只比较时间无法发现删除，客户端应优先使用ETag）
+    :param if_none_match: 请求头If-None-Match
+    :param if_modified_since: 请求头If-Modified-Since
+    :param etag: 当前ETag
+    :param last_modified: 当前最后修改时间
+    :return: 是否未变化
+    """
+    if if_none_match:
+        return etag_matches(if_none_match, etag)
+    if not if_modified_since or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    # HTTP日期精确到秒
+    return last_modified.astimezone(timezone.utc).replace(microsecond=0) <= since
+
+
+def validator_headers(etag: str, last_modified: Optional[datetime] = None) -> Dict[str, str]:
+    """
+    条件请求相关的响应头，客户端每次使用前都需要重新验证
+    :param etag: ETag
+    :param last_modified: 最后修改时间
+    :return: 响应头
+    """
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    return headers
+
+
+# 已创建的缓存区域，用于导出指标
+_regions: List["CacheRegion"] = []
+
+
+class CacheRegion:
+    """
+    进程内TTL+LRU缓存区域
+
+    每个区域维护一个代数（generation），失效时代数加一并清空条目；
+    加载数据前记录代数，写回时代数已变化说明期间发生了写入，结果不再缓存，避免把旧数据写回缓存
+    """
+
+    def __init__(self, name: str, ttl: float = CACHE_TTL, max_entries: int = CACHE_MAX_ENTRIES):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.generation = 0
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        _regions.append(self)
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """
+        读取缓存
+        :param key: 缓存键
+        :return: (是否命中, 缓存值)
+        """
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return True, entry[1]
+
+    def set(self, key: Hashable, value: Any, generation: Optional[int] = None):
+        """
+        写入缓存
+        :param key: 缓存键
+        :param value: 缓存值
+        :param generation: 加载数据前的代数，与当前代数不一致时放弃写入
+        """
+        if generation is not None and generation != self.generation:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        读取缓存，未命中时调用loader加载并写回
+        :param key: 缓存键
+        :param loader: 加载函数
+        :return: 缓存值
+        """
+        hit, value = self.get(key)
+        if hit:
+            return value
+        generation = self.generation
+        value = await loader()
+        self.set(key, value, generation)
+        return value
+
+    def invalidate(self):
+        """
+        清空缓存区域
+        """
+        self.generation += 1
+        self._entries.clear()
+        log.debug("缓存已失效: region={}, generation={}", self.name, self.generation)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        获取缓存统计
+        :return: 命中、未命中次数及当前条目数
+        """
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries),
+                "generation": self.generation}
+
+
+# 数据模型 -> 写入时需要失效的缓存区域
+_watched: Dict[Type[SQLModel], List[CacheRegion]] = {}
+
+
+def invalidate_on_write(region: CacheRegion, *models: Type[SQLModel]):
+    """
+    注册写入失效：任意会话提交了对这些模型的新增、修改、删除（含批量UPDATE/DELETE）后，清空缓存区域
+    :param region: 缓存区域
+    :param models: 数据模型
+    """
+    for model in models:
+        _watched.setdefault(model, []).append(region)
+
+
+def _mark(session: Session, model) -> None:
+    regions = _watched.get(model)
+    if regions:
+        session.info.setdefault(_PENDING_KEY, set()).update(regions)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_flushed(session: Session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        _mark(session, type(obj))
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_bulk(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None:
+            _mark(orm_execute_state.session, mapper.class_)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session: Session):
+    regions: Set[CacheRegion] = session.info.pop(_PENDING_KEY, set())
+    for region in regions:
+        region.invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session: Session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def _collect_cache_metrics():
+    stats = [(region.name, region.stats()) for region in _regions]
+    return [
+        ("cache_hits", "缓存命中次数", "counter", [("_total", {"region": name}, st["hits"]) for name, st in stats]),
+        ("cache_misses", "缓存未命中次数", "counter", [("_total", {"region": name}, st["misses"]) for name, st in stats]),
+        ("cache_entries", "缓存当前条目数", "gauge", [("", {"region": name}, st["entries"]) for name, st in stats]),
+    ]
+
+
+registry.register_collector(_collect_cache_metrics)
@@ -0,0 +1,135 @@
+import os
+import zlib
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # 未安装brotli时只使用gzip
+    brotli = None
+
+# 小于该大小（字节）的响应不压缩
+COMPRESSION_MIN_SIZE = int(os.environ.get("COMPRESSION_MIN_SIZE", "1024"))
+# gzip压缩级别与brotli质量，偏向速度
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+# 压缩的内容类型前缀；text/event-stream需要逐条及时送达，不压缩
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "application/xml", "image/svg+xml")
+EXCLUDED_TYPES = ("text/event-stream",)
+
+
+def _accepted(accept_encoding: str) -> set:
+    encodings = set()
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        quality = params.strip()
+        if quality.startswith("q="):
+            try:
+                if float(quality[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        encodings.add(name.strip())
+    return encodings
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    根据Accept-Encoding选择压缩算法，优先brotli
+    :param accept_encoding: 请求头Accept-Encoding
+    :return: br/gzip，不支持压缩时为None
+    """
+    accepted = _accepted(accept_encoding)
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+
+class _Compressor:
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._zlib = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        """
+        压缩一段数据；流式响应中每段都刷新输出，保证客户端能及时收到
+        :param data: 原始数据
+        :param final: 是否为最后一段
+        :return: 压缩后的数据
+        """
+        if self.encoding == "br":
+            out = self._brotli.process(data) if data else b""
+            return out + (self._brotli.finish() if final else self._brotli.flush())
+        out = self._zlib.compress(data)
+        return out + self._zlib.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class CompressionMiddleware:
+    """
+    响应压缩中间件（纯ASGI实现）
+
+    按Accept-Encoding使用brotli（已安装时）或gzip压缩JSON/文本响应；小于最小大小的响应、
+    已编码的响应、部分内容响应和SSE不压缩。流式响应逐段压缩并刷新
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        compressor: Optional[_Compressor] = None
+
+        async def send_wrapper(message):
+            nonlocal start, compressor
+            if message["type"] == "http.response.start":
+                # 等到第一段响应体再决定是否压缩
+                start = message
+                return
+            if message["type"] != "http.response.body" or start is None:
+                if compressor is not None and message["type"] == "http.response.body":
+                    message = {**message, "body": compressor.compress(message.get("body", b""),
+                                                                      not message.get("more_body", False))}
+                await send(message)
+                return
+
+            initial, start = start, None
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            headers = MutableHeaders(raw=initial["headers"])
+            content_type = headers.get("content-type", "").lower()
+            compressible = (content_type.startswith(COMPRESSIBLE_TYPES)
+                            and not content_type.startswith(EXCLUDED_TYPES))
+            if compressible:
+                headers.add_vary_header("Accept-Encoding")
+            if (not compressible or "content-encoding" in headers or "content-range" in headers
+                    or initial["status"] in (204, 206, 304) or (not more_body and len(body) < self.minimum_size)):
+                await send(initial)
+                await send(message)
+                return
+
+            compressor = _Compressor(encoding)
+            headers["Content-Encoding"] = encoding
+            body = compressor.compress(body, not more_body)
+            if more_body:
+                del headers["Content-Length"]
+            else:
+                headers["Content-Length"] = str(len(body))
+            await send(initial)
+            await send({**message, "body": body})
+
+        await self.app(scope, receive, send_wrapper)
@@ -1,33 +1,256 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from sqlmodel import SQLModel, Session
+import asyncio
+import importlib.util
+from contextlib import contextmanager
+from typing import AsyncGenerator, Iterator, List, Optional, Union
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
 from utils.logger import log
 import os
 
 
-# 数据库URL
-DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:///machines.db")
+# 数据库URL，本地默认使用aiosqlite，生产环境可配置为 postgresql+asyncpg://...
+DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite+aiosqlite:///machines.db")
+# 连接池大小、溢出连接数及获取连接的超时时间（秒）
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "30"))
+
+# SQLite生产调优：是否启用连接参数与单写者串行化
+SQLITE_TUNING = os.environ.get("SQLITE_TUNING", "1") == "1"
+# SQLite连接参数，每个新连接建立时执行
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": int(os.environ.get("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    # 负数表示以KiB为单位，约64MB
+    "cache_size": int(os.environ.get("SQLITE_CACHE_SIZE", "-65536")),
+    "busy_timeout": int(os.environ.get("SQLITE_BUSY_TIMEOUT", "5000")),
+    "temp_store": "MEMORY",
+}
+
+# 同步驱动URL自动转换为对应的异步驱动
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+}
+# 异步驱动需要的安装包，requirement.txt只包含SQLite的驱动，使用PostgreSQL/MySQL时需另行安装
+DRIVER_PACKAGES = {
+    "aiosqlite": "aiosqlite",
+    "asyncpg": "asyncpg",
+    "aiomysql": "aiomysql",
+}
+
+
+def _async_url(url: str):
+    parsed = make_url(url)
+    if parsed.drivername in ASYNC_DRIVERS:
+        parsed = parsed.set(drivername=ASYNC_DRIVERS[parsed.drivername])
+    return parsed
+
+
+def _check_driver(url):
+    driver = url.get_driver_name()
+    package = DRIVER_PACKAGES.get(driver)
+    if package is not None and importlib.util.find_spec(driver) is None:
+        raise RuntimeError(f"数据库驱动{driver}未安装，{url.get_backend_name()}数据库需要先执行: pip install {package}")
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+def build_engine(url: str = DATABASE_URL, sqlite_tuning: bool = SQLITE_TUNING) -> AsyncEngine:
+    """
+    创建异步数据库引擎
+    :param url: 数据库URL
+    :param sqlite_tuning: SQLite时是否在连接建立时应用调优参数
+    :return: 数据库引擎
+    :raises RuntimeError: 数据库URL对应的异步驱动未安装
+    """
+    async_url = _async_url(url)
+    _check_driver(async_url)
+    new_engine = create_async_engine(
+        async_url,
+        echo=False,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_pre_ping=True,
+    )
+    if sqlite_tuning and new_engine.dialect.name == "sqlite":
+        event.listen(new_engine.sync_engine, "connect", _set_sqlite_pragmas)
+    return new_engine
+
+
+class SerializedWriteSession(AsyncSession):
+    """
+    单写者会话
+
+    SQLite同一时间只允许一个写事务，多个请求并发写入时会互相等待直至"database is locked"。
+    该会话在事务第一次写入前排队获取全局写锁（asyncio.Lock按先来先得唤醒），
+    提交、回滚或关闭时释放，使并发写入在应用内排队执行，而读取不受影响
+    """
+
+    def __init__(self, *args, writer: Optional[asyncio.Lock] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._writer = writer
+        self._holds_writer = False
+
+    def _has_pending(self) -> bool:
+        sync_session = self.sync_session
+        return bool(sync_session.new or sync_session.dirty or sync_session.deleted)
+
+    async def _acquire_writer(self):
+        if self._writer is not None and not self._holds_writer:
+            # 先占用连接再排队，保证持有写锁的会话不会再等待连接池，避免与连接池互相等待
+            await self.connection()
+            await self._writer.acquire()
+            self._holds_writer = True
+
+    def _release_writer(self):
+        if self._holds_writer:
+            self._holds_writer = False
+            self._writer.release()
+
+    async def _before_statement(self, statement):
+        # 写语句或会触发自动flush的查询都需要先拿到写锁
+        if getattr(statement, "is_dml", False) or self._has_pending():
+            await self._acquire_writer()
+
+    async def exec(self, statement, *args, **kwargs):
+        await self._before_statement(statement)
+        return await super().exec(statement, *args, **kwargs)
 
-# 创建数据库引擎
-engine = create_engine(DATABASE_URL, echo=False)
+    async def execute(self, statement, *args, **kwargs):
+        await self._before_statement(statement)
+        return await super().execute(statement, *args, **kwargs)
+
+    async def flush(self, objects=None):
+        if self._has_pending():
+            await self._acquire_writer()
+        await super().flush(objects)
+
+    async def commit(self):
+        if self._has_pending():
+            await self._acquire_writer()
+        try:
+            await super().commit()
+        finally:
+            self._release_writer()
+
+    async def rollback(self):
+        try:
+            await super().rollback()
+        finally:
+            self._release_writer()
+
+    async def close(self):
+        try:
+            await super().close()
+        finally:
+            self._release_writer()
+
+
+def build_sessionmaker(bind: AsyncEngine, serialize_writes: Optional[bool] = None) -> async_sessionmaker:
+    """
+    创建会话工厂
+    :param bind: 数据库引擎
+    :param serialize_writes: 是否串行化写事务，默认SQLite调优开启时启用
+    :return: 会话工厂
+    """
+    if serialize_writes is None:
+        serialize_writes = SQLITE_TUNING and bind.dialect.name == "sqlite"
+    # 提交后不过期对象，避免异步环境下触发隐式懒加载
+    if serialize_writes:
+        return async_sessionmaker(bind, class_=SerializedWriteSession, expire_on_commit=False,
+                                  writer=asyncio.Lock())
+    return async_sessionmaker(bind, class_=AsyncSession, expire_on_commit=False)
+
+
+# 创建数据库引擎（全局唯一）
+engine = build_engine()
 
 # 创建会话工厂
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+async_session = build_sessionmaker(engine)
+
+
+def _create_all(connection):
+    SQLModel.metadata.create_all(connection)
+    # create_all 不会给已存在的表补建索引，这里逐个检查并创建缺失的索引
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
 
 
-def create_db_and_tables():
+async def create_db_and_tables():
     """创建所有表"""
 
     log.info("创建数据库表...")
-    SQLModel.metadata.create_all(engine)
+    async with engine.begin() as connection:
+        await connection.run_sync(_create_all)
     log.info("数据库表创建完成")
 
 
-def get_db():
+async def dispose_engine():
+    """关闭连接池中的所有连接"""
+    await engine.dispose()
+
+
+async def get_db() -> AsyncGenerator[AsyncSession, None]:
     """获取数据库会话"""
-    db = SessionLocal()
+    async with async_session() as session:
+        yield session
+
+
+class QueryCounter:
+    """SQL语句计数器"""
+
+    def __init__(self):
+        self.count = 0
+        self.statements: List[str] = []
+
+
+@contextmanager
+def count_queries(bind: Union[Engine, AsyncEngine] = engine) -> Iterator[QueryCounter]:
+    """
+    统计代码块内在指定引擎上执行的SQL语句数量
+    :param bind: 数据库引擎
+    :return: SQL语句计数器
+    """
+    counter = QueryCounter()
+    if isinstance(bind, AsyncEngine):
+        bind = bind.sync_engine
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        counter.count += 1
+        counter.statements.append(statement)
+
+    event.listen(bind, "before_cursor_execute", before_cursor_execute)
     try:
-        yield db
+        yield counter
     finally:
-        db.close()
+        event.remove(bind, "before_cursor_execute", before_cursor_execute)
+
 
+@contextmanager
+def assert_max_queries(max_count: int, bind: Union[Engine, AsyncEngine] = engine) -> Iterator[QueryCounter]:
+    """
+    断言代码块内执行的SQL语句不超过指定数量，用于发现N+1查询回归
+    :param max_count: 允许的最大SQL语句数
+    :param bind: 数据库引擎
+    :return: SQL语句计数器
+    """
+    with count_queries(bind) as counter:
+        yield counter
+    if counter.count > max_count:
+        statements = "\n".join(counter.statements)
+        raise AssertionError(f"执行了{counter.count}条SQL，超过上限{max_count}:\n{statements}")
@@ -0,0 +1,122 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import Any, AsyncIterator, Deque, Dict, Optional, Set
+
+from utils.logger import log
+
+# 每个频道保留的历史事件数，新订阅者先收到这些事件
+EVENT_HISTORY_SIZE = 500
+# 最多保留的频道数，超出时丢弃最早且已结束的频道
+EVENT_MAX_CHANNELS = 1000
+# 每个订阅者的事件队列长度，消费过慢时丢弃最早的事件
+EVENT_QUEUE_SIZE = 1000
+
+
+class _Channel:
+    """事件频道"""
+
+    def __init__(self):
+        self.history: Deque[Dict[str, Any]] = deque(maxlen=EVENT_HISTORY_SIZE)
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.closed = True
+        self.seq = 0
+
+
+class EventHub:
+    """
+    进程内事件发布/订阅
+
+    以频道为单位发布事件，一次运行由open开始、close结束；
+    订阅时可回放当前（或最近一次）运行的历史事件，之后实时接收新事件。
+    发布、订阅都必须在事件循环线程中调用
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._channels: "OrderedDict[str, _Channel]" = OrderedDict()
+        self.dropped = 0
+
+    def _channel(self, key: str) -> _Channel:
+        channel = self._channels.get(key)
+        if channel is None:
+            channel = self._channels[key] = _Channel()
+            for old_key in list(self._channels):
+                if len(self._channels) <= EVENT_MAX_CHANNELS:
+                    break
+                old = self._channels[old_key]
+                if old.closed and not old.subscribers:
+                    del self._channels[old_key]
+        self._channels.move_to_end(key)
+        return channel
+
+    def _deliver(self, channel: _Channel, item: Optional[Dict[str, Any]]):
+        for queue in channel.subscribers:
+            if queue.full():
+                # 订阅者消费过慢，丢弃最早的事件，保证发布方不被阻塞
+                queue.get_nowait()
+                self.dropped += 1
+            queue.put_nowait(item)
+
+    def open(self, key: str):
+        """
+        开始频道上的一次新运行，清空上一次运行的历史
+        :param key: 频道
+        """
+        channel = self._channel(key)
+        channel.history.clear()
+        channel.closed = False
+
+    def publish(self, key: str, event: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        发布事件
+        :param key: 频道
+        :param event: 事件内容
+        :return: 补充了序号和时间戳的事件
+        """
+        channel = self._channel(key)
+        channel.seq += 1
+        event = {"seq": channel.seq, "ts": time.time(), **event}
+        channel.history.append(event)
+        self._deliver(channel, event)
+        return event
+
+    def close(self, key: str):
+        """
+        结束频道上的本次运行，已订阅者在收完事件后退出
+        :param key: 频道
+        """
+        channel = self._channel(key)
+        channel.closed = True
+        self._deliver(channel, None)
+
+    async def subscribe(self, key: str, replay: bool = True,
+                        heartbeat: Optional[float] = None) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """
+        订阅频道事件，本次运行结束后迭代结束
+        :param key: 频道
+        :param replay: 是否回放历史事件；为False时忽略已结束的运行，等待下一次运行
+        :param heartbeat: 心跳间隔（秒），空闲超过该时间产出None
+        :return: 事件异步迭代器
+        """
+        channel = self._channel(key)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=EVENT_QUEUE_SIZE)
+        if replay and channel.history:
+            for event in list(channel.history)[-EVENT_QUEUE_SIZE:]:
+                queue.put_nowait(event)
+            if channel.closed:
+                queue.put_nowait(None)
+        channel.subscribers.add(queue)
+        log.debug("订阅事件: hub={}, channel={}, 订阅者数={}", self.name, key, len(channel.subscribers))
+        try:
+            while True:
+                try:
+                    item = await asyncio.wait_for(queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if item is None:
+                    return
+                yield item
+        finally:
+            channel.subscribers.discard(queue)
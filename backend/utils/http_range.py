@@ -0,0 +1,64 @@
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    解析单个字节范围的Range请求头（bytes=a-b、bytes=a-、bytes=-n）
+    :param header: Range请求头，不存在时为None
+    :param size: 内容总长度
+    :return: [start, end)范围；请求头不存在、格式不支持（如多个范围）时返回None，按完整内容返回
+    :raises HTTPException: 范围超出内容长度时返回416
+    """
+    if not header:
+        return None
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if first:
+            start = int(first)
+            end = int(last) + 1 if last else size
+        else:
+            # 后缀范围：最后n字节
+            start, end = max(size - int(last), 0), size
+    except ValueError:
+        return None
+    end = min(end, size)
+    if start < 0 or start >= end:
+        raise HTTPException(status_code=416, detail="请求的范围无效",
+                            headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
+
+def range_headers(byte_range: Optional[Tuple[int, int]], size: int) -> Dict[str, str]:
+    """
+    生成范围请求的响应头
+    :param byte_range: [start, end)范围，None表示完整内容
+    :param size: 内容总长度
+    :return: 响应头
+    """
+    headers = {"Accept-Ranges": "bytes"}
+    if byte_range is None:
+        headers["Content-Length"] = str(size)
+    else:
+        start, end = byte_range
+        headers["Content-Length"] = str(end - start)
+        headers["Content-Range"] = f"bytes {start}-{end - 1}/{size}"
+    return headers
+
+
+def tail_range(tail: Optional[int], size: int) -> Optional[Tuple[int, int]]:
+    """
+    根据tail参数计算最后tail字节的范围
+    :param tail: 字节数，None表示不截取
+    :param size: 内容总长度
+    :return: [start, end)范围，None表示完整内容
+    """
+    if tail is None or tail >= size:
+        return None
+    return size - tail, size
@@ -0,0 +1,268 @@
+import asyncio
+import functools
+import mmap
+import os
+import re
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import AsyncIterator, BinaryIO, Callable, Dict, Iterator, Optional
+
+from utils.logger import log
+
+# 每个分块文件的大小，写满后切换到下一个分块
+LOG_CHUNK_BYTES = int(os.environ.get("LOG_CHUNK_MB", "16")) * 1024 * 1024
+# 流式读取时每次返回的数据大小
+READ_CHUNK_SIZE = 64 * 1024
+# 跟随模式下无新数据时重新检查日志状态的间隔（秒）
+FOLLOW_POLL_INTERVAL = 15.0
+_SUFFIX = ".log"
+_KEY_PATTERN = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+@dataclass
+class _OpenLog:
+    """正在写入的日志"""
+    # 已写入磁盘的字节数，读取只读到这里
+    size: int = 0
+    # 等待写入的数据，上一次写入完成前追加的数据在这里合并
+    pending: bytearray = field(default_factory=bytearray)
+    writing: bool = False
+    closing: bool = False
+    # 每次写入完成后触发并替换，跟随读取的协程等待它获知新数据
+    appended: asyncio.Event = field(default_factory=asyncio.Event)
+    # 以下只在写入线程中访问
+    file: Optional[BinaryIO] = None
+    written: int = 0
+
+
+class ChunkedLogStore:
+    """
+    按固定大小分块存储的追加写入日志
+
+    每个日志保存为 <root>/<key>/<分块号>.log，除最后一块外每块大小都是chunk_bytes，
+    因此任意字节偏移都可以直接定位到分块文件。读取通过mmap按需映射分块文件，
+    按范围或从某个偏移开始跟随读取时都不会把整个日志读入内存。
+    open/append/close在事件循环线程中调用且不阻塞：文件操作按提交顺序交给单个写入线程执行，
+    写入完成后才计入size并通知跟随读取
+    """
+
+    def __init__(self, root: str, chunk_bytes: int = LOG_CHUNK_BYTES):
+        self.root = root
+        self.chunk_bytes = chunk_bytes
+        self._open: Dict[str, _OpenLog] = {}
+        # 单个写入线程保证同一日志的删除、创建、写入、关闭按顺序执行
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="log-writer")
+
+    def _dir(self, key: str) -> str:
+        if not _KEY_PATTERN.match(key):
+            raise ValueError(f"无效的日志名称: {key}")
+        return os.path.join(self.root, key)
+
+    def _chunk_path(self, key: str, chunk: int) -> str:
+        return os.path.join(self._dir(key), f"{chunk:06d}{_SUFFIX}")
+
+    def _submit(self, func: Callable, *args) -> asyncio.Future:
+        return asyncio.get_running_loop().run_in_executor(self._writer, func, *args)
+
+    def open(self, key: str):
+        """
+        开始写入一个新日志，同名的旧日志被删除；创建失败只记录日志，之后的追加被忽略
+        :param key: 日志名称
+        """
+        self._dir(key)
+        self.close(key)
+        current = _OpenLog()
+        self._open[key] = current
+        self._submit(self._create, key, current)
+
+    def append(self, key: str, data: bytes):
+        """
+        追加数据，日志未打开时忽略；写入失败只记录日志，不影响调用方
+        :param key: 日志名称
+        :param data: 数据
+        """
+        current = self._open.get(key)
+        if current is None or current.closing or not data:
+            return
+        current.pending += data
+        if not current.writing:
+            self._drain(key, current)
+
+    def _drain(self, key: str, current: _OpenLog):
+        data = bytes(current.pending)
+        current.pending.clear()
+        current.writing = True
+        self._submit(self._write, key, current, data).add_done_callback(
+            functools.partial(self._written, key, current))
+
+    def _written(self, key: str, current: _OpenLog, future: asyncio.Future):
+        current.writing = False
+        current.size += future.result()
+        if current.pending:
+            self._drain(key, current)
+        elif current.closing:
+            self._submit(self._close_file, current).add_done_callback(
+                functools.partial(self._closed, key, current))
+        self._notify(current)
+
+    def _closed(self, key: str, current: _OpenLog, future: asyncio.Future):
+        if self._open.get(key) is current:
+            del self._open[key]
+        current.appended.set()
+
+    @staticmethod
+    def _notify(current: _OpenLog):
+        current.appended.set()
+        current.appended = asyncio.Event()
+
+    def _create(self, key: str, current: _OpenLog):
+        path = self._dir(key)
+        shutil.rmtree(path, ignore_errors=True)
+        try:
+            os.makedirs(path, exist_ok=True)
+            current.file = open(self._chunk_path(key, 0), "wb")
+        except OSError as e:
+            log.error("创建日志失败: {}, 错误: {}", key, e)
+
+    def _write(self, key: str, current: _OpenLog, data: bytes) -> int:
+        if current.file is None:
+            return 0
+        before = current.written
+        try:
+            view = memoryview(data)
+            while view:
+                room = self.chunk_bytes - current.written % self.chunk_bytes
+                if room == self.chunk_bytes and current.written:
+                    # 当前分块已写满，切换到下一个分块
+                    current.file.close()
+                    current.file = open(self._chunk_path(key, current.written // self.chunk_bytes), "wb")
+                written = current.file.write(view[:room])
+                current.written += written
+                view = view[written:]
+            current.file.flush()
+        except (OSError, ValueError) as e:
+            log.error("写入日志失败: {}, 错误: {}", key, e)
+        return current.written - before
+
+    @staticmethod
+    def _close_file(current: _OpenLog):
+        if current.file is None:
+            return
+        try:
+            current.file.close()
+        except OSError as e:
+            log.error("关闭日志失败: {}", e)
+
+    def close(self, key: str):
+        """
+        结束写入，已追加的数据写入完成后关闭文件，跟随读取在读完剩余数据后结束
+        :param key: 日志名称
+        """
+        current = self._open.get(key)
+        if current is None or current.closing:
+            return
+        current.closing = True
+        if not current.writing:
+            self._submit(self._close_file, current).add_done_callback(
+                functools.partial(self._closed, key, current))
+
+    def is_open(self, key: str) -> bool:
+        """
+        日志是否正在写入
+        :param key: 日志名称
+        :return: 是否正在写入
+        """
+        current = self._open.get(key)
+        return current is not None and not current.closing
+
+    async def size(self, key: str) -> Optional[int]:
+        """
+        获取日志当前已写入的长度
+        :param key: 日志名称
+        :return: 字节数，日志不存在时为None
+        """
+        current = self._open.get(key)
+        if current is not None:
+            return current.size
+        return await asyncio.to_thread(self._disk_size, key)
+
+    def _disk_size(self, key: str) -> Optional[int]:
+        path = self._dir(key)
+        if not os.path.isdir(path):
+            return None
+        names = [name for name in os.listdir(path) if name.endswith(_SUFFIX)]
+        return sum(os.path.getsize(os.path.join(path, name)) for name in names)
+
+    def iter_range(self, key: str, start: int, end: int) -> Iterator[bytes]:
+        """
+        读取日志中[start, end)范围的内容
+        :param key: 日志名称
+        :param start: 起始字节（含）
+        :param end: 结束字节（不含）
+        :return: 数据块
+        """
+        while start < end:
+            chunk, offset = divmod(start, self.chunk_bytes)
+            stop = min(end - chunk * self.chunk_bytes, self.chunk_bytes)
+            try:
+                f = open(self._chunk_path(key, chunk), "rb")
+            except FileNotFoundError:
+                return
+            with f:
+                stop = min(stop, os.fstat(f.fileno()).st_size)
+                if stop <= offset:
+                    return
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    for piece in range(offset, stop, READ_CHUNK_SIZE):
+                        yield mapped[piece:min(piece + READ_CHUNK_SIZE, stop)]
+            start = chunk * self.chunk_bytes + stop
+
+    async def stream(self, key: str, start: int, end: int) -> AsyncIterator[bytes]:
+        """
+        在线程池中逐块读取日志中[start, end)范围的内容
+        :param key: 日志名称
+        :param start: 起始字节（含）
+        :param end: 结束字节（不含）
+        :return: 数据块
+        """
+        chunks = self.iter_range(key, start, end)
+        try:
+            while True:
+                chunk = await asyncio.to_thread(next, chunks, None)
+                if chunk is None:
+                    break
+                yield chunk
+        finally:
+            try:
+                chunks.close()
+            except ValueError:
+                # 读取线程仍在执行（请求被取消），生成器回收时再关闭文件
+                pass
+
+    async def follow(self, key: str, start: int = 0) -> AsyncIterator[bytes]:
+        """
+        从start开始读取日志，读到末尾后等待新数据，日志结束写入后返回
+        :param key: 日志名称
+        :param start: 起始字节
+        :return: 数据块
+        """
+        while True:
+            current = self._open.get(key)
+            appended = current.appended if current is not None else None
+            size = await self.size(key) or 0
+            if start < size:
+                before = start
+                async for chunk in self.stream(key, start, size):
+                    start += len(chunk)
+                    yield chunk
+                if start == before:
+                    # 分块文件已被删除（日志被新的一次写入替换）
+                    return
+                continue
+            if appended is None:
+                return
+            try:
+                await asyncio.wait_for(appended.wait(), FOLLOW_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
@@ -1,28 +1,211 @@
+import atexit
+import json
 import os
+import queue
 import sys
-from datetime import datetime
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, TextIO
 from loguru import logger
 
 # 创建日志目录
 LOG_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "logs")
 os.makedirs(LOG_DIR, exist_ok=True)
 
-# 日志文件路径
-log_file_path = os.path.join(LOG_DIR, f"{datetime.now().strftime('%Y-%m-%d')}.log")
+# 运行环境：production下异常日志不展开变量值
+APP_ENV = os.environ.get("APP_ENV", "production")
+DEVELOPMENT = APP_ENV == "development"
+# 输出格式：text或json（每行一个JSON对象）
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "text")
+# 标准错误输出和日志文件的级别
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
+LOG_FILE_LEVEL = os.environ.get("LOG_FILE_LEVEL", "DEBUG" if DEVELOPMENT else "INFO")
+# 日志文件保留天数
+LOG_RETENTION_DAYS = int(os.environ.get("LOG_RETENTION_DAYS", "30"))
+# 待写入日志的队列上限，队列满时丢弃新日志而不阻塞调用方
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", "10000"))
+# 每批最多写入的日志条数
+LOG_BATCH_SIZE = 500
+
+_TEXT_TIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+
+def _format_text(record: Dict[str, Any], exception: str) -> str:
+    line = (f"{record['time'].strftime(_TEXT_TIME_FORMAT)[:-3]} | {record['level'].name: <8} | "
+            f"{record['name']}:{record['function']}:{record['line']} - {record['message']}")
+    return f"{line}\n{exception}\n" if exception else f"{line}\n"
+
+
+def _format_json(record: Dict[str, Any], exception: str) -> str:
+    data = {
+        "time": record["time"].isoformat(),
+        "level": record["level"].name,
+        "logger": record["name"],
+        "function": record["function"],
+        "line": record["line"],
+        "message": record["message"],
+    }
+    if record["extra"]:
+        data["extra"] = record["extra"]
+    if exception:
+        data["exception"] = exception
+    return json.dumps(data, ensure_ascii=False, default=str) + "\n"
+
+
+class BatchingSink:
+    """
+    有界的异步日志写入器
+
+    调用方只把日志记录放入队列，格式化和写文件由后台线程按批完成；
+    队列满时丢弃新日志并按级别计数，不阻塞调用方。日志文件按天切分
+    """
+
+    def __init__(self, directory: str, file_level: str, stream: Optional[TextIO], stream_level: str,
+                 fmt: str = "text", maxsize: int = LOG_QUEUE_SIZE):
+        self.directory = directory
+        self.file_level = logger.level(file_level).no
+        self.stream = stream
+        self.stream_level = logger.level(stream_level).no if stream is not None else None
+        self.level = min(level for level in (self.file_level, self.stream_level) if level is not None)
+        self._format = _format_json if fmt == "json" else _format_text
+        self.capacity = maxsize
+        self._queue: "queue.Queue[Optional[str]]" = queue.Queue(maxsize)
+        self.written = 0
+        self.batches = 0
+        self.dropped: Dict[str, int] = defaultdict(int)
+        self._reported_drops = 0
+        self._reported_at = 0.0
+        self._file: Optional[TextIO] = None
+        self._file_date = None
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, message):
+        """
+        loguru的sink回调，只做入队
+        :param message: loguru消息，内容为格式化后的异常（没有异常时为空），record为日志记录
+        """
+        try:
+            self._queue.put_nowait(message)
+        except queue.Full:
+            self.dropped[message.record["level"].name] += 1
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+    def _open(self, day):
+        if self._file is not None:
+            self._file.close()
+        self._file = open(os.path.join(self.directory, f"{day.strftime('%Y-%m-%d')}.log"), "a", encoding="utf-8")
+        self._file_date = day
+        self._remove_expired(day)
+
+    def _remove_expired(self, today):
+        expired = (today - timedelta(days=LOG_RETENTION_DAYS)).strftime("%Y-%m-%d")
+        for name in os.listdir(self.directory):
+            if name.endswith(".log") and name[:-4] < expired:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+    def _write_batch(self, messages: List[str]):
+        file_lines, stream_lines = [], []
+        dropped = sum(self.dropped.values())
+        if dropped > self._reported_drops and time.monotonic() - self._reported_at >= 1:
+            # 在日志中补记丢弃数量（每秒最多一次），便于确认日志是否完整
+            now, notice = datetime.now(), f"日志队列已满，累计丢弃{dropped}条日志"
+            if self._format is _format_json:
+                line = json.dumps({"time": now.isoformat(), "level": "WARNING", "message": notice},
+                                  ensure_ascii=False) + "\n"
+            else:
+                line = f"{now.strftime(_TEXT_TIME_FORMAT)[:-3]} | WARNING  | {notice}\n"
+            stream_lines.append(line)
+            file_lines.append(line)
+            self._reported_drops = dropped
+            self._reported_at = time.monotonic()
+        for message in messages:
+            record = message.record
+            try:
+                line = self._format(record, message.rstrip("\n"))
+            except Exception as e:
+                line = f"日志格式化失败: {record.get('message')!r}, 错误: {e}\n"
+            level = record["level"].no
+            if level >= self.file_level:
+                day = record["time"].date()
+                if day != self._file_date:
+                    if file_lines:
+                        self._file.write("".join(file_lines))
+                        file_lines = []
+                    self._open(day)
+                file_lines.append(line)
+            if self.stream_level is not None and level >= self.stream_level:
+                stream_lines.append(line)
+        if file_lines:
+            if self._file is None:
+                self._open(datetime.now().date())
+            self._file.write("".join(file_lines))
+            self._file.flush()
+        if stream_lines and self.stream is not None:
+            self.stream.write("".join(stream_lines))
+            self.stream.flush()
+        self.written += len(messages)
+        self.batches += 1
+
+    def _run(self):
+        while True:
+            message = self._queue.get()
+            stop = message is None
+            messages = [] if stop else [message]
+            while len(messages) < LOG_BATCH_SIZE:
+                try:
+                    message = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if message is None:
+                    stop = True
+                    break
+                messages.append(message)
+            try:
+                self._write_batch(messages)
+            except Exception as e:
+                sys.__stderr__.write(f"写入日志失败: {e}\n")
+            if stop:
+                return
+
+    def stop(self, timeout: float = 5.0):
+        """
+        写完队列中的日志后停止后台线程
+        :param timeout: 等待时间（秒）
+        """
+        if not self._thread.is_alive():
+            return
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                self._queue.put(None, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        self._thread.join(max(deadline - time.monotonic(), 0))
+        if not self._thread.is_alive() and self._file is not None:
+            self._file.close()
+            self._file = None
+
 
 # 配置日志
 logger.remove()  # 移除默认配置
-logger.add(sys.stderr, level="INFO")  # 添加标准错误输出
-logger.add(
-    log_file_path,
-    rotation="00:00",  # 每天0点创建新文件
-    retention="30 days",  # 保留30天
-    level="DEBUG",
-    encoding="utf-8",
-    enqueue=True,
-    backtrace=True,
-    diagnose=True,
-)
+if DEVELOPMENT:
+    # 开发环境：标准错误输出直接写入，异常展开完整调用链和变量值
+    logger.add(sys.stderr, level=LOG_LEVEL, backtrace=True, diagnose=True)
+    log_sink = BatchingSink(LOG_DIR, LOG_FILE_LEVEL, None, LOG_LEVEL, LOG_FORMAT)
+else:
+    log_sink = BatchingSink(LOG_DIR, LOG_FILE_LEVEL, sys.stderr, LOG_LEVEL, LOG_FORMAT)
+# 调用方只格式化异常（不展开变量值），其余格式化在写入线程中完成
+logger.add(log_sink.write, level=log_sink.level, format=lambda record: "{exception}", backtrace=False, diagnose=False)
+atexit.register(log_sink.stop)
 
 # 导出logger实例
-log = logger 
\ No newline at end of file
+log = logger
@@ -0,0 +1,375 @@
+import asyncio
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from utils.logger import log, log_sink
+
+# 默认的耗时直方图区间（秒）
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# 每个请求的SQL语句数区间
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+# 事件循环延迟的采样间隔（秒）
+LOOP_LAG_INTERVAL = 0.5
+# 文本格式的Content-Type
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 一组样本：(指标名后缀, 标签, 值)
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+
+class _GaugeChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        # 最后一个区间对应+Inf
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class _Metric:
+    """
+    指标基类
+
+    按标签值缓存子指标；无标签的指标直接调用inc/set/observe。
+    指标只在事件循环线程中更新，依赖单线程执行，不加锁
+    """
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        """
+        获取标签值对应的子指标
+        :param values: 按labelnames顺序的标签值
+        :return: 子指标
+        """
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"指标{self.name}需要标签{self.labelnames}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _samples(self, child) -> List[Sample]:
+        return [("", {}, child.value)]
+
+    def collect(self) -> Tuple[str, str, str, List[Sample]]:
+        samples = []
+        for values, child in list(self._children.items()):
+            labels = dict(zip(self.labelnames, values))
+            samples.extend((suffix, {**labels, **extra}, value) for suffix, extra, value in self._samples(child))
+        return self.name, self.documentation, self.kind, samples
+
+
+class Counter(_Metric):
+    """只增计数器"""
+
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self._default.inc(amount)
+
+    def _samples(self, child) -> List[Sample]:
+        return [("_total", {}, child.value)]
+
+
+class Gauge(_Metric):
+    """可增可减的当前值"""
+
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self._default.set(value)
+
+    def inc(self, amount: float = 1.0):
+        self._default.inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self._default.dec(amount)
+
+
+class Histogram(_Metric):
+    """区间预先分配的直方图"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self._default.observe(value)
+
+    def _samples(self, child) -> List[Sample]:
+        samples, cumulative = [], 0
+        for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+            cumulative += count
+            samples.append(("_bucket", {"le": _format_value(bound)}, cumulative))
+        samples.append(("_sum", {}, child.sum))
+        samples.append(("_count", {}, cumulative))
+        return samples
+
+
+class Registry:
+    """指标注册表，按Prometheus文本格式输出"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, str, List[Sample]]]]] = []
+
+    def _register(self, metric: _Metric) -> _Metric:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            # 模块重复导入时复用已有指标
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def register_collector(self, collector: Callable[[], Iterable[Tuple[str, str, str, List[Sample]]]]):
+        """
+        注册采集函数，输出时调用，用于导出其他模块已有的统计
+        :param collector: 返回(指标名, 说明, 类型, 样本列表)序列的函数
+        """
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """
+        输出全部指标
+        :return: Prometheus文本格式
+        """
+        families = [metric.collect() for metric in self._metrics.values()]
+        for collector in self._collectors:
+            try:
+                families.extend(collector())
+            except Exception as e:
+                log.warning("指标采集失败: {}, 错误: {}", getattr(collector, '__qualname__', collector), e)
+        lines = []
+        for name, documentation, kind, samples in families:
+            # 计数器的样本名带_total后缀，HELP/TYPE与样本名保持一致
+            family = f"{name}_total" if kind == "counter" else name
+            lines.append(f"# HELP {family} {documentation}")
+            lines.append(f"# TYPE {family} {kind}")
+            for suffix, labels, value in samples:
+                lines.append(f"{name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+# 全局指标注册表
+registry = Registry()
+
+HTTP_REQUESTS = registry.counter("http_requests", "HTTP请求数", ("method", "route", "status"))
+HTTP_REQUEST_DURATION = registry.histogram("http_request_duration_seconds", "HTTP请求耗时", ("method", "route"))
+HTTP_IN_PROGRESS = registry.gauge("http_requests_in_progress", "正在处理的HTTP请求数")
+HTTP_REQUEST_DB_QUERIES = registry.histogram("http_request_db_queries", "每个HTTP请求执行的SQL语句数", ("route",),
+                                             buckets=QUERY_COUNT_BUCKETS)
+HTTP_REQUEST_DB_DURATION = registry.histogram("http_request_db_duration_seconds", "每个HTTP请求的SQL执行总耗时",
+                                              ("route",))
+DB_QUERY_DURATION = registry.histogram("db_query_duration_seconds", "SQL语句执行耗时")
+LOOP_LAG = registry.gauge("event_loop_lag_seconds", "最近一次采样的事件循环延迟")
+LOOP_LAG_HISTOGRAM = registry.histogram("event_loop_lag_histogram_seconds", "事件循环延迟分布")
+
+
+def _collect_log_metrics():
+    return [
+        ("log_records_written", "已写出的日志条数", "counter", [("_total", {}, log_sink.written)]),
+        ("log_records_dropped", "日志队列满时丢弃的日志条数", "counter",
+         [("_total", {"level": level}, count) for level, count in list(log_sink.dropped.items())]),
+        ("log_write_batches", "日志批量写入次数", "counter", [("_total", {}, log_sink.batches)]),
+        ("log_queue_size", "日志队列中待写入的条数", "gauge", [("", {}, log_sink.qsize())]),
+        ("log_queue_capacity", "日志队列上限", "gauge", [("", {}, log_sink.capacity)]),
+    ]
+
+
+registry.register_collector(_collect_log_metrics)
+
+# 当前请求的SQL统计：[语句数, 总耗时]
+_request_db: ContextVar[Optional[List[float]]] = ContextVar("request_db", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_metrics_started", None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    DB_QUERY_DURATION.observe(elapsed)
+    stats = _request_db.get()
+    if stats is not None:
+        stats[0] += 1
+        stats[1] += elapsed
+
+
+def instrument_engine(engine: Engine):
+    """
+    统计引擎上每条SQL的耗时，并累计到当前HTTP请求
+    :param engine: 同步引擎（异步引擎传入engine.sync_engine）
+    """
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class MetricsMiddleware:
+    """
+    HTTP请求指标中间件（纯ASGI实现，不包装请求/响应体）
+
+    按路由模板统计请求数、耗时和SQL语句数，未匹配路由的请求归为unmatched，避免标签基数膨胀
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        stats = [0, 0.0]
+        token = _request_db.set(stats)
+        HTTP_IN_PROGRESS.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            HTTP_IN_PROGRESS.dec()
+            _request_db.reset(token)
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            HTTP_REQUESTS.labels(method, path, str(status)).inc()
+            HTTP_REQUEST_DURATION.labels(method, path).observe(elapsed)
+            HTTP_REQUEST_DB_QUERIES.labels(path).observe(stats[0])
+            HTTP_REQUEST_DB_DURATION.labels(path).observe(stats[1])
+
+
+class LoopLagMonitor:
+    """事件循环延迟采样：定时休眠，实际唤醒时间与预期的差值即为延迟"""
+
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(loop.time() - started - self.interval, 0.0)
+            LOOP_LAG.set(lag)
+            LOOP_LAG_HISTOGRAM.observe(lag)
+
+    def start(self):
+        """
+        启动采样任务
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        停止采样任务
+        """
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+# 全局事件循环延迟监控
+loop_lag_monitor = LoopLagMonitor()
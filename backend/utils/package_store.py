@@ -0,0 +1,99 @@
+import asyncio
+import hashlib
+import os
+import uuid
+from typing import AsyncIterator, Dict, Tuple
+
+from constants import AGENT_PACKAGE_DIR
+from utils.logger import log
+
+# 读取文件计算哈希时的块大小
+CHUNK_SIZE = 1024 * 1024
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class PackageStore:
+    """
+    按内容哈希存储代理安装包
+
+    安装包保存为 <sha256>.tar.gz，相同内容只存一份
+    """
+
+    def __init__(self, root: str = AGENT_PACKAGE_DIR):
+        self.root = root
+        # (path, mtime, size) -> sha256，避免重复计算未变化文件的哈希
+        self._digests: Dict[Tuple[str, float, int], str] = {}
+
+    def path(self, sha256: str) -> str:
+        """
+        获取安装包本地路径
+        :param sha256: 安装包哈希
+        :return: 本地文件路径
+        """
+        return os.path.join(self.root, f"{sha256}.tar.gz")
+
+    def exists(self, sha256: str) -> bool:
+        """
+        检查安装包是否存在
+        :param sha256: 安装包哈希
+        :return: 是否存在
+        """
+        return os.path.exists(self.path(sha256))
+
+    def _commit_upload(self, tmp_path: str, sha256: str):
+        # 相同内容已存在时丢弃临时文件，否则按哈希命名
+        if self.exists(sha256):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, self.path(sha256))
+
+    async def save_stream(self, chunks: AsyncIterator[bytes]) -> Tuple[str, int]:
+        """
+        边接收边计算哈希并写入临时文件，完成后按哈希命名；文件操作在线程池中执行，不阻塞事件循环
+        :param chunks: 安装包数据块
+        :return: (sha256, 文件大小)
+        """
+        await asyncio.to_thread(os.makedirs, self.root, exist_ok=True)
+        tmp_path = os.path.join(self.root, f".upload-{uuid.uuid4().hex}")
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            f = await asyncio.to_thread(open, tmp_path, "wb")
+            try:
+                async for chunk in chunks:
+                    digest.update(chunk)
+                    size += len(chunk)
+                    await asyncio.to_thread(f.write, chunk)
+            finally:
+                await asyncio.to_thread(f.close)
+            sha256 = digest.hexdigest()
+            await asyncio.to_thread(self._commit_upload, tmp_path, sha256)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        log.info("保存代理安装包: sha256={}, 大小={}", sha256, size)
+        return sha256, size
+
+    async def file_digest(self, path: str) -> str:
+        """
+        计算任意本地文件的sha256，结果按(路径, 修改时间, 大小)缓存
+        :param path: 本地文件路径
+        :return: sha256
+        """
+        stat = os.stat(path)
+        key = (path, stat.st_mtime, stat.st_size)
+        if key not in self._digests:
+            self._digests[key] = await asyncio.to_thread(_file_sha256, path)
+        return self._digests[key]
+
+
+# 全局安装包存储
+package_store = PackageStore()
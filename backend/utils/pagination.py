@@ -0,0 +1,114 @@
+import base64
+import json
+import sys
+from datetime import datetime
+from typing import Any, List, Optional, Sequence, Tuple, Type
+
+from sqlalchemy import DateTime, tuple_
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlmodel.sql.expression import SelectOfScalar
+
+# 默认每页数量与最大每页数量
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(values: List[Any]) -> str:
+    """
+    编码分页游标
+    :param values: 上一页最后一条记录的排序键值
+    :return: 游标字符串
+    """
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values], ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> List[Any]:
+    """
+    解码分页游标
+    :param cursor: 游标字符串
+    :return: 排序键值
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception:
+        raise ValueError("无效的分页游标")
+    if not isinstance(values, list) or len(values) != 2:
+        raise ValueError("无效的分页游标")
+    return values
+
+
+async def paginate(db: AsyncSession, query: SelectOfScalar, model: Type[SQLModel], sort: str,
+             allowed_sorts: Sequence[str], cursor: Optional[str] = None,
+             limit: int = DEFAULT_PAGE_SIZE) -> Tuple[list, Optional[str]]:
+    """
+    基于游标（keyset）的分页查询，按(排序字段, id)排序，页面耗时与表大小无关
+    :param db: 数据库会话
+    :param query: 已添加过滤条件的查询
+    :param model: 数据模型，需包含id主键
+    :param sort: 排序字段，前缀"-"表示倒序
+    :param allowed_sorts: 允许排序的字段
+    :param cursor: 上一页返回的游标
+    :param limit: 每页数量
+    :return: (当前页记录, 下一页游标)，没有下一页时游标为None
+    """
+    descending = sort.startswith("-")
+    field = sort.lstrip("-")
+    if field not in allowed_sorts:
+        raise ValueError(f"不支持的排序字段: {field}，可选: {', '.join(allowed_sorts)}")
+
+    column = getattr(model, field)
+    pk = model.id
+    if field == "id":
+        key, order_by = pk, [pk.desc() if descending else pk.asc()]
+    else:
+        key = tuple_(column, pk)
+        order_by = [column.desc(), pk.desc()] if descending else [column.asc(), pk.asc()]
+
+    if cursor:
+        value, last_id = decode_cursor(cursor)
+        if isinstance(column.type, DateTime) and value is not None:
+            value = datetime.fromisoformat(value)
+        bound = last_id if field == "id" else tuple_(value, last_id)
+        query = query.where(key < bound if descending else key > bound)
+
+    rows = (await db.exec(query.order_by(*order_by).limit(limit + 1))).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([getattr(last, field), last.id])
+    return rows, next_cursor
+
+
+def prefix_range(column, prefix: str):
+    """
+    前缀匹配条件，使用范围比较以便利用索引（LIKE在SQLite默认不走索引）
+    :param column: 字符串列
+    :param prefix: 前缀
+    :return: 查询条件
+    """
+    upper = _prefix_upper_bound(prefix)
+    if upper is None:
+        return column >= prefix
+    return (column >= prefix) & (column < upper)
+
+
+def _prefix_upper_bound(prefix: str) -> Optional[str]:
+    """
+    以prefix开头的字符串的上界（不含）：最后一个字符的码点加一，按码点比较对BMP之外的字符同样成立
+    :param prefix: 前缀
+    :return: 上界，前缀为空或全部是最大码点时为None（没有上界）
+    """
+    chars = list(prefix)
+    while chars:
+        code = ord(chars.pop()) + 1
+        if code > sys.maxunicode:
+            continue
+        if 0xD800 <= code <= 0xDFFF:
+            # 跳过代理区，代理码点无法编码为UTF-8
+            code = 0xE000
+        return "".join(chars) + chr(code)
+    return None
@@ -0,0 +1,288 @@
+import asyncio
+import functools
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from contextvars import ContextVar
+from types import FrameType
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from utils.logger import log
+
+# 是否允许通过请求头/查询参数触发剖析，任何客户端都能触发，默认关闭，仅在需要排查时通过环境变量开启
+PROFILE_ENABLED = os.environ.get("PROFILE_ENABLED", "0") == "1"
+# 随机剖析的请求比例（0~1），0表示不随机剖析
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+# 采样间隔（秒）
+PROFILE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL_MS", "2")) / 1000
+# 保留最近的剖析结果数
+PROFILE_HISTORY = int(os.environ.get("PROFILE_HISTORY", "50"))
+# 单个调用栈的最大深度
+PROFILE_MAX_DEPTH = 200
+# 触发剖析的请求头与查询参数
+PROFILE_HEADER = b"x-profile"
+PROFILE_QUERY_PARAM = b"__profile"
+
+# 当前请求的剖析记录，工作线程据此登记
+_current_profile: ContextVar[Optional["Profile"]] = ContextVar("current_profile", default=None)
+
+
+def _label(frame: FrameType) -> str:
+    code = frame.f_code
+    name = getattr(code, "co_qualname", code.co_name)
+    # 折叠格式以分号分隔栈帧
+    return f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ":")
+
+
+def _thread_stack(frame: Optional[FrameType]) -> List[FrameType]:
+    frames = []
+    while frame is not None and len(frames) < PROFILE_MAX_DEPTH:
+        frames.append(frame)
+        frame = frame.f_back
+    frames.reverse()
+    return frames
+
+
+def _await_chain(coro: Any) -> List[FrameType]:
+    frames = []
+    while coro is not None and len(frames) < PROFILE_MAX_DEPTH:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None) or getattr(coro, "ag_frame", None)
+        if frame is None:
+            break
+        frames.append(frame)
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None) or getattr(coro, "ag_await", None)
+    return frames
+
+
+_HANDLE_RUN_CODE = asyncio.events.Handle._run.__code__
+
+
+class Profile:
+    """一次请求的剖析记录，按折叠调用栈计数"""
+
+    def __init__(self, method: str, path: str, task: asyncio.Task, root_code):
+        self.id = uuid.uuid4().hex[:12]
+        self.method = method
+        self.path = path
+        self.route: Optional[str] = None
+        self.status: Optional[int] = None
+        self.started_at = time.time()
+        self.duration_ms: Optional[float] = None
+        self.samples = 0
+        self.stacks: Counter = Counter()
+        self.task = task
+        self.loop = task.get_loop()
+        self.loop_thread_id = threading.get_ident()
+        self.root_code = root_code
+        # 正在为该请求执行阻塞调用的工作线程
+        self.threads: set = set()
+
+    def _chain(self) -> List[FrameType]:
+        chain = _await_chain(self.task.get_coro())
+        for index, frame in enumerate(chain):
+            if frame.f_code is self.root_code:
+                return chain[index:]
+        return chain
+
+    def sample(self, frames: Dict[int, FrameType]):
+        """
+        采样一次（在采样线程中调用）
+        :param frames: sys._current_frames()的结果
+        """
+        chain = self._chain()
+        stack = [_label(frame) for frame in chain]
+        try:
+            running = asyncio.current_task(self.loop) is self.task
+        except RuntimeError:
+            running = False
+        if running:
+            thread_frames = _thread_stack(frames.get(self.loop_thread_id))
+            inner = chain[-1] if chain else None
+            position = next((i for i, frame in enumerate(thread_frames) if frame is inner), None)
+            if position is not None:
+                # 正在执行：接上最内层协程之下的同步调用（pydantic序列化等）
+                stack.extend(_label(frame) for frame in thread_frames[position + 1:])
+            elif not any(frame.f_code is _HANDLE_RUN_CODE for frame in thread_frames):
+                # 在greenlet中执行（SQLAlchemy异步适配层），栈不与协程链相连
+                stack.extend(_label(frame) for frame in thread_frames)
+        workers = [frames.get(thread_id) for thread_id in list(self.threads)]
+        workers = [frame for frame in workers if frame is not None]
+        if workers:
+            # 等待工作线程时，接上工作线程中的调用栈（paramiko等）
+            for frame in workers:
+                worker_stack = _thread_stack(frame)
+                for index, worker_frame in enumerate(worker_stack):
+                    if worker_frame.f_code is _tracked_call_code:
+                        worker_stack = worker_stack[index + 1:]
+                        break
+                self.stacks[";".join(stack + ["<thread>"] + [_label(f) for f in worker_stack])] += 1
+        else:
+            self.stacks[";".join(stack)] += 1
+        self.samples += 1
+
+    def folded(self) -> str:
+        """
+        折叠调用栈格式，可直接用于flamegraph.pl、speedscope等工具
+        :return: 每行"栈帧;栈帧;... 样本数"
+        """
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + "\n"
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        剖析记录摘要
+        :return: 请求信息与样本数
+        """
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "status": self.status,
+            "started_at": self.started_at,
+            "duration_ms": self.duration_ms,
+            "samples": self.samples,
+            "interval_ms": PROFILE_INTERVAL * 1000,
+        }
+
+
+class SamplingProfiler:
+    """
+    墙钟采样剖析器
+
+    有请求在剖析时才启动采样线程，按固定间隔采集各请求的协程调用链和相关线程的调用栈；
+    结束的剖析记录保存在环形缓冲区中
+    """
+
+    def __init__(self, interval: float = PROFILE_INTERVAL, history: int = PROFILE_HISTORY):
+        self.interval = interval
+        self.profiles: Deque[Profile] = deque(maxlen=history)
+        self._active: Dict[str, Profile] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def begin(self, profile: Profile):
+        """
+        开始剖析
+        :param profile: 剖析记录
+        """
+        with self._lock:
+            self._active[profile.id] = profile
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+                self._thread.start()
+
+    def end(self, profile: Profile):
+        """
+        结束剖析并保存记录
+        :param profile: 剖析记录
+        """
+        with self._lock:
+            self._active.pop(profile.id, None)
+        profile.duration_ms = round((time.time() - profile.started_at) * 1000, 3)
+        profile.task = None
+        self.profiles.append(profile)
+
+    def get(self, profile_id: str) -> Optional[Profile]:
+        """
+        获取剖析记录
+        :param profile_id: 剖析ID
+        :return: 剖析记录
+        """
+        return next((profile for profile in self.profiles if profile.id == profile_id), None)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._active:
+                    self._thread = None
+                    return
+                active = list(self._active.values())
+            frames = sys._current_frames()
+            for profile in active:
+                try:
+                    if profile.task is not None:
+                        profile.sample(frames)
+                except Exception as e:
+                    log.debug("剖析采样失败: {}, 错误: {}", profile.id, e)
+            del frames
+            time.sleep(self.interval)
+
+
+# 全局剖析器
+profiler = SamplingProfiler()
+
+
+def _tracked_call(profile: Profile, func: Callable[[], Any]) -> Any:
+    thread_id = threading.get_ident()
+    profile.threads.add(thread_id)
+    try:
+        return func()
+    finally:
+        profile.threads.discard(thread_id)
+
+
+_tracked_call_code = _tracked_call.__code__
+
+
+def profiled(func: Callable[[], Any]) -> Callable[[], Any]:
+    """
+    当前请求正在剖析时，把要交给工作线程执行的调用登记到剖析记录，未剖析时原样返回
+    :param func: 无参调用
+    :return: 调用
+    """
+    profile = _current_profile.get()
+    if profile is None:
+        return func
+    return functools.partial(_tracked_call, profile, func)
+
+
+class ProfilingMiddleware:
+    """
+    按请求开启的剖析中间件（纯ASGI实现）
+
+    请求头 X-Profile: 1 或查询参数 __profile=1 时剖析该请求，也可按PROFILE_SAMPLE_RATE随机剖析；
+    响应头 X-Profile-Id 返回剖析ID。未剖析的请求只做一次请求头检查
+    """
+
+    def __init__(self, app, profiler: SamplingProfiler = profiler):
+        self.app = app
+        self.profiler = profiler
+
+    @staticmethod
+    def _wanted(scope) -> bool:
+        if PROFILE_ENABLED:
+            for name, value in scope["headers"]:
+                if name == PROFILE_HEADER:
+                    return value not in (b"", b"0")
+            query = scope.get("query_string", b"")
+            if PROFILE_QUERY_PARAM in query:
+                return f"{PROFILE_QUERY_PARAM.decode()}=0".encode() not in query
+        return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._wanted(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile = Profile(scope["method"], scope["path"], asyncio.current_task(), ProfilingMiddleware.__call__.__code__)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+                message = {**message, "headers": [*message.get("headers", []), (b"x-profile-id", profile.id.encode())]}
+            await send(message)
+
+        token = _current_profile.set(profile)
+        self.profiler.begin(profile)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.profiler.end(profile)
+            _current_profile.reset(token)
+            profile.route = getattr(scope.get("route"), "path", None)
+            log.info("请求剖析完成: id={}, {} {}, 耗时={}ms, 样本数={}", profile.id, profile.method, profile.path,
+                     profile.duration_ms, profile.samples)
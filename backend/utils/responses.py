@@ -0,0 +1,24 @@
+from typing import Any, Mapping, Optional
+
+from pydantic import BaseModel
+from pydantic_core import to_json
+from starlette.background import BackgroundTask
+from starlette.responses import Response
+
+
+class ModelResponse(Response):
+    """
+    直接把pydantic模型序列化为JSON字节的响应
+
+    路由函数返回该响应时FastAPI不再按response_model校验，也不经过jsonable_encoder，
+    模型只在构造时校验一次，序列化由pydantic-core完成（日期时间按ISO 8601输出）
+    """
+
+    media_type = "application/json"
+
+    def __init__(self, content: BaseModel, status_code: int = 200, headers: Optional[Mapping[str, str]] = None,
+                 background: Optional[BackgroundTask] = None):
+        super().__init__(content, status_code, headers, self.media_type, background)
+
+    def render(self, content: Any) -> bytes:
+        return to_json(content)
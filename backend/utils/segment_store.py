@@ -0,0 +1,306 @@
+import asyncio
+import mmap
+import os
+import struct
+import threading
+import zlib
+from contextlib import contextmanager
+from typing import AsyncIterator, BinaryIO, Iterator, List, NamedTuple, Optional, Tuple
+
+from utils.logger import log
+
+# 单个段文件的最大大小，写满后切换到新段
+SEGMENT_MAX_BYTES = int(os.environ.get("RESULT_SEGMENT_MAX_MB", "64")) * 1024 * 1024
+# zlib压缩级别：测试输出多为重复度高的文本，6级在压缩率和CPU之间较均衡
+COMPRESSION_LEVEL = 6
+# 随机读取的粒度：每压缩这么多原始数据做一次完全刷新，并在索引中记录压缩数据中的位置
+RECORD_CHUNK_SIZE = 1024 * 1024
+# 流式读取时每次读取的压缩数据大小，以及每次解压输出的最大大小
+READ_CHUNK_SIZE = 64 * 1024
+DECOMPRESS_CHUNK_SIZE = 256 * 1024
+# 记录头: 魔数、压缩数据的CRC32、压缩数据长度；分块记录另有原始分块大小和分块数
+_HEADER = struct.Struct("<4sII")
+_CHUNKED_HEADER = struct.Struct("<4sIIII")
+_MAGIC = b"NCO1"
+_CHUNKED_MAGIC = b"NCO2"
+# zlib格式头的长度（不使用预设字典时固定为2字节），第一个分块的原始deflate数据从这里开始
+_ZLIB_HEADER_SIZE = 2
+_SUFFIX = ".seg"
+
+
+class SegmentRef(NamedTuple):
+    """一条记录在段文件中的位置"""
+    segment: int
+    offset: int  # 记录头在段文件中的偏移
+    length: int  # 压缩数据长度
+
+
+class _Record(NamedTuple):
+    data_start: int  # 压缩数据在段文件中的偏移
+    length: int
+    crc: int
+    chunk_size: int  # 0表示不分块（只能从头顺序解压）
+    chunk_offsets: Tuple[int, ...]  # 各分块的原始deflate数据在压缩数据中的偏移
+
+
+def _compress(payload: bytes) -> Tuple[bytes, List[int]]:
+    # 每个分块后做一次完全刷新：输出按字节对齐并清空字典，可以从该位置开始独立解压，
+    # 整体仍是一个合法的zlib数据流，可直接作为HTTP deflate编码返回
+    compressor = zlib.compressobj(COMPRESSION_LEVEL)
+    parts, offsets, length = [], [], 0
+    for start in range(0, len(payload), RECORD_CHUNK_SIZE):
+        offsets.append(length if start else _ZLIB_HEADER_SIZE)
+        for part in (compressor.compress(payload[start:start + RECORD_CHUNK_SIZE]),
+                     compressor.flush(zlib.Z_FULL_FLUSH)):
+            parts.append(part)
+            length += len(part)
+    parts.append(compressor.flush())
+    return b"".join(parts), offsets
+
+
+def _inflate(decompressor, pieces: Iterator[bytes], skip: int = 0, limit: Optional[int] = None) -> Iterator[bytes]:
+    # 逐块解压，丢弃前skip字节，最多输出limit字节，每次输出不超过DECOMPRESS_CHUNK_SIZE
+    for piece in pieces:
+        while piece:
+            data = decompressor.decompress(piece, DECOMPRESS_CHUNK_SIZE)
+            piece = decompressor.unconsumed_tail
+            if skip:
+                dropped = min(skip, len(data))
+                data, skip = data[dropped:], skip - dropped
+            if limit is not None:
+                data = data[:limit]
+                limit -= len(data)
+            if data:
+                yield data
+            if limit == 0 or decompressor.eof:
+                return
+    data = decompressor.flush()[skip:]
+    if data:
+        yield data if limit is None else data[:limit]
+
+
+class SegmentStore:
+    """
+    追加写入的压缩段文件存储
+
+    每条记录为 记录头 + zlib压缩数据 + 分块索引，依次追加到 <root>/<段号>.seg，段文件写满后切换到下一个段，
+    已写入的记录不再修改。压缩时每1MB原始数据做一次完全刷新并记录位置，按字节范围读取时只解压覆盖该范围的分块。
+    记录位置由调用方保存（数据库索引），读取通过mmap进行，不会把整条记录读入内存。
+    启动后首次写入前会截掉最后一个段中写了一半的记录
+    """
+
+    def __init__(self, root: str, max_segment_bytes: int = SEGMENT_MAX_BYTES):
+        self.root = root
+        self.max_segment_bytes = max_segment_bytes
+        self._lock = threading.Lock()
+        self._file: Optional[BinaryIO] = None
+        self._segment = 0
+        self._size = 0
+
+    def path(self, segment: int) -> str:
+        """
+        获取段文件路径
+        :param segment: 段号
+        :return: 文件路径
+        """
+        return os.path.join(self.root, f"{segment:08d}{_SUFFIX}")
+
+    def _segments(self) -> List[int]:
+        if not os.path.isdir(self.root):
+            return []
+        names = (name[:-len(_SUFFIX)] for name in os.listdir(self.root) if name.endswith(_SUFFIX))
+        return sorted(int(name) for name in names if name.isdigit())
+
+    @staticmethod
+    def _record_size(header: bytes) -> Optional[int]:
+        # 根据记录头计算整条记录的大小，不是有效的记录头时返回None
+        magic = header[:4]
+        if magic == _MAGIC and len(header) >= _HEADER.size:
+            return _HEADER.size + _HEADER.unpack_from(header)[2]
+        if magic == _CHUNKED_MAGIC and len(header) >= _CHUNKED_HEADER.size:
+            _, _, length, _, count = _CHUNKED_HEADER.unpack_from(header)
+            return _CHUNKED_HEADER.size + length + count * 4
+        return None
+
+    @staticmethod
+    def _valid_end(f: BinaryIO, size: int) -> int:
+        # 逐条跳过记录，找到最后一条完整记录的结尾
+        offset = 0
+        while offset < size:
+            f.seek(offset)
+            record_size = SegmentStore._record_size(f.read(_CHUNKED_HEADER.size))
+            if record_size is None or offset + record_size > size:
+                break
+            offset += record_size
+        return offset
+
+    def _open(self, segment: int):
+        os.makedirs(self.root, exist_ok=True)
+        path = self.path(segment)
+        self._file = open(path, "r+b" if os.path.exists(path) else "w+b")
+        size = self._file.seek(0, os.SEEK_END)
+        self._size = self._valid_end(self._file, size)
+        if self._size != size:
+            log.warning("截断段文件中不完整的记录: {}, {} -> {}字节", path, size, self._size)
+            self._file.truncate(self._size)
+        self._file.seek(self._size)
+        self._segment = segment
+
+    def _rotate(self):
+        self._file.close()
+        self._open(self._segment + 1)
+
+    def append_many(self, payloads: List[bytes]) -> List[SegmentRef]:
+        """
+        压缩并追加多条记录，全部写入后统一刷盘一次
+        :param payloads: 原始数据
+        :return: 各记录的位置
+        """
+        compressed = [_compress(payload) for payload in payloads]
+        refs = []
+        with self._lock:
+            if self._file is None:
+                segments = self._segments()
+                self._open(segments[-1] if segments else 1)
+            for data, offsets in compressed:
+                header = _CHUNKED_HEADER.pack(_CHUNKED_MAGIC, zlib.crc32(data), len(data), RECORD_CHUNK_SIZE,
+                                              len(offsets))
+                index = struct.pack(f"<{len(offsets)}I", *offsets)
+                record_size = len(header) + len(data) + len(index)
+                if self._size and self._size + record_size > self.max_segment_bytes:
+                    self._file.flush()
+                    os.fsync(self._file.fileno())
+                    self._rotate()
+                try:
+                    self._file.write(header)
+                    self._file.write(data)
+                    self._file.write(index)
+                except OSError:
+                    # 写入失败（如磁盘已满）时去掉写了一半的记录，保证后续记录的偏移正确
+                    self._file.truncate(self._size)
+                    self._file.seek(self._size)
+                    raise
+                refs.append(SegmentRef(self._segment, self._size, len(data)))
+                self._size += record_size
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        return refs
+
+    async def append(self, payloads: List[bytes]) -> List[SegmentRef]:
+        """
+        在线程池中压缩并追加多条记录
+        :param payloads: 原始数据
+        :return: 各记录的位置
+        """
+        return await asyncio.to_thread(self.append_many, payloads)
+
+    @contextmanager
+    def _map(self, segment: int) -> Iterator[mmap.mmap]:
+        with open(self.path(segment), "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield mapped
+
+    @staticmethod
+    def _record(mapped: mmap.mmap, ref: SegmentRef) -> _Record:
+        header = mapped[ref.offset:ref.offset + _CHUNKED_HEADER.size]
+        if header[:4] == _CHUNKED_MAGIC and len(header) == _CHUNKED_HEADER.size:
+            _, crc, length, chunk_size, count = _CHUNKED_HEADER.unpack(header)
+            data_start = ref.offset + _CHUNKED_HEADER.size
+            index_start = data_start + length
+            offsets = struct.unpack(f"<{count}I", mapped[index_start:index_start + count * 4])
+        elif header[:4] == _MAGIC:
+            _, crc, length = _HEADER.unpack_from(header)
+            data_start, chunk_size, offsets = ref.offset + _HEADER.size, 0, ()
+        else:
+            raise ValueError(f"段文件中不存在该记录: {ref}")
+        if length != ref.length or data_start + length > len(mapped):
+            raise ValueError(f"段文件记录头不匹配: {ref}")
+        return _Record(data_start, length, crc, chunk_size, offsets)
+
+    @staticmethod
+    def _pieces(mapped: mmap.mmap, start: int, end: int) -> Iterator[bytes]:
+        for offset in range(start, end, READ_CHUNK_SIZE):
+            yield mapped[offset:min(offset + READ_CHUNK_SIZE, end)]
+
+    def iter_compressed(self, ref: SegmentRef) -> Iterator[bytes]:
+        """
+        按块读取一条记录的压缩数据（zlib格式，即HTTP的deflate编码），读完后校验CRC
+        :param ref: 记录位置
+        :return: 压缩数据块
+        """
+        with self._map(ref.segment) as mapped:
+            record = self._record(mapped, ref)
+            checksum = 0
+            for chunk in self._pieces(mapped, record.data_start, record.data_start + record.length):
+                checksum = zlib.crc32(chunk, checksum)
+                yield chunk
+            if checksum != record.crc:
+                raise ValueError(f"段文件记录校验失败: {ref}")
+
+    def iter_decompressed(self, ref: SegmentRef) -> Iterator[bytes]:
+        """
+        按块读取并解压一条记录，每块不超过DECOMPRESS_CHUNK_SIZE
+        :param ref: 记录位置
+        :return: 原始数据块
+        """
+        return _inflate(zlib.decompressobj(), self.iter_compressed(ref))
+
+    def iter_range(self, ref: SegmentRef, start: int, end: int) -> Iterator[bytes]:
+        """
+        读取一条记录原始数据中[start, end)范围的内容，只解压覆盖该范围的分块（不校验CRC）
+        :param ref: 记录位置
+        :param start: 起始字节（含）
+        :param end: 结束字节（不含）
+        :return: 原始数据块
+        """
+        if end <= start:
+            return
+        with self._map(ref.segment) as mapped:
+            record = self._record(mapped, ref)
+            if record.chunk_size:
+                chunk = start // record.chunk_size
+                if chunk >= len(record.chunk_offsets):
+                    return
+                decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+                begin = record.data_start + record.chunk_offsets[chunk]
+                skip = start - chunk * record.chunk_size
+            else:
+                # 不分块的记录只能从头解压
+                decompressor = zlib.decompressobj()
+                begin, skip = record.data_start, start
+            pieces = self._pieces(mapped, begin, record.data_start + record.length)
+            yield from _inflate(decompressor, pieces, skip, end - start)
+
+    async def stream(self, ref: SegmentRef, compressed: bool = False,
+                     byte_range: Optional[Tuple[int, int]] = None) -> AsyncIterator[bytes]:
+        """
+        在线程池中逐块读取一条记录
+        :param ref: 记录位置
+        :param compressed: 是否直接返回压缩数据
+        :param byte_range: 只读取原始数据中[start, end)范围的内容
+        :return: 数据块
+        """
+        if byte_range is not None:
+            chunks = self.iter_range(ref, *byte_range)
+        else:
+            chunks = self.iter_compressed(ref) if compressed else self.iter_decompressed(ref)
+        try:
+            while True:
+                chunk = await asyncio.to_thread(next, chunks, None)
+                if chunk is None:
+                    break
+                yield chunk
+        finally:
+            try:
+                chunks.close()
+            except ValueError:
+                # 读取线程仍在执行（请求被取消），生成器回收时再关闭文件
+                pass
+
+    def close(self):
+        """
+        关闭当前写入的段文件
+        """
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,454 @@
+import asyncio
+import functools
+import os
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Iterator, Optional, Tuple
+
+import paramiko
+
+from utils.logger import log
+from utils.metrics import registry
+from utils.profiling import profiled
+
+# SSH线程池大小，paramiko为阻塞库，所有调用都在该线程池中执行
+SSH_MAX_WORKERS = int(os.environ.get("SSH_MAX_WORKERS", "32"))
+# 默认连接超时时间（秒）
+SSH_CONNECT_TIMEOUT = 10
+# 默认命令执行超时时间（秒）
+SSH_COMMAND_TIMEOUT = 60
+# 默认文件上传超时时间（秒）
+SSH_UPLOAD_TIMEOUT = 300
+# 连接池：每台主机最大连接数
+SSH_POOL_MAX_PER_HOST = int(os.environ.get("SSH_POOL_MAX_PER_HOST", "4"))
+# 连接池：空闲连接最长保留时间（秒）
+SSH_POOL_IDLE_TIMEOUT = float(os.environ.get("SSH_POOL_IDLE_TIMEOUT", "300"))
+# 连接池：SSH keepalive间隔（秒）
+SSH_KEEPALIVE_INTERVAL = int(os.environ.get("SSH_KEEPALIVE_INTERVAL", "30"))
+
+_executor = ThreadPoolExecutor(max_workers=SSH_MAX_WORKERS, thread_name_prefix="ssh")
+
+SSH_OPERATION_DURATION = registry.histogram("ssh_operation_duration_seconds", "SSH操作耗时", ("operation",))
+SSH_OPERATION_ERRORS = registry.counter("ssh_operation_errors", "SSH操作失败次数", ("operation",))
+
+
+@contextmanager
+def _timed(operation: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        SSH_OPERATION_ERRORS.labels(operation).inc()
+        raise
+    finally:
+        SSH_OPERATION_DURATION.labels(operation).observe(time.perf_counter() - started)
+
+
+async def run_blocking(func: Callable[..., Any], *args, timeout: Optional[float] = None, **kwargs) -> Any:
+    """
+    在SSH线程池中执行阻塞调用，避免阻塞事件循环
+    :param func: 阻塞函数
+    :param timeout: 超时时间（秒），超时抛出TimeoutError（即socket.timeout）
+    :return: 函数返回值
+    """
+    loop = asyncio.get_running_loop()
+    # 剖析中的请求会把工作线程中的调用栈一并采集
+    call = profiled(functools.partial(func, *args, **kwargs))
+    return await asyncio.wait_for(loop.run_in_executor(_executor, call), timeout)
+
+
+def _threadsafe(callback: Optional[Callable[..., None]]) -> Optional[Callable[..., None]]:
+    """
+    包装回调，使其可以在SSH线程中调用，实际在事件循环线程中执行
+    :param callback: 回调函数
+    :return: 线程安全的回调函数
+    """
+    if callback is None:
+        return None
+    loop = asyncio.get_running_loop()
+
+    def call(*args):
+        loop.call_soon_threadsafe(callback, *args)
+
+    return call
+
+
+@dataclass
+class CommandResult:
+    """远程命令执行结果"""
+    exit_status: int
+    stdout: str
+    stderr: str
+
+
+class AsyncSSHClient:
+    """
+    异步SSH客户端
+
+    对paramiko.SSHClient的封装，connect/exec/put均在线程池中执行并带有超时控制
+    """
+
+    def __init__(self, hostname: str, username: str, password: str, port: int = 22,
+                 connect_timeout: float = SSH_CONNECT_TIMEOUT):
+        self.hostname = hostname
+        self.username = username
+        self.password = password
+        self.port = port
+        self.connect_timeout = connect_timeout
+        self.last_used = time.monotonic()
+        self._client: Optional[paramiko.SSHClient] = None
+
+    async def __aenter__(self) -> "AsyncSSHClient":
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def _connect(self) -> paramiko.SSHClient:
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        try:
+            client.connect(
+                hostname=self.hostname,
+                port=self.port,
+                username=self.username,
+                password=self.password,
+                timeout=self.connect_timeout,
+                banner_timeout=self.connect_timeout,
+                auth_timeout=self.connect_timeout,
+            )
+        except Exception:
+            client.close()
+            raise
+        return client
+
+    async def connect(self):
+        """
+        建立SSH连接
+        """
+        # 额外留出1秒，让paramiko自身的超时先生效，得到更准确的异常类型
+        with _timed("connect"):
+            self._client = await run_blocking(self._connect, timeout=self.connect_timeout + 1)
+
+    def _exec(self, command: str, timeout: float) -> CommandResult:
+        stdin, stdout, stderr = self._client.exec_command(command, timeout=timeout)
+        out = stdout.read().decode().strip()
+        err = stderr.read().decode().strip()
+        exit_status = stdout.channel.recv_exit_status()
+        return CommandResult(exit_status=exit_status, stdout=out, stderr=err)
+
+    def _exec_stream(self, command: str, timeout: float, on_output: Callable[[str, str], None]) -> CommandResult:
+        channel = self._client.get_transport().open_session(timeout=timeout)
+        channel.exec_command(command)
+        deadline = time.monotonic() + timeout
+        buffers = {"stdout": b"", "stderr": b""}
+        collected = {"stdout": [], "stderr": []}
+
+        def emit(stream: str, data: bytes, final: bool = False):
+            buffers[stream] += data
+            *lines, buffers[stream] = buffers[stream].split(b"\n")
+            if final and buffers[stream]:
+                lines.append(buffers[stream])
+                buffers[stream] = b""
+            for raw in lines:
+                line = raw.decode(errors="replace").rstrip("\r")
+                collected[stream].append(line)
+                on_output(stream, line)
+
+        try:
+            while True:
+                idle = True
+                if channel.recv_ready():
+                    emit("stdout", channel.recv(32768))
+                    idle = False
+                if channel.recv_stderr_ready():
+                    emit("stderr", channel.recv_stderr(32768))
+                    idle = False
+                if idle and channel.exit_status_ready() and not channel.recv_ready() \
+                        and not channel.recv_stderr_ready():
+                    break
+                if idle:
+                    if time.monotonic() > deadline:
+                        raise TimeoutError(f"命令执行超时: {command}")
+                    time.sleep(0.05)
+            emit("stdout", b"", final=True)
+            emit("stderr", b"", final=True)
+            return CommandResult(
+                exit_status=channel.recv_exit_status(),
+                stdout="\n".join(collected["stdout"]).strip(),
+                stderr="\n".join(collected["stderr"]).strip(),
+            )
+        finally:
+            channel.close()
+
+    async def exec(self, command: str, timeout: float = SSH_COMMAND_TIMEOUT,
+                   on_output: Optional[Callable[[str, str], None]] = None) -> CommandResult:
+        """
+        执行远程命令
+        :param command: 命令
+        :param timeout: 超时时间（秒）
+        :param on_output: 输出回调(stream, line)，提供时逐行推送stdout/stderr，在事件循环线程中调用
+        :return: 命令执行结果
+        """
+        log.debug("执行远程命令: {}: {}", self.hostname, command)
+        with _timed("exec"):
+            if on_output is not None:
+                return await run_blocking(self._exec_stream, command, timeout, _threadsafe(on_output), timeout=timeout)
+            return await run_blocking(self._exec, command, timeout, timeout=timeout)
+
+    def _put(self, local_path: str, remote_path: str):
+        sftp = self._client.open_sftp()
+        try:
+            sftp.put(local_path, remote_path)
+        finally:
+            sftp.close()
+
+    async def put(self, local_path: str, remote_path: str, timeout: float = SSH_UPLOAD_TIMEOUT):
+        """
+        通过SFTP上传文件
+        :param local_path: 本地文件路径
+        :param remote_path: 远程文件路径
+        :param timeout: 超时时间（秒）
+        """
+        with _timed("sftp"):
+            await run_blocking(self._put, local_path, remote_path, timeout=timeout)
+
+    def _put_resumable(self, local_path: str, remote_path: str,
+                       callback: Optional[Callable[[int, int], None]] = None) -> int:
+        local_size = os.path.getsize(local_path)
+        sftp = self._client.open_sftp()
+        try:
+            try:
+                offset = sftp.stat(remote_path).st_size
+            except IOError:
+                offset = 0
+            if offset > local_size:
+                # 远程文件比本地大，说明不是同一个文件的片段，从头上传
+                offset = 0
+            if offset == local_size:
+                return 0
+            sent = 0
+            with open(local_path, "rb") as src, sftp.open(remote_path, "ab" if offset else "wb") as dst:
+                dst.set_pipelined(True)
+                src.seek(offset)
+                while chunk := src.read(32768):
+                    dst.write(chunk)
+                    sent += len(chunk)
+                    if callback is not None:
+                        callback(sent, local_size - offset)
+            return sent
+        finally:
+            sftp.close()
+
+    async def put_resumable(self, local_path: str, remote_path: str, timeout: float = SSH_UPLOAD_TIMEOUT,
+                            on_progress: Optional[Callable[[int, int], None]] = None) -> int:
+        """
+        通过SFTP断点续传文件：远程已有部分内容时只上传剩余部分
+        :param local_path: 本地文件路径
+        :param remote_path: 远程文件路径
+        :param timeout: 超时时间（秒）
+        :param on_progress: 进度回调(已传输字节数, 本次需传输字节数)，在事件循环线程中调用
+        :return: 实际传输的字节数
+        """
+        with _timed("sftp"):
+            return await run_blocking(self._put_resumable, local_path, remote_path, _threadsafe(on_progress),
+                                      timeout=timeout)
+
+    def is_healthy(self) -> bool:
+        """
+        检查底层传输是否仍然可用
+        :return: 连接是否可用
+        """
+        if self._client is None:
+            return False
+        transport = self._client.get_transport()
+        return transport is not None and transport.is_active() and transport.is_authenticated()
+
+    def set_keepalive(self, interval: int):
+        """
+        设置SSH keepalive间隔
+        :param interval: 间隔（秒）
+        """
+        transport = self._client.get_transport() if self._client else None
+        if transport is not None:
+            transport.set_keepalive(interval)
+
+    async def close(self):
+        """
+        关闭SSH连接
+        """
+        if self._client is not None:
+            client, self._client = self._client, None
+            await run_blocking(client.close)
+
+    def close_nowait(self):
+        """
+        在线程池中关闭SSH连接，不等待完成
+        """
+        if self._client is not None:
+            client, self._client = self._client, None
+            _executor.submit(client.close)
+
+
+class SSHConnectionPool:
+    """
+    SSH连接池
+
+    按(ip, username)复用已认证的SSH连接，限制每台主机的最大连接数，
+    定期回收空闲连接，并在复用前做健康检查
+    """
+
+    def __init__(self, max_per_host: int = SSH_POOL_MAX_PER_HOST,
+                 idle_timeout: float = SSH_POOL_IDLE_TIMEOUT,
+                 keepalive_interval: int = SSH_KEEPALIVE_INTERVAL):
+        self.max_per_host = max_per_host
+        self.idle_timeout = idle_timeout
+        self.keepalive_interval = keepalive_interval
+        self._idle: Dict[Tuple[str, str], Deque[AsyncSSHClient]] = defaultdict(deque)
+        self._limits: Dict[Tuple[str, str], asyncio.Semaphore] = {}
+        self._evict_task: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.health_failures = 0
+
+    def _limit(self, key: Tuple[str, str]) -> asyncio.Semaphore:
+        if key not in self._limits:
+            self._limits[key] = asyncio.Semaphore(self.max_per_host)
+        return self._limits[key]
+
+    def _take_idle(self, key: Tuple[str, str], password: str, port: int) -> Optional[AsyncSSHClient]:
+        idle = self._idle.get(key)
+        now = time.monotonic()
+        # 凭据不一致的连接不复用（需要重新认证），但保留给使用原凭据的请求
+        mismatched = []
+        client = None
+        while idle:
+            candidate = idle.pop()
+            if candidate.password != password or candidate.port != port:
+                mismatched.append(candidate)
+            elif now - candidate.last_used > self.idle_timeout:
+                self.evictions += 1
+                candidate.close_nowait()
+            elif not candidate.is_healthy():
+                self.health_failures += 1
+                candidate.close_nowait()
+            else:
+                client = candidate
+                break
+        if mismatched:
+            self._idle[key].extend(reversed(mismatched))
+        return client
+
+    @asynccontextmanager
+    async def acquire(self, hostname: str, username: str, password: str, port: int = 22,
+                      connect_timeout: float = SSH_CONNECT_TIMEOUT) -> AsyncIterator[AsyncSSHClient]:
+        """
+        从连接池获取SSH连接，使用完毕后自动归还
+        :param hostname: 主机地址
+        :param username: 用户名
+        :param password: 密码
+        :param port: SSH端口
+        :param connect_timeout: 新建连接的超时时间（秒）
+        :return: 已连接的异步SSH客户端
+        """
+        key = (hostname, username)
+        async with self._limit(key):
+            client = self._take_idle(key, password, port)
+            if client is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+                client = AsyncSSHClient(hostname, username, password, port=port, connect_timeout=connect_timeout)
+                await client.connect()
+                client.set_keepalive(self.keepalive_interval)
+            try:
+                yield client
+            except BaseException:
+                # 使用过程中出现异常，连接状态未知，直接丢弃
+                client.close_nowait()
+                raise
+            client.last_used = time.monotonic()
+            idle = self._idle[key]
+            idle.append(client)
+            # 空闲连接数不超过单主机上限，超出时关闭最久未使用的连接
+            while len(idle) > self.max_per_host:
+                self.evictions += 1
+                idle.popleft().close_nowait()
+
+    def evict_idle(self):
+        """
+        回收超时或已失效的空闲连接
+        """
+        now = time.monotonic()
+        for key in list(self._idle):
+            idle = self._idle[key]
+            alive = deque(c for c in idle if now - c.last_used <= self.idle_timeout and c.is_healthy())
+            for client in idle:
+                if client not in alive:
+                    self.evictions += 1
+                    client.close_nowait()
+            if alive:
+                self._idle[key] = alive
+            else:
+                del self._idle[key]
+
+    async def _evict_loop(self):
+        while True:
+            await asyncio.sleep(max(self.idle_timeout / 4, 1))
+            self.evict_idle()
+
+    def start(self):
+        """
+        启动空闲连接回收任务
+        """
+        if self._evict_task is None:
+            self._evict_task = asyncio.create_task(self._evict_loop())
+
+    async def close(self):
+        """
+        停止回收任务并关闭所有空闲连接
+        """
+        if self._evict_task is not None:
+            self._evict_task.cancel()
+            self._evict_task = None
+        for idle in self._idle.values():
+            for client in idle:
+                await client.close()
+        self._idle.clear()
+        self._limits.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        获取连接池统计信息
+        :return: 命中、未命中、回收等计数
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "health_failures": self.health_failures,
+            "idle": sum(len(idle) for idle in self._idle.values()),
+        }
+
+
+# 全局SSH连接池
+ssh_pool = SSHConnectionPool()
+
+
+def _collect_pool_metrics():
+    stats = ssh_pool.stats()
+    return [
+        ("ssh_pool_hits", "SSH连接池命中次数", "counter", [("_total", {}, stats["hits"])]),
+        ("ssh_pool_misses", "SSH连接池未命中（新建连接）次数", "counter", [("_total", {}, stats["misses"])]),
+        ("ssh_pool_evictions", "SSH连接池回收空闲连接次数", "counter", [("_total", {}, stats["evictions"])]),
+        ("ssh_pool_health_failures", "SSH连接池健康检查失败次数", "counter", [("_total", {}, stats["health_failures"])]),
+        ("ssh_pool_idle_connections", "SSH连接池当前空闲连接数", "gauge", [("", {}, stats["idle"])]),
+    ]
+
+
+registry.register_collector(_collect_pool_metrics)
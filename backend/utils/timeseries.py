@@ -0,0 +1,373 @@
+import asyncio
+import os
+import shutil
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from utils.logger import log
+
+# 各分辨率（秒）下每个分区的槽位数：1秒分辨率按小时分区，1分钟按天分区，1小时按30天分区
+PARTITION_SLOTS = {1: 3600, 60: 1440, 3600: 720}
+RESOLUTIONS = tuple(sorted(PARTITION_SLOTS))
+# 各分辨率的保留时间（秒），超出的分区在清理时删除
+RETENTION = {
+    1: int(os.environ.get("TIMESERIES_RAW_RETENTION_HOURS", "48")) * 3600,
+    60: int(os.environ.get("TIMESERIES_MINUTE_RETENTION_DAYS", "90")) * 86400,
+    3600: int(os.environ.get("TIMESERIES_HOUR_RETENTION_DAYS", "730")) * 86400,
+}
+# 内存中最多保留的分区数，超出时按最近最少使用淘汰已落盘的分区
+TIMESERIES_MAX_PARTITIONS = int(os.environ.get("TIMESERIES_MAX_PARTITIONS", "512"))
+# 允许样本时间戳超前当前时间的最大值（秒）
+TIMESERIES_MAX_CLOCK_SKEW = 3600
+# 脏分区落盘间隔（秒）
+TIMESERIES_FLUSH_INTERVAL = 5.0
+# 过期分区清理间隔（秒）
+TIMESERIES_CLEANUP_INTERVAL = 3600.0
+
+
+class Series(NamedTuple):
+    """范围查询结果，各数组按桶对齐，只包含有数据的桶"""
+    resolution: int
+    timestamps: np.ndarray  # 桶起始时间（秒），int64
+    count: np.ndarray  # (n, 指标数) 样本数
+    mean: np.ndarray  # (n, 指标数) 均值，无样本时为NaN
+    min: np.ndarray  # (n, 指标数)
+    max: np.ndarray  # (n, 指标数)
+
+
+class _Partition:
+    """
+    一个序列在某一分辨率下一段连续时间的聚合数据
+
+    每个槽位对应一个时间桶，按指标保存样本数、和、最小值、最大值
+    """
+
+    __slots__ = ("start", "resolution", "count", "sum", "min", "max", "dirty")
+
+    def __init__(self, start: int, resolution: int, width: int, arrays: Optional[Dict[str, np.ndarray]] = None):
+        self.start = start
+        self.resolution = resolution
+        self.dirty = False
+        if arrays is not None:
+            self.count, self.sum, self.min, self.max = arrays["count"], arrays["sum"], arrays["min"], arrays["max"]
+            return
+        slots = PARTITION_SLOTS[resolution]
+        self.count = np.zeros((slots, width), dtype=np.uint32)
+        self.sum = np.zeros((slots, width), dtype=np.float64)
+        self.min = np.full((slots, width), np.inf, dtype=np.float32)
+        self.max = np.full((slots, width), -np.inf, dtype=np.float32)
+
+    @property
+    def end(self) -> int:
+        return self.start + PARTITION_SLOTS[self.resolution] * self.resolution
+
+    def add(self, slots: np.ndarray, values: np.ndarray, valid: np.ndarray):
+        # 先在批内按槽位排序聚合，再与已有数据合并，避免逐样本的ufunc.at
+        order = np.argsort(slots, kind="stable")
+        slots, values, valid = slots[order], values[order], valid[order]
+        heads = np.flatnonzero(np.r_[True, slots[1:] != slots[:-1]])
+        unique = slots[heads]
+        self.count[unique] += np.add.reduceat(valid.astype(np.uint32), heads)
+        self.sum[unique] += np.add.reduceat(np.where(valid, values, 0.0), heads)
+        self.min[unique] = np.minimum(self.min[unique], np.minimum.reduceat(np.where(valid, values, np.inf), heads))
+        self.max[unique] = np.maximum(self.max[unique], np.maximum.reduceat(np.where(valid, values, -np.inf), heads))
+        self.dirty = True
+
+    def snapshot(self) -> Dict[str, np.ndarray]:
+        return {"count": self.count.copy(), "sum": self.sum.copy(), "min": self.min.copy(), "max": self.max.copy()}
+
+
+class TimeSeriesStore:
+    """
+    按序列（机器）和时间分区的数值时间序列存储
+
+    写入时同时汇总到1秒、1分钟、1小时三种分辨率；分区为定长numpy数组，
+    定期以.npz文件落盘到 <root>/<序列>/<分辨率>/<分区起始时间>.npz，查询时按需加载。
+    所有方法都在事件循环线程中调用，分区文件的加载、落盘和删除在线程池中进行
+    """
+
+    def __init__(self, root: str, fields: Sequence[str]):
+        self.root = root
+        self.fields = tuple(fields)
+        self._partitions: "OrderedDict[Tuple[str, int, int], _Partition]" = OrderedDict()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        # 写入时从磁盘加载分区与创建新分区互斥，避免加载期间新建的空分区覆盖已落盘的数据
+        self._load_lock = asyncio.Lock()
+        self.samples = 0
+
+    def _path(self, key: str, resolution: int, start: int) -> str:
+        return os.path.join(self.root, key, str(resolution), f"{start}.npz")
+
+    def _load(self, key: str, resolution: int, start: int) -> Optional[_Partition]:
+        path = self._path(key, resolution, start)
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            arrays = {name: data[name] for name in ("count", "sum", "min", "max")}
+        if arrays["count"].shape[1] != len(self.fields):
+            log.warning("时间序列分区字段数不一致，忽略: {}", path)
+            return None
+        return _Partition(start, resolution, len(self.fields), arrays)
+
+    def _load_all(self, key: str, resolution: int, starts: List[int]) -> List[Tuple[int, _Partition]]:
+        loaded = []
+        for start in starts:
+            partition = self._load(key, resolution, start)
+            if partition is not None:
+                loaded.append((start, partition))
+        return loaded
+
+    async def _partitions_for(self, key: str, resolution: int, starts: Sequence[int]) -> Dict[int, _Partition]:
+        """
+        获取一组分区，未缓存的在线程池中从磁盘加载后放入缓存
+        :param key: 序列
+        :param resolution: 分辨率
+        :param starts: 分区起始时间
+        :return: 分区起始时间到分区的映射，不存在的分区不包含在内
+        """
+        found: Dict[int, _Partition] = {}
+        missing = []
+        for start in starts:
+            partition = self._partitions.get((key, resolution, start))
+            if partition is None:
+                missing.append(start)
+            else:
+                found[start] = partition
+        if missing:
+            for start, partition in await asyncio.to_thread(self._load_all, key, resolution, missing):
+                # 加载期间其他协程可能已缓存了该分区，以缓存中的为准
+                found[start] = self._partitions.setdefault((key, resolution, start), partition)
+        for start in sorted(found):
+            cache_key = (key, resolution, start)
+            if cache_key in self._partitions:
+                self._partitions.move_to_end(cache_key)
+        self._evict()
+        return found
+
+    def _evict(self):
+        if len(self._partitions) <= TIMESERIES_MAX_PARTITIONS:
+            return
+        # 最近使用的分区可能正要写入，不参与淘汰
+        for cache_key in list(self._partitions)[:-1]:
+            if len(self._partitions) <= TIMESERIES_MAX_PARTITIONS:
+                break
+            # 未落盘的分区留到下次落盘后再淘汰
+            if not self._partitions[cache_key].dirty:
+                del self._partitions[cache_key]
+
+    async def add(self, key: str, timestamps: np.ndarray, values: np.ndarray) -> int:
+        """
+        写入一批样本，同时更新各分辨率的汇总
+        :param key: 序列
+        :param timestamps: 样本时间戳（秒），形状(n,)
+        :param values: 样本值，形状(n, 字段数)，缺失值为NaN
+        :return: 实际写入的样本数（超出全部保留时间的样本被丢弃）
+        """
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64).reshape(len(timestamps), len(self.fields))
+        now = time.time()
+        # 丢弃无效时间戳以及超前过多（时钟偏差）的样本
+        keep = np.isfinite(timestamps) & (timestamps <= now + TIMESERIES_MAX_CLOCK_SKEW)
+        timestamps, values = timestamps[keep], values[keep]
+        valid = ~np.isnan(values)
+        seconds = np.floor(timestamps).astype(np.int64)
+        written = 0
+        async with self._load_lock:
+            for resolution in RESOLUTIONS:
+                span = PARTITION_SLOTS[resolution] * resolution
+                # 超出该分辨率保留时间的样本只汇总到更粗的分辨率
+                current = seconds >= now - RETENTION[resolution]
+                if not current.any():
+                    continue
+                written = max(written, int(current.sum()))
+                buckets = seconds // resolution
+                starts = seconds // span * span
+                unique = [int(start) for start in np.unique(starts[current])]
+                partitions = await self._partitions_for(key, resolution, unique)
+                for start in unique:
+                    mask = current & (starts == start)
+                    cache_key = (key, resolution, start)
+                    # 加载后可能已被淘汰，写入前重新放回缓存，保证脏分区会被落盘
+                    partition = self._partitions.get(cache_key) or partitions.get(start)
+                    if partition is None:
+                        partition = _Partition(start, resolution, len(self.fields))
+                    self._partitions[cache_key] = partition
+                    self._partitions.move_to_end(cache_key)
+                    partition.add(buckets[mask] - start // resolution, values[mask], valid[mask])
+            self._evict()
+        self.samples += written
+        return written
+
+    def choose_resolution(self, start: float, end: float, max_points: int) -> int:
+        """
+        选择分辨率：取桶数不超过max_points的最细分辨率，并且该分辨率的数据仍在保留期内
+        :param start: 起始时间（秒）
+        :param end: 结束时间（秒）
+        :param max_points: 最大点数
+        :return: 分辨率（秒）
+        """
+        now = time.time()
+        for resolution in RESOLUTIONS:
+            if (end - start) / resolution <= max_points and start >= now - RETENTION[resolution]:
+                return resolution
+        return RESOLUTIONS[-1]
+
+    async def query(self, key: str, start: float, end: float, max_points: int = 1000,
+                    resolution: Optional[int] = None) -> Series:
+        """
+        范围查询，返回不超过max_points个桶；所选分辨率的桶数仍超出时，相邻桶再合并。
+        范围按所选分辨率的保留时间和允许的时钟偏差截断，超出部分不会有数据
+        :param key: 序列
+        :param start: 起始时间（秒，含）
+        :param end: 结束时间（秒，不含）
+        :param max_points: 最大点数
+        :param resolution: 指定分辨率，为空时自动选择
+        :return: 查询结果
+        """
+        if resolution is None:
+            resolution = self.choose_resolution(start, end, max_points)
+        now = time.time()
+        start = max(start, now - RETENTION[resolution])
+        end = min(end, now + TIMESERIES_MAX_CLOCK_SKEW)
+        span = PARTITION_SLOTS[resolution] * resolution
+        first = int(start) // resolution * resolution
+        last = max(-(-int(np.ceil(end)) // resolution) * resolution, first)
+        width = len(self.fields)
+
+        part_starts = list(range(first // span * span, last, span))
+        partitions = await self._partitions_for(key, resolution, part_starts)
+        parts: List[Tuple[np.ndarray, ...]] = []
+        for part_start in part_starts:
+            partition = partitions.get(part_start)
+            if partition is None:
+                continue
+            lo = (max(first, part_start) - part_start) // resolution
+            hi = (min(last, partition.end) - part_start) // resolution
+            count = partition.count[lo:hi]
+            rows = np.flatnonzero(count.any(axis=1))
+            if not len(rows):
+                continue
+            parts.append((
+                part_start + (lo + rows) * resolution,
+                count[rows], partition.sum[lo:hi][rows], partition.min[lo:hi][rows], partition.max[lo:hi][rows],
+            ))
+        if not parts:
+            empty = np.empty((0, width))
+            return Series(resolution, np.empty(0, dtype=np.int64), empty.astype(np.uint32), empty, empty, empty)
+
+        timestamps, count, total, low, high = (np.concatenate(column) for column in zip(*parts))
+        step = -(-(last - first) // resolution // max(max_points, 1))
+        if step > 1:
+            # 按合并后的时间网格分组，组内求和/最小/最大
+            groups = (timestamps - first) // (resolution * step)
+            heads = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+            timestamps = first + groups[heads] * resolution * step
+            count = np.add.reduceat(count, heads)
+            total = np.add.reduceat(total, heads)
+            low = np.minimum.reduceat(low, heads)
+            high = np.maximum.reduceat(high, heads)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(count > 0, total / count, np.nan)
+        empty = count == 0
+        low = np.where(empty, np.nan, low)
+        high = np.where(empty, np.nan, high)
+        return Series(resolution * step, timestamps, count, mean, low, high)
+
+    async def drop(self, key: str):
+        """
+        删除序列的全部数据；与落盘、写入互斥，避免删除后落盘又重新创建该序列的目录
+        :param key: 序列
+        """
+        async with self._flush_lock, self._load_lock:
+            for cache_key in [k for k in self._partitions if k[0] == key]:
+                del self._partitions[cache_key]
+            await asyncio.to_thread(shutil.rmtree, os.path.join(self.root, key), True)
+
+    @staticmethod
+    def _write(path: str, arrays: Dict[str, np.ndarray]):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                np.savez(f, **arrays)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    async def flush(self) -> int:
+        """
+        将脏分区写入磁盘
+        :return: 写入的分区数
+        """
+        async with self._flush_lock:
+            pending = []
+            for (key, resolution, start), partition in self._partitions.items():
+                if partition.dirty:
+                    partition.dirty = False
+                    pending.append((partition, self._path(key, resolution, start), partition.snapshot()))
+            for partition, path, arrays in pending:
+                try:
+                    await asyncio.to_thread(self._write, path, arrays)
+                except Exception as e:
+                    partition.dirty = True
+                    log.error("时间序列分区落盘失败: {}, 错误: {}", path, e)
+            self._evict()
+            return len(pending)
+
+    def _expire(self, now: float):
+        for cache_key, partition in list(self._partitions.items()):
+            if partition.end < now - RETENTION[partition.resolution]:
+                del self._partitions[cache_key]
+
+    def _remove_expired_files(self, now: float):
+        if not os.path.isdir(self.root):
+            return
+        for key in os.listdir(self.root):
+            for resolution in RESOLUTIONS:
+                directory = os.path.join(self.root, key, str(resolution))
+                if not os.path.isdir(directory):
+                    continue
+                span = PARTITION_SLOTS[resolution] * resolution
+                for name in os.listdir(directory):
+                    start = name.split(".", 1)[0]
+                    if start.isdigit() and int(start) + span < now - RETENTION[resolution]:
+                        os.remove(os.path.join(directory, name))
+
+    async def _flush_loop(self):
+        cleaned_at = 0.0
+        while True:
+            await asyncio.sleep(TIMESERIES_FLUSH_INTERVAL)
+            try:
+                await self.flush()
+                now = time.time()
+                if now - cleaned_at >= TIMESERIES_CLEANUP_INTERVAL:
+                    cleaned_at = now
+                    self._expire(now)
+                    async with self._flush_lock:
+                        await asyncio.to_thread(self._remove_expired_files, now)
+            except Exception as e:
+                log.exception("时间序列后台任务异常: {}", e)
+
+    def start(self):
+        """
+        启动后台落盘任务
+        """
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """
+        停止后台任务并落盘全部数据
+        """
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+            self._flush_task = None
+        await self.flush()